@@ -2,6 +2,7 @@
 from flask import Flask, render_template, redirect, url_for
 from flask_migrate import Migrate
 from flask_login import LoginManager, login_required, current_user
+import click
 import os
 # Automatically load environment variables from .env
 from utils.load_env import *
@@ -45,8 +46,12 @@ def create_app():
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     
+    # Audit entries are written in batches off the request path (AUDIT_LOG_MODE='sync' to disable)
+    from utils.audit_logger import init_audit_writer
+    init_audit_writer(app)
+    
     # Import models (must be after db initialization)
-    from models import User, Student, Staff, Book, Category, BorrowRecord, Fine, AuditLog, BackupLog, NotificationPreference, EmailLog, Video, Audio, ExamPaper, MarkingScheme, Announcement, StudentProgress
+    from models import User, Student, Staff, Book, Category, BorrowRecord, Fine, AuditLog, BackupLog, NotificationPreference, EmailLog, EmailOutbox, NotificationLedger, ActivityRollup, MediaFile, MediaJob, Video, Audio, ExamPaper, MarkingScheme, Announcement, StudentProgress
     
     # Register blueprints
     from blueprints.auth import auth_bp
@@ -77,10 +82,29 @@ def create_app():
 
     # Allow environment variables to override or provide email configuration
     # This makes the email configuration flexible: you can use instance/config.py or environment variables.
-    for key in ('GMAIL_USER', 'GMAIL_APP_PASSWORD', 'SENDGRID_API_KEY', 'FROM_EMAIL'):
+    for key in ('GMAIL_USER', 'GMAIL_APP_PASSWORD', 'SENDGRID_API_KEY', 'FROM_EMAIL', 'SMTP_HOST', 'SMTP_PORT', 'SMTP_USE_TLS', 'SMTP_POOL_SIZE'):
         env_val = os.environ.get(key)
         if env_val:
             app.config[key] = env_val
+    # Backup archives are written to BACKUP_DIR (default: ./backups)
+    if os.environ.get('BACKUP_DIR'):
+        app.config['BACKUP_DIR'] = os.environ['BACKUP_DIR']
+    # SQLite journal mode, applied at startup and kept in the database file
+    # (SQLITE_JOURNAL_MODE=wal lets backups run without holding up writers)
+    if os.environ.get('SQLITE_JOURNAL_MODE'):
+        app.config['SQLITE_JOURNAL_MODE'] = os.environ['SQLITE_JOURNAL_MODE']
+    # Offline reporting: columnar export directory and where the reports read from ('auto', 'analytics', 'live')
+    for key in ('ANALYTICS_DIR', 'REPORTS_SOURCE'):
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+    # Media downloads can be handed to nginx: MEDIA_ACCEL_REDIRECT_PREFIX names an
+    # `internal` location whose alias is MEDIA_ROOT (default: static/uploads)
+    for key in ('MEDIA_ROOT', 'MEDIA_ACCEL_REDIRECT_PREFIX'):
+        if os.environ.get(key):
+            app.config[key] = os.environ[key]
+    # Per-request query profiling (QUERY_PROFILER=0 to turn off)
+    if os.environ.get('QUERY_PROFILER'):
+        app.config['QUERY_PROFILER'] = os.environ['QUERY_PROFILER'].lower() not in ('0', 'false', 'no', 'off')
     # DUKAN_URL not used when Dukan integration is disabled
     
     # User loader for Flask-Login
@@ -95,6 +119,50 @@ def create_app():
             return redirect(url_for('dashboard.index'))
         return redirect(url_for('auth.login'))
     
+    @app.cli.command('rebuild-loan-counters')
+    def rebuild_loan_counters_command():
+        """Recompute the per-book copies-on-loan counters from borrow records"""
+        from utils.circulation import rebuild_loan_counters
+        corrected = rebuild_loan_counters()
+        print(f"Loan counters rebuilt ({corrected} books corrected)")
+
+    @app.cli.command('assess-fines')
+    def assess_fines_command():
+        """Nightly job: bring the fine of every overdue open loan up to date"""
+        from utils.fine_engine import assess_overdue_fines
+        totals = assess_overdue_fines()
+        print(f"✓ Assessed {totals['assessed']} overdue loans ({totals['created']} fines created, {totals['updated']} updated)")
+
+    @app.cli.command('backfill-activity-rollup')
+    def backfill_activity_rollup_command():
+        """Rebuild the daily/monthly report chart buckets from existing borrow and fine history"""
+        from utils.activity_rollup import backfill_activity_rollup
+        rows = backfill_activity_rollup()
+        print(f"Activity rollup rebuilt ({rows} buckets)")
+
+    @app.cli.command('export-analytics')
+    @click.option('--full', is_flag=True, help='Rewrite every monthly partition, not just new and recent ones')
+    def export_analytics_command(full):
+        """Snapshot circulation history into Parquet files for offline reporting"""
+        from utils.analytics_store import export_analytics
+        for table, result in export_analytics(full=full).items():
+            print(f"✓ {table}: {result['rows']} rows in {result['partitions']} partitions")
+
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Fail if any hot query stops using its index"""
+        from utils.query_plans import check_query_plans
+        failed = 0
+        for result in check_query_plans():
+            if result['passed']:
+                print(f"✓ {result['name']}")
+            else:
+                failed += 1
+                print(f"✗ {result['name']}: expected {', '.join(result['expected'])}")
+                print('    ' + result['plan'].replace('\n', '\n    '))
+        if failed:
+            raise SystemExit(1)
+
     # Create database tables and seed data
     with app.app_context():
         db.create_all()
@@ -103,6 +171,30 @@ def create_app():
         if not User.query.first():
             from utils.seed_data import seed_initial_data
             seed_initial_data()
+        
+        # Build the catalogue search index (FTS5 on SQLite, pg_trgm on PostgreSQL)
+        from utils.book_search import ensure_search_index
+        app.config['BOOK_SEARCH_BACKEND'] = ensure_search_index()
+        
+        # Opt-in journal mode for SQLite (unset: the database keeps its current mode)
+        from utils.backup_engine import apply_sqlite_journal_mode
+        apply_sqlite_journal_mode()
+        
+        # Pooled SQLite connections reconnect after a backup restore replaces the file
+        from utils.db_restore import install_restore_guard
+        install_restore_guard()
+        
+        # The dashboard snapshot is dropped whenever loans, fines or the catalogue change
+        from utils.dashboard_metrics import install_metrics_invalidation
+        install_metrics_invalidation()
+        
+        # Report chart buckets are updated in the same transaction as each borrow, return and fine
+        from utils.activity_rollup import install_rollup_maintenance
+        install_rollup_maintenance()
+        
+        # Query counts, database time and N+1 suspects for every request
+        from utils.query_profiler import install_query_profiler
+        install_query_profiler(app, db.engine)
     
     return app
 
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Offline Backup Tool for Library System
+
+Verifies and rebuilds incremental backups straight from the backup directory,
+without starting the application or opening the live database. Every
+incremental backup has a manifest (library_backup_*.manifest.json) listing
+its chunks and the SHA-256 of the whole database file.
+
+Usage:
+    python backup_tool.py list                                  # Backups in the backup directory
+    python backup_tool.py verify                                # Check every backup's checksums
+    python backup_tool.py verify backups/library_backup_20251007_120000.manifest.json
+    python backup_tool.py restore --at "2025-10-07 12:00" --output restored.db
+    python backup_tool.py restore --manifest backups/library_backup_20251007_120000.manifest.json --output restored.db
+
+The backup directory is BACKUP_DIR (default: ./backups); override it with --backup-dir.
+restore writes a new file; stop the application before moving it over the live database.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from utils.backup_chunks import MANIFEST_SUFFIX, get_chunk_dir, load_manifest, verify_manifest, materialize
+
+def load_manifests(backup_dir):
+    """All manifests in backup_dir, oldest first"""
+    manifests = []
+    for name in os.listdir(backup_dir):
+        if name.endswith(MANIFEST_SUFFIX):
+            manifest = load_manifest(os.path.join(backup_dir, name))
+            manifest['path'] = os.path.join(backup_dir, name)
+            manifests.append(manifest)
+    return sorted(manifests, key=lambda m: m['created_at'])
+
+def main():
+    parser = argparse.ArgumentParser(description='Verify and restore incremental backups offline')
+    parser.add_argument('--backup-dir', default=os.environ.get('BACKUP_DIR') or 'backups',
+                        help='Backup directory (default: BACKUP_DIR or ./backups)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('list', help='List incremental backups')
+
+    verify_parser = subparsers.add_parser('verify', help='Check backups against their manifests')
+    verify_parser.add_argument('manifests', nargs='*', help='Manifest files (default: all)')
+
+    restore_parser = subparsers.add_parser('restore', help='Rebuild a database file from a backup')
+    source = restore_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--at', help='Point in time (UTC), e.g. "2025-10-07 12:00"; uses the latest backup at or before it')
+    source.add_argument('--manifest', help='Manifest of the backup to restore')
+    restore_parser.add_argument('--output', required=True, help='Path of the database file to write')
+
+    args = parser.parse_args()
+    chunk_dir = get_chunk_dir(args.backup_dir)
+
+    if args.command == 'list':
+        for manifest in load_manifests(args.backup_dir):
+            print(f"{manifest['created_at']}  {len(manifest['chunks']):>6} chunks  "
+                  f"{manifest['size'] / 1024 / 1024:8.2f} MB  {os.path.basename(manifest['path'])}")
+
+    elif args.command == 'verify':
+        if args.manifests:
+            manifests = [dict(load_manifest(path), path=path) for path in args.manifests]
+        else:
+            manifests = load_manifests(args.backup_dir)
+        failed = 0
+        for manifest in manifests:
+            problems = verify_manifest(manifest, chunk_dir)
+            if problems:
+                failed += 1
+                print(f"✗ {os.path.basename(manifest['path'])}: {'; '.join(problems)}")
+            else:
+                print(f"✓ {os.path.basename(manifest['path'])}")
+        if failed:
+            sys.exit(1)
+
+    elif args.command == 'restore':
+        if args.manifest:
+            manifest = dict(load_manifest(args.manifest), path=args.manifest)
+        else:
+            at = datetime.fromisoformat(args.at)
+            candidates = [m for m in load_manifests(args.backup_dir)
+                          if datetime.fromisoformat(m['created_at']) <= at]
+            if not candidates:
+                print(f"No backup was taken on or before {at}")
+                sys.exit(1)
+            manifest = candidates[-1]
+
+        materialize(manifest, chunk_dir, args.output)
+        print(f"✓ Restored {os.path.basename(manifest['path'])} (taken {manifest['created_at']}) to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Circulation Benchmark for Library System
+
+Builds a synthetic library (utils/synthetic_data.py) at the requested scale,
+then drives the main circulation endpoints and reports p50/p95/p99 latency,
+queries per request and throughput for each:
+
+    dashboard      GET  /dashboard/
+    list_borrows   GET  /borrowing/?status=active
+    book_search    GET  /books/api/search?q=...
+    borrow_book    POST /borrowing/borrow
+    return_book    POST /borrowing/return/<id>  (the loans borrow_book created)
+
+The generated database is kept per (books, loans, seed) in --data-dir and
+copied fresh for every run, so runs on different commits start from
+identical data. Results are written as JSON together with the commit they
+were measured on; --compare prints the change against an earlier file.
+
+By default requests go through the Flask test client in this process, which
+also counts the SQL statements each request runs. --server gunicorn starts a
+local gunicorn on the same database and sends real HTTP requests from
+--concurrency threads (needs gunicorn and requests installed); query counts
+then come from the X-Query-Count header set by utils/query_profiler.py.
+
+Usage:
+    python benchmark.py                                   # 10^3 books, 10^4 loans
+    python benchmark.py --books 100000 --loans 1000000    # Largest scale
+    python benchmark.py --output bench/after.json --compare bench/before.json
+    python benchmark.py --server gunicorn --workers 4 --concurrency 8
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+BENCHMARK_USER = ('admin', 'admin123')  # Created by seed_initial_data
+SEARCH_TERMS = ['chinese', 'grammar', 'hsk', 'poetry', 'business', 'reader', 'culture', 'idioms']
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+def git_commit():
+    """(commit hash, whether the working tree has uncommitted changes), or (None, None) outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def prepare_database(args):
+    """
+    Point DATABASE_URL at a fresh copy of the synthetic database for this scale
+
+    Returns:
+        tuple: (path of the working copy, whether it still has to be generated)
+    """
+    os.makedirs(args.data_dir, exist_ok=True)
+    snapshot = os.path.join(args.data_dir, f'library_b{args.books}_l{args.loans}_s{args.seed}.db')
+    work_db = os.path.join(args.data_dir, 'benchmark_run.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(work_db + suffix):
+            os.remove(work_db + suffix)
+    if os.path.exists(snapshot) and not args.regenerate:
+        shutil.copyfile(snapshot, work_db)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(work_db)}'
+    os.environ.setdefault('SESSION_SECRET', 'benchmark')
+    return work_db, snapshot, not os.path.exists(work_db)
+
+def pick_targets(count, seed):
+    """
+    Books with free copies and students under the borrowing limit for the borrow requests
+
+    Returns:
+        list: (book_id, student_id) pairs, at most one borrow per book copy and student
+    """
+    from models import db, Book, BorrowRecord, Student
+
+    open_loans = db.session.query(BorrowRecord.student_id, db.func.count()).filter(
+        BorrowRecord.returned_at.is_(None), BorrowRecord.student_id.isnot(None)
+    ).group_by(BorrowRecord.student_id)
+    busy = {student_id for student_id, loans in open_loans if loans >= 3}
+    students = [student_id for (student_id,) in db.session.query(Student.id).order_by(Student.id) if student_id not in busy]
+    books = [book_id for (book_id,) in db.session.query(Book.id).filter(Book.available_copies > 0).order_by(Book.id)]
+
+    rng = random.Random(seed)
+    return list(zip(rng.sample(books, min(count, len(books))), rng.sample(students, min(count, len(students)))))
+
+def build_scenarios(args):
+    """Request generators per endpoint; return_book's targets are filled in once borrow_book has run"""
+    from models import db, BorrowRecord
+
+    rng = random.Random(args.seed)
+    total = args.warmup + args.requests
+    targets = pick_targets(total, args.seed)
+    first_new_loan = (db.session.query(db.func.max(BorrowRecord.id)).scalar() or 0) + 1
+    created_loans = []
+
+    def borrow_requests():
+        for book_id, student_id in targets:
+            yield 'POST', '/borrowing/borrow', {'book_id': book_id, 'borrower_type': 'student', 'student_id': student_id}
+
+    def return_requests():
+        created_loans.extend(loan_id for (loan_id,) in db.session.query(BorrowRecord.id).filter(
+            BorrowRecord.id >= first_new_loan, BorrowRecord.returned_at.is_(None)
+        ).order_by(BorrowRecord.id))
+        db.session.remove()
+        for loan_id in created_loans:
+            yield 'POST', f'/borrowing/return/{loan_id}', {'notes': 'benchmark'}
+
+    def repeat(method, path_fn):
+        return lambda: ((method, path_fn(), None) for _ in range(total))
+
+    return [
+        ('dashboard', repeat('GET', lambda: '/dashboard/')),
+        ('list_borrows', repeat('GET', lambda: '/borrowing/?status=active')),
+        ('book_search', repeat('GET', lambda: f'/books/api/search?q={rng.choice(SEARCH_TERMS)}')),
+        ('borrow_book', borrow_requests),
+        ('return_book', return_requests),
+    ]
+
+class QueryCounter:
+    """Counts SQL statements sent through the engine (test-client mode only)"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+def run_test_client(app, scenarios, args):
+    """Send each scenario's requests through the Flask test client, one at a time"""
+    from models import db
+
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    client = app.test_client()
+    client.post('/auth/login', data={'username': BENCHMARK_USER[0], 'password': BENCHMARK_USER[1]})
+
+    results = {}
+    for name, requests_for in scenarios:
+        with app.app_context():
+            requests_list = list(requests_for())
+        latencies, queries, errors = [], [], 0
+        started = None
+        for i, (method, path, data) in enumerate(requests_list):
+            if i == args.warmup:
+                started = time.perf_counter()
+            counter.count = 0
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=data)
+            elapsed = time.perf_counter() - start
+            if i < args.warmup:
+                continue
+            latencies.append(elapsed)
+            queries.append(counter.count)
+            if response.status_code >= 400:
+                errors += 1
+        wall = time.perf_counter() - started if started else 0
+        results[name] = summarize(latencies, queries, errors, wall)
+    return results
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_gunicorn(app, scenarios, args):
+    """Send each scenario's requests over HTTP to a local gunicorn from a pool of client threads"""
+    import requests
+
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(args.workers), '--bind', f'127.0.0.1:{port}', 'main:app'],
+        env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                requests.get(f'{base_url}/auth/login', timeout=1)
+                break
+            except requests.ConnectionError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError('gunicorn did not start; is it installed?')
+                time.sleep(0.2)
+
+        sessions = threading.local()
+
+        def session():
+            if not hasattr(sessions, 'http'):
+                sessions.http = requests.Session()
+                sessions.http.post(f'{base_url}/auth/login',
+                                   data={'username': BENCHMARK_USER[0], 'password': BENCHMARK_USER[1]})
+            return sessions.http
+
+        results = {}
+        for name, requests_for in scenarios:
+            with app.app_context():
+                requests_list = list(requests_for())
+            lock = threading.Lock()
+            latencies, queries, errors = [], [], [0]
+
+            def worker(batch, measured):
+                http = session()
+                for method, path, data in batch:
+                    start = time.perf_counter()
+                    response = http.request(method, base_url + path, data=data, allow_redirects=False)
+                    elapsed = time.perf_counter() - start
+                    if not measured:
+                        continue
+                    with lock:
+                        latencies.append(elapsed)
+                        if 'X-Query-Count' in response.headers:
+                            queries.append(int(response.headers['X-Query-Count']))
+                        if response.status_code >= 400:
+                            errors[0] += 1
+
+            def run_batch(batch, measured):
+                threads = [threading.Thread(target=worker, args=(batch[i::args.concurrency], measured))
+                           for i in range(args.concurrency)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            run_batch(requests_list[:args.warmup], False)
+            started = time.perf_counter()
+            run_batch(requests_list[args.warmup:], True)
+            results[name] = summarize(latencies, queries, errors[0], time.perf_counter() - started)
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+def summarize(latencies, queries, errors, wall):
+    """Latency percentiles (ms), mean queries per request and throughput for one endpoint"""
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else None,
+    }
+
+def _format(value, suffix=''):
+    return '-' if value is None else f'{value}{suffix}'
+
+def print_results(results):
+    print(f"{'endpoint':<14}{'reqs':>6}{'errs':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'req/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['requests']:>6}{r['errors']:>6}{_format(r['p50_ms']):>10}{_format(r['p95_ms']):>10}"
+              f"{_format(r['p99_ms']):>10}{_format(r['queries_per_request']):>9}{_format(r['throughput_rps']):>9}")
+
+def print_comparison(report, baseline):
+    """Change per endpoint against an earlier result file"""
+    if baseline['parameters'] != report['parameters']:
+        print('⚠ Baseline was run with different parameters; deltas are not like for like')
+    print(f"\nChange vs {(baseline.get('commit') or 'unknown')[:12]}:")
+    print(f"{'endpoint':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'queries':>10}{'req/s':>10}")
+    for name, r in report['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request', 'throughput_rps'):
+            if r[key] is None or not before.get(key):
+                cells.append('-')
+            else:
+                cells.append(f'{(r[key] - before[key]) / before[key] * 100:+.1f}%')
+        print(f"{name:<14}" + ''.join(f'{cell:>10}' for cell in cells))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the circulation endpoints on synthetic data')
+    parser.add_argument('--books', type=int, default=1000, help='Synthetic books (10^3 to 10^6)')
+    parser.add_argument('--loans', type=int, default=10000, help='Synthetic borrow records (10^3 to 10^6)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for data and request order')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per endpoint first')
+    parser.add_argument('--server', choices=['test-client', 'gunicorn'], default='test-client',
+                        help='In-process test client (counts queries) or a local gunicorn over HTTP')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--concurrency', type=int, default=4, help='Client threads in gunicorn mode')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'library_benchmark'),
+                        help='Where generated databases are kept between runs')
+    parser.add_argument('--regenerate', action='store_true', help='Rebuild the synthetic database for this scale')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Earlier results JSON to print the change against')
+
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL when it is created, so this comes before importing it
+    work_db, snapshot, generate = prepare_database(args)
+    # Borrow confirmations only go to the outbox; audit entries are written inline so they count
+    os.environ.setdefault('AUDIT_LOG_MODE', 'sync')
+    from main import app
+    from models import db
+    from utils.synthetic_data import generate_synthetic_data
+
+    if generate:
+        with app.app_context():
+            start = time.perf_counter()
+            counts = generate_synthetic_data(books=args.books, loans=args.loans, seed=args.seed)
+            db.session.remove()
+            db.engine.dispose()
+        print(f"✓ Generated {', '.join(f'{n} {table}' for table, n in counts.items())} "
+              f"in {time.perf_counter() - start:.1f}s")
+        shutil.copyfile(work_db, snapshot)
+
+    with app.app_context():
+        scenarios = build_scenarios(args)
+        db.session.remove()
+
+    runner = run_gunicorn if args.server == 'gunicorn' else run_test_client
+    results = runner(app, scenarios, args)
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'run_at': datetime.utcnow().isoformat(),
+        'parameters': {
+            'books': args.books, 'loans': args.loans, 'seed': args.seed, 'requests': args.requests,
+            'warmup': args.warmup, 'server': args.server,
+            'workers': args.workers if args.server == 'gunicorn' else None,
+            'concurrency': args.concurrency if args.server == 'gunicorn' else 1,
+        },
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'database': 'sqlite'},
+        'results': results,
+    }
+
+    print_results(results)
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"✓ Results written to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from models import AuditLog, User, db
-from utils.audit_logger import get_audit_logs, get_entity_history
+from utils.audit_logger import get_audit_logs, get_entity_history, flush_audit_log
+from utils.query_profiler import get_query_profile, reset_query_profile
 import json
 
 audit_bp = Blueprint('audit', __name__)
@@ -13,6 +14,9 @@ def list_audit_logs():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard.index'))
     
+    # Show entries still buffered by the audit writer
+    flush_audit_log()
+    
     # Get filters from request
     entity_type = request.args.get('entity_type', '')
     action = request.args.get('action', '')
@@ -68,6 +72,7 @@ def entity_history(entity_type, entity_id):
         return redirect(url_for('dashboard.index'))
     
     # Get entity history
+    flush_audit_log()
     history = get_entity_history(entity_type, entity_id)
     
     return render_template('audit/entity_history.html', 
@@ -140,4 +145,28 @@ def audit_statistics():
                          action_stats=action_stats,
                          entity_stats=entity_stats,
                          user_stats=user_stats,
-                         recent_activity=recent_activity)
\ No newline at end of file
+                         recent_activity=recent_activity)
+
+@audit_bp.route('/queries')
+@login_required
+def query_profile():
+    """Per-endpoint query counts and suspected N+1 patterns"""
+    if current_user.role != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('dashboard.index'))
+    
+    profile = get_query_profile()
+    return render_template('audit/query_profile.html',
+                         endpoints=profile['endpoints'],
+                         recent=profile['recent'])
+
+@audit_bp.route('/queries/reset', methods=['POST'])
+@login_required
+def reset_query_profile_route():
+    if current_user.role != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('dashboard.index'))
+    
+    reset_query_profile()
+    flash('Query statistics cleared', 'success')
+    return redirect(url_for('audit.query_profile'))
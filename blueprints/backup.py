@@ -1,11 +1,13 @@
 import os
-import sqlite3
-import shutil
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
 from models import BackupLog, db
 from utils.audit_logger import log_action
+from utils.backup_chunks import MANIFEST_SUFFIX
+from utils.backup_engine import (start_backup, get_backup_dir, get_sqlite_database_path, is_incremental,
+                                 iter_backup_bytes, find_backup_at, delete_backup_files)
+from utils.db_restore import restore_sqlite_backup
 
 backup_bp = Blueprint('backup', __name__)
 
@@ -19,9 +21,7 @@ def list_backups():
     backups = BackupLog.query.order_by(BackupLog.created_at.desc()).all()
     
     # Check if backup directory exists
-    backup_dir = 'backups'
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
+    get_backup_dir()
     
     return render_template('backup/list.html', backups=backups)
 
@@ -34,123 +34,17 @@ def create_backup():
     
     if request.method == 'POST':
         try:
-            # Create backup directory if it doesn't exist
-            backup_dir = 'backups'
-            if not os.path.exists(backup_dir):
-                os.makedirs(backup_dir)
-            
-            # Generate backup filename with timestamp
-            timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'library_backup_{timestamp}.db'
-            backup_path = os.path.join(backup_dir, backup_filename)
-            
-            # Create backup of SQLite database
-            source_db = 'confucius_library.db'
-            
-            if os.path.exists(source_db):
-                # Use SQLite backup API for consistency
-                source_conn = sqlite3.connect(source_db)
-                backup_conn = sqlite3.connect(backup_path)
-                
-                source_conn.backup(backup_conn)
-                
-                source_conn.close()
-                backup_conn.close()
-                
-                # Get file size
-                file_size = os.path.getsize(backup_path)
-                
-                # Create backup log entry
-                description = request.form.get('description', f'Manual backup created by {current_user.username}')
-                
-                backup_log = BackupLog(
-                    filename=backup_filename,
-                    created_by=current_user.id,
-                    file_size=file_size,
-                    description=description,
-                    status='completed'
-                )
-                
-                db.session.add(backup_log)
-                db.session.commit()
-                
-                # Log the action
-                log_action(
-                    action='CREATE_BACKUP',
-                    entity_type='Backup',
-                    entity_id=backup_log.id,
-                    details={
-                        'filename': backup_filename,
-                        'file_size': file_size,
-                        'description': description
-                    }
-                )
-                
-                flash(f'Backup created successfully: {backup_filename}', 'success')
-                
-            else:
-                flash('Database file not found', 'error')
-                
+            # The copy runs on the backup worker; the list page shows its progress
+            description = request.form.get('description', f'Manual backup created by {current_user.username}')
+            backup_log = start_backup(description, current_user.id)
+            flash(f'Backup started: {backup_log.filename}', 'success')
         except Exception as e:
-            # Log failed backup
-            backup_log = BackupLog(
-                filename=f'failed_backup_{timestamp}.db',
-                created_by=current_user.id,
-                status='failed',
-                description=f'Backup failed: {str(e)}'
-            )
-            db.session.add(backup_log)
-            db.session.commit()
+            db.session.rollback()
             flash(f'Backup failed: {str(e)}', 'error')
         return redirect(url_for('backup.list_backups'))
     else:
         # If GET, show a simple confirmation page or redirect
         return redirect(url_for('backup.list_backups'))
-        
-        if os.path.exists(source_db):
-            # Use SQLite backup API for consistency
-            source_conn = sqlite3.connect(source_db)
-            backup_conn = sqlite3.connect(backup_path)
-            
-            source_conn.backup(backup_conn)
-            
-            source_conn.close()
-            backup_conn.close()
-            
-            # Get file size
-            file_size = os.path.getsize(backup_path)
-            
-            # Create backup log entry
-            description = request.form.get('description', f'Manual backup created by {current_user.username}')
-            
-            backup_log = BackupLog(
-                filename=backup_filename,
-                created_by=current_user.id,
-                file_size=file_size,
-                description=description,
-                status='completed'
-            )
-            
-            db.session.add(backup_log)
-            db.session.commit()
-            
-            # Log the action
-            log_action(
-                action='CREATE_BACKUP',
-                entity_type='Backup',
-                entity_id=backup_log.id,
-                details={
-                    'filename': backup_filename,
-                    'file_size': file_size,
-                    'description': description
-                }
-            )
-            
-            flash(f'Backup created successfully: {backup_filename}', 'success')
-            
-        else:
-            flash('Database file not found', 'error')
-            
 
 @backup_bp.route('/download/<int:backup_id>')
 @login_required
@@ -160,7 +54,7 @@ def download_backup(backup_id):
         return redirect(url_for('backup.list_backups'))
     
     backup_log = BackupLog.query.get_or_404(backup_id)
-    backup_path = os.path.join('backups', backup_log.filename)
+    backup_path = os.path.join(get_backup_dir(), backup_log.filename)
     
     if os.path.exists(backup_path):
         log_action(
@@ -172,6 +66,15 @@ def download_backup(backup_id):
             }
         )
         
+        if is_incremental(backup_log):
+            # Rebuilt from its chunks as it streams out
+            download_name = backup_log.filename.replace(MANIFEST_SUFFIX, '.db')
+            return Response(
+                stream_with_context(iter_backup_bytes(backup_log)),
+                mimetype='application/octet-stream',
+                headers={'Content-Disposition': f'attachment; filename={download_name}'}
+            )
+        
         return send_file(backup_path, as_attachment=True, download_name=backup_log.filename)
     else:
         flash('Backup file not found', 'error')
@@ -185,40 +88,62 @@ def restore_backup(backup_id):
         return redirect(url_for('backup.list_backups'))
     
     backup_log = BackupLog.query.get_or_404(backup_id)
-    backup_path = os.path.join('backups', backup_log.filename)
+    return _restore_from(backup_log)
+
+@backup_bp.route('/restore-at', methods=['POST'])
+@login_required
+def restore_point_in_time():
+    if current_user.role != 'admin':
+        flash('Access denied. Admin privileges required.', 'error')
+        return redirect(url_for('backup.list_backups'))
+    
+    try:
+        restore_at = datetime.strptime(request.form.get('restore_at', ''), '%Y-%m-%dT%H:%M')
+    except ValueError:
+        flash('Please choose the date and time to restore to', 'error')
+        return redirect(url_for('backup.list_backups'))
+    
+    backup_log = find_backup_at(restore_at)
+    if not backup_log:
+        flash(f'No completed backup was taken on or before {restore_at.strftime("%b %d, %Y %H:%M")}', 'error')
+        return redirect(url_for('backup.list_backups'))
+    return _restore_from(backup_log)
+
+def _restore_from(backup_log):
+    backup_path = os.path.join(get_backup_dir(), backup_log.filename)
     
     if not os.path.exists(backup_path):
         flash('Backup file not found', 'error')
         return redirect(url_for('backup.list_backups'))
     
+    source_db = get_sqlite_database_path()
+    if not source_db:
+        flash('Restoring from the web interface is only supported for SQLite databases', 'error')
+        return redirect(url_for('backup.list_backups'))
+    
+    details = {
+        'restored_from': backup_log.filename,
+        'backup_taken_at': backup_log.created_at
+    }
+    
     try:
-        # Create a backup of current database before restoring
-        current_timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        pre_restore_backup = f'pre_restore_backup_{current_timestamp}.db'
-        pre_restore_path = os.path.join('backups', pre_restore_backup)
-        
-        source_db = 'confucius_library.db'
-        if os.path.exists(source_db):
-            shutil.copy2(source_db, pre_restore_path)
-        
-        # Restore from backup
-        shutil.copy2(backup_path, source_db)
+        # Validated beside the live database, then swapped in while connections are held back
+        stats = restore_sqlite_backup(backup_log)
+        details.update(stats)
         
-        # Log the restoration
+        # Log the restoration, with how long the database was unavailable
         log_action(
             action='RESTORE_BACKUP',
             entity_type='Backup',
-            entity_id=backup_id,
-            details={
-                'restored_from': backup_log.filename,
-                'pre_restore_backup': pre_restore_backup
-            }
+            entity_id=backup_log.id,
+            details=details
         )
         
-        flash(f'Database restored from {backup_log.filename}', 'success')
-        flash(f'Pre-restoration backup saved as {pre_restore_backup}', 'info')
+        flash(f'Database restored from {details["restored_from"]} ({stats["downtime_ms"]} ms downtime)', 'success')
+        flash(f'Pre-restoration backup saved as {stats["pre_restore_backup"]}', 'info')
         
     except Exception as e:
+        db.session.rollback()
         flash(f'Restore failed: {str(e)}', 'error')
     
     return redirect(url_for('backup.list_backups'))
@@ -231,12 +156,10 @@ def delete_backup(backup_id):
         return redirect(url_for('backup.list_backups'))
     
     backup_log = BackupLog.query.get_or_404(backup_id)
-    backup_path = os.path.join('backups', backup_log.filename)
     
     try:
-        # Delete the backup file
-        if os.path.exists(backup_path):
-            os.remove(backup_path)
+        # Delete the backup file, and chunks no other incremental backup uses
+        delete_backup_files(backup_log)
         
         # Log the deletion
         log_action(
@@ -1,9 +1,9 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from models import Book, Category, BorrowRecord, db
-from sqlalchemy import or_
 from utils.audit_logger import log_action
 from utils.decorators import library_access_required
+from utils.book_search import book_search_filter
 
 books_bp = Blueprint('books', __name__)
 
@@ -24,14 +24,7 @@ def list_books():
     query = Book.query
     
     if search:
-        query = query.filter(
-            or_(
-                Book.title.contains(search),
-                Book.author.contains(search),
-                Book.isbn.contains(search),
-                Book.unique_id.contains(search)
-            )
-        )
+        query = query.filter(book_search_filter(search))
     
     if category_id:
         query = query.filter_by(category_id=category_id)
@@ -112,6 +105,13 @@ def edit_book(book_id):
         category_id = request.form.get('category_id')
         if category_id == '':
             category_id = None
+        
+        # Copies already out cannot be written off here; they come back through returns
+        total_copies = int(request.form.get('total_copies', 1))
+        if total_copies < book.copies_on_loan:
+            flash(f'Total copies cannot be less than the {book.copies_on_loan} copies currently on loan', 'error')
+            categories = Category.query.all()
+            return render_template('books/form.html', book=book, categories=categories)
             
         book.title = request.form['title']
         book.author = request.form.get('author', '')
@@ -119,7 +119,7 @@ def edit_book(book_id):
         book.isbn = request.form.get('isbn', '')
         book.unique_id = request.form['unique_id']
         book.category_id = category_id
-        book.total_copies = int(request.form.get('total_copies', 1))
+        book.total_copies = total_copies
         book.shelf_location = request.form.get('shelf_location', '')
         
         try:
@@ -192,13 +192,8 @@ def api_search():
     """API endpoint for book search in borrowing forms"""
     query = request.args.get('q', '')
     if query:
-        books = Book.query.filter(
-            or_(
-                Book.title.contains(query),
-                Book.author.contains(query),
-                Book.unique_id.contains(query)
-            )
-        ).filter(Book.available_copies > 0).limit(10).all()
+        # Text matching uses the search index; availability is a column comparison in SQL
+        books = Book.query.filter(book_search_filter(query)).filter(Book.available_copies > 0).limit(10).all()
         
         return jsonify([{
             'id': b.id,
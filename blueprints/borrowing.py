@@ -69,33 +69,131 @@ def pay_fine_page(fine_id):
         flash('Fine paid successfully. Book return completed.', 'success')
         return redirect(url_for('borrowing.list_borrows'))
     return render_template('borrowing/pay_fine.html', fine=fine, student=student)
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+import base64
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required
 from models import Book, Student, Staff, BorrowRecord, Fine, db
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, undefer
 from datetime import datetime, timedelta
 from utils.audit_logger import log_action
-from utils.email_service import send_email, send_due_date_reminders, send_overdue_notices
+from utils import circulation
+from utils.circulation import BorrowError, ReturnError
+from utils.fine_engine import assess_loan_fine
+from utils.scan_station import scan_borrow, scan_return, lookup_code, ScanError
+from utils.email_service import queue_email, send_due_date_reminders, send_overdue_notices
 
 borrowing_bp = Blueprint('borrowing', __name__)
 
-@borrowing_bp.route('/')
-@login_required
-def list_borrows():
-    status = request.args.get('status', 'active')
+# Rows per page on the borrowing list
+BORROW_PAGE_SIZE = 50
+
+def _encode_cursor(borrow_record):
+    """Encode the (borrowed_at, id) position of a row as an opaque cursor"""
+    raw = f"{borrow_record.borrowed_at.isoformat()}|{borrow_record.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor):
+    """Decode a cursor into (borrowed_at, id); returns None if it is malformed"""
+    try:
+        borrowed_at, borrow_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(borrowed_at), int(borrow_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def _borrow_page(status, cursor=None, page_size=BORROW_PAGE_SIZE):
+    """
+    Fetch one page of borrow records, newest first, keyed on (borrowed_at, id)
+    
+    Book, student and staff rows are joined in the same query so rendering a
+    page does not trigger per-row lookups.
+    
+    Returns:
+        tuple: (list of BorrowRecord, cursor for the next page or None)
+    """
+    query = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book_ref),
+        joinedload(BorrowRecord.student_ref),
+        joinedload(BorrowRecord.staff_ref)
+    )
     
     if status == 'active':
-        borrows = BorrowRecord.query.filter_by(returned_at=None).order_by(BorrowRecord.borrowed_at.desc()).all()
+        query = query.filter(BorrowRecord.returned_at.is_(None))
     elif status == 'returned':
-        borrows = BorrowRecord.query.filter(BorrowRecord.returned_at.isnot(None)).order_by(BorrowRecord.returned_at.desc()).all()
+        query = query.filter(BorrowRecord.returned_at.isnot(None))
     elif status == 'overdue':
-        borrows = BorrowRecord.query.filter(
+        query = query.filter(
             BorrowRecord.returned_at.is_(None),
             BorrowRecord.due_date < datetime.utcnow()
-        ).all()
-    else:
-        borrows = BorrowRecord.query.order_by(BorrowRecord.borrowed_at.desc()).all()
+        )
+    
+    position = _decode_cursor(cursor) if cursor else None
+    if position:
+        query = query.filter(tuple_(BorrowRecord.borrowed_at, BorrowRecord.id) < position)
+    
+    # Fetch one extra row to know whether another page exists
+    borrows = query.order_by(
+        BorrowRecord.borrowed_at.desc(),
+        BorrowRecord.id.desc()
+    ).limit(page_size + 1).all()
+    
+    next_cursor = None
+    if len(borrows) > page_size:
+        borrows = borrows[:page_size]
+        next_cursor = _encode_cursor(borrows[-1])
+    
+    return borrows, next_cursor
+
+@borrowing_bp.route('/')
+@login_required
+def list_borrows():
+    status = request.args.get('status', 'active')
+    borrows, next_cursor = _borrow_page(status, request.args.get('cursor'))
+    
+    return render_template('borrowing/list.html', borrows=borrows, status=status, next_cursor=next_cursor)
+
+@borrowing_bp.route('/api/borrows')
+@login_required
+def api_list_borrows():
+    """Cursor-paginated JSON variant of the borrowing list"""
+    status = request.args.get('status', 'active')
+    limit = min(request.args.get('limit', BORROW_PAGE_SIZE, type=int), 200)
+    borrows, next_cursor = _borrow_page(status, request.args.get('cursor'), page_size=max(limit, 1))
     
-    return render_template('borrowing/list.html', borrows=borrows, status=status)
+    return jsonify({
+        'borrows': [{
+            'id': b.id,
+            'book_id': b.book_id,
+            'book_title': b.book_ref.title,
+            'book_unique_id': b.book_ref.unique_id,
+            'borrower_name': b.borrower_name,
+            'borrower_type': b.borrower_type,
+            'borrowed_at': b.borrowed_at.isoformat(),
+            'due_date': b.due_date.isoformat(),
+            'returned_at': b.returned_at.isoformat() if b.returned_at else None,
+            'is_overdue': b.is_overdue
+        } for b in borrows],
+        'next_cursor': next_cursor
+    })
+
+def _queue_borrow_confirmation(borrow_record, book, borrower, is_student):
+    """Queue the borrow confirmation email in the caller's transaction"""
+    borrow_date = borrow_record.borrowed_at.strftime('%Y-%m-%d %H:%M:%S')
+    subject = f"Library Book Borrowed - {book.title}"
+    if is_student:
+        due_date = borrow_record.due_date.strftime('%Y-%m-%d')
+        body = f"Dear {borrower.name},\n\nYou have successfully borrowed the following book from the Confucius Institute Library:\n\nBook: {book.title}\nAuthor: {book.author or 'N/A'}\nBorrow Date: {borrow_date}\nDue Date: {due_date}\nMaximum Days Allowed: 4 days\n\nPlease return the book on or before the due date to avoid penalties.\n\nThank you,\nConfucius Institute Library\nUniversity of Nairobi"
+        queue_email(borrower.email, subject, body, 'borrowed', borrower.id, borrow_record.id, commit=False)
+    else:
+        body = f"Dear {borrower.name},\n\nYou have successfully borrowed the following book from the Confucius Institute Library:\n\nBook: {book.title}\nAuthor: {book.author or 'N/A'}\nBorrow Date: {borrow_date}\n\nPlease return the book when you are done reading.\n\nThank you,\nConfucius Institute Library\nUniversity of Nairobi"
+        queue_email(borrower.email, subject, body, 'borrowed', None, borrow_record.id, commit=False)
+
+def _queue_return_confirmation(borrow_record, book, borrower, is_student, commit=True):
+    """Queue the return confirmation email (commit=False: in the caller's transaction)"""
+    subject = f"Book Returned - {book.title}"
+    body = f"Dear {borrower.name},\n\nYou have successfully returned the book:\n\nBook: {book.title}\nAuthor: {book.author or 'N/A'}\nReturned At: {borrow_record.returned_at.strftime('%Y-%m-%d %H:%M:%S')}\n\nThank you for using the library!\nConfucius Institute Library\nUniversity of Nairobi"
+    queue_email(borrower.email, subject, body, 'return_confirmation', borrower.id if is_student else None,
+                borrow_record.id, commit=commit)
 
 @borrowing_bp.route('/borrow', methods=['GET', 'POST'])
 @login_required
@@ -105,62 +203,206 @@ def borrow_book():
         borrower_type = request.form['borrower_type']
         student_id = request.form.get('student_id') if borrower_type == 'student' else None
         staff_id = request.form.get('staff_id') if borrower_type == 'staff' else None
-        book = Book.query.get_or_404(book_id)
-
-        # Check availability
-        if book.available_copies <= 0:
-            flash('This book is not available for borrowing', 'error')
-            return redirect(url_for('borrowing.list_borrows'))
-
-        # Check student borrowing limits
-        if student_id:
-            student = Student.query.get_or_404(student_id)
-            if student.current_borrowed_count >= 3:
-                flash('Student has reached the maximum borrowing limit of 3 books', 'error')
-                return redirect(url_for('borrowing.list_borrows'))
-
-        # Create borrow record
-        borrow_record = BorrowRecord(
-            book_id=book_id,
-            student_id=student_id,
-            staff_id=staff_id,
-            notes=request.form.get('notes', '')
-        )
 
+        # Availability, the student limit, the loan and its confirmation email are one locked transaction
         try:
-            db.session.add(borrow_record)
+            borrow_record, book, borrower = circulation.borrow_book(
+                book_id, student_id=student_id, staff_id=staff_id, notes=request.form.get('notes', '')
+            )
+            borrower_name = borrower.name if borrower else 'Unknown'
+            if borrower:
+                _queue_borrow_confirmation(borrow_record, book, borrower, bool(student_id))
+            book_title = book.title
             db.session.commit()
-            if student_id:
-                borrower_name = student.name
-                student_email = student.email
-                borrow_date = borrow_record.borrowed_at.strftime('%Y-%m-%d %H:%M:%S') if hasattr(borrow_record, 'borrowed_at') and borrow_record.borrowed_at else datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-                due_date = borrow_record.due_date.strftime('%Y-%m-%d') if hasattr(borrow_record, 'due_date') and borrow_record.due_date else (datetime.utcnow() + timedelta(days=4)).strftime('%Y-%m-%d')
-                subject = f"Library Book Borrowed - {book.title}"
-                body = f"Dear {borrower_name},\n\nYou have successfully borrowed the following book from the Confucius Institute Library:\n\nBook: {book.title}\nAuthor: {book.author or 'N/A'}\nBorrow Date: {borrow_date}\nDue Date: {due_date}\nMaximum Days Allowed: 4 days\n\nPlease return the book on or before the due date to avoid penalties.\n\nThank you,\nConfucius Institute Library\nUniversity of Nairobi"
-                send_email(student_email, subject, body, 'borrowed', student.id, borrow_record.id)
-            elif staff_id:
-                staff_member = Staff.query.get_or_404(staff_id)
-                borrower_name = staff_member.name
-                staff_email = staff_member.email
-                borrow_date = borrow_record.borrowed_at.strftime('%Y-%m-%d %H:%M:%S') if hasattr(borrow_record, 'borrowed_at') and borrow_record.borrowed_at else datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
-                subject = f"Library Book Borrowed - {book.title}"
-                body = f"Dear {borrower_name},\n\nYou have successfully borrowed the following book from the Confucius Institute Library:\n\nBook: {book.title}\nAuthor: {book.author or 'N/A'}\nBorrow Date: {borrow_date}\n\nPlease return the book when you are done reading.\n\nThank you,\nConfucius Institute Library\nUniversity of Nairobi"
-                send_email(staff_email, subject, body, 'borrowed', staff_member.id, borrow_record.id)
-            else:
-                borrower_name = 'Unknown'
-            flash(f'Book "{book.title}" successfully borrowed by {borrower_name}', 'success')
+            flash(f'Book "{book_title}" successfully borrowed by {borrower_name}', 'success')
+            return redirect(url_for('borrowing.list_borrows'))
+        except BorrowError as e:
+            flash(str(e), 'error')
             return redirect(url_for('borrowing.list_borrows'))
         except Exception as e:
             db.session.rollback()
             flash('Error processing borrow request', 'error')
             return redirect(url_for('borrowing.list_borrows'))
     # Only render the form for GET requests
-    students = Student.query.order_by(Student.name).all()
+    students = Student.query.options(undefer(Student.current_borrowed_count)).order_by(Student.name).all()
     staff = Staff.query.order_by(Staff.name).all()
-    all_books = Book.query.order_by(Book.title).all()
-    books = [book for book in all_books if book.available_copies > 0]
+    books = Book.query.filter(Book.available_copies > 0).order_by(Book.title).all()
     return render_template('borrowing/borrow_form.html', students=students, staff=staff, books=books)
             
+def _bulk_request():
+    """Book identifiers and borrower from a bulk JSON request"""
+    data = request.get_json(silent=True) or {}
+    books = data.get('books')
+    # bool is an int subclass, so true/false would otherwise pass as book 1/0
+    if not isinstance(books, list) or any(isinstance(book, bool) or not isinstance(book, (int, str))
+                                          for book in books):
+        raise BorrowError('books must be a list of book ids or unique_ids')
+    borrower = {}
+    for key in ('student_id', 'staff_id'):
+        value = data.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            raise BorrowError(f'{key} must be a whole number')
+        borrower[key] = value or None
+    return books, borrower['student_id'], borrower['staff_id'], data
+
+def _book_summary(book_ids, books):
+    """Title and copy count for each distinct book, in first-requested order"""
+    counts = {}
+    for book_id in book_ids:
+        counts[book_id] = counts.get(book_id, 0) + 1
+    return [{'id': book_id, 'title': books[book_id].title, 'unique_id': books[book_id].unique_id, 'copies': copies}
+            for book_id, copies in counts.items()]
+
+@borrowing_bp.route('/api/bulk-borrow', methods=['POST'])
+@login_required
+def api_bulk_borrow():
+    """
+    Lend a class set in one transaction
+
+    JSON body: books (list of book ids or unique_ids, one entry per copy),
+    student_id or staff_id, and optional notes. The borrower gets one email
+    listing every book and one audit entry covers the whole set.
+    """
+    try:
+        identifiers, student_id, staff_id, data = _bulk_request()
+        borrow_records, books, borrower = circulation.bulk_borrow(
+            identifiers, student_id=student_id, staff_id=staff_id, notes=data.get('notes', '')
+        )
+        summary = _book_summary([record.book_id for record in borrow_records], books)
+        due_date = borrow_records[0].due_date
+        record_ids = [record.id for record in borrow_records]
+
+        lines = '\n'.join(f"- {item['title']} ({item['unique_id']}) x {item['copies']}" for item in summary)
+        subject = f"Library Books Borrowed - {len(borrow_records)} copies"
+        body = f"Dear {borrower.name},\n\nYou have borrowed the following books from the Confucius Institute Library:\n\n{lines}\n\nTotal copies: {len(borrow_records)}\nDue Date: {due_date.strftime('%Y-%m-%d')}\n\nPlease return them on or before the due date.\n\nThank you,\nConfucius Institute Library\nUniversity of Nairobi"
+        queue_email(borrower.email, subject, body, 'borrowed', student_id, record_ids[0], commit=False)
+        db.session.commit()
+    except BorrowError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error processing bulk borrow'}), 500
+
+    log_action(
+        action='BULK_BORROW',
+        entity_type='BorrowRecord',
+        details={'student_id': student_id, 'staff_id': staff_id, 'copies': len(record_ids),
+                 'books': summary, 'borrow_record_ids': record_ids}
+    )
+    return jsonify({
+        'borrowed': len(record_ids),
+        'borrow_record_ids': record_ids,
+        'due_date': due_date.isoformat(),
+        'books': summary
+    }), 201
+
+@borrowing_bp.route('/api/bulk-return', methods=['POST'])
+@login_required
+def api_bulk_return():
+    """
+    Take back a class set in one transaction
+
+    JSON body: books (list of book ids or unique_ids, one entry per copy)
+    and the student_id or staff_id they are on loan to. Late loans are
+    fined in one batch; the borrower gets one email and one audit entry
+    covers the whole set.
+    """
+    try:
+        identifiers, student_id, staff_id, data = _bulk_request()
+        returned, books, fines = circulation.bulk_return(identifiers, student_id=student_id, staff_id=staff_id)
+        summary = _book_summary([record.book_id for record in returned], books)
+        record_ids = [record.id for record in returned]
+        fines_due = sum(fine.amount for fine in fines if not fine.paid and not fine.waived)
+        borrower = db.session.get(Student, student_id) if student_id else db.session.get(Staff, staff_id)
+
+        lines = '\n'.join(f"- {item['title']} ({item['unique_id']}) x {item['copies']}" for item in summary)
+        fine_note = f"\n\nLate return fines due: KES {fines_due:.2f}" if fines_due else ''
+        subject = f"Books Returned - {len(returned)} copies"
+        body = f"Dear {borrower.name},\n\nYou have successfully returned the following books:\n\n{lines}\n\nTotal copies: {len(returned)}{fine_note}\n\nThank you for using the library!\nConfucius Institute Library\nUniversity of Nairobi"
+        queue_email(borrower.email, subject, body, 'return_confirmation', student_id, record_ids[0], commit=False)
+        db.session.commit()
+    except (BorrowError, ReturnError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error processing bulk return'}), 500
+
+    log_action(
+        action='BULK_RETURN',
+        entity_type='BorrowRecord',
+        details={'student_id': student_id, 'staff_id': staff_id, 'copies': len(record_ids),
+                 'books': summary, 'borrow_record_ids': record_ids, 'fines_due': fines_due}
+    )
+    return jsonify({
+        'returned': len(record_ids),
+        'borrow_record_ids': record_ids,
+        'fines_due': fines_due,
+        'books': summary
+    })
+
+@borrowing_bp.route('/api/scan', methods=['POST'])
+@login_required
+def api_scan():
+    """
+    Scan-station borrow or return in one call
+
+    JSON body: action ('borrow' or 'return'), book (unique_id or ISBN) and
+    student (registration, ID or passport number; optional for returns).
+    Codes are resolved through an in-process LRU cache and the whole
+    transaction, confirmation email included, commits once.
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    try:
+        if action == 'borrow':
+            borrow_record, book, student = scan_borrow(data.get('book'), data.get('student'))
+            _queue_borrow_confirmation(borrow_record, book, student, True)
+            result = {
+                'action': 'borrow',
+                'borrow_record_id': borrow_record.id,
+                'due_date': borrow_record.due_date.isoformat(),
+                'book': {'id': book.id, 'title': book.title, 'unique_id': book.unique_id},
+                'student': {'id': student.id, 'name': student.name, 'identifier': student.identifier}
+            }
+        elif action == 'return':
+            borrow_record, book, fine = scan_return(data.get('book'), data.get('student'))
+            if borrow_record.student_id:
+                _queue_return_confirmation(borrow_record, book, borrow_record.student_ref, True, commit=False)
+            elif borrow_record.staff_id:
+                _queue_return_confirmation(borrow_record, book, borrow_record.staff_ref, False, commit=False)
+            result = {
+                'action': 'return',
+                'borrow_record_id': borrow_record.id,
+                'book': {'id': book.id, 'title': book.title, 'unique_id': book.unique_id},
+                'fine': {'id': fine.id, 'amount': fine.amount} if fine and not fine.paid and not fine.waived else None
+            }
+        else:
+            return jsonify({'error': "action must be 'borrow' or 'return'"}), 400
+        db.session.commit()
+    except (ScanError, BorrowError, ReturnError) as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error processing scan'}), 500
+    return jsonify(result), 201 if action == 'borrow' else 200
+
+@borrowing_bp.route('/api/scan/lookup')
+@login_required
+def api_scan_lookup():
+    """What a scanned code refers to: a book with its free copies, or a student with their open loans"""
+    try:
+        kind, row = lookup_code(request.args.get('code'))
+    except ScanError as e:
+        return jsonify({'error': str(e)}), 400
+    if kind == 'book':
+        return jsonify({'type': 'book', 'id': row.id, 'title': row.title, 'unique_id': row.unique_id,
+                        'available_copies': row.available_copies})
+    if kind == 'student':
+        return jsonify({'type': 'student', 'id': row.id, 'name': row.name, 'identifier': row.identifier,
+                        'current_borrowed': row.current_borrowed_count, 'total_fines': row.total_fines})
+    return jsonify({'error': 'Unknown code'}), 404
+
 @borrowing_bp.route('/return/<int:borrow_id>', methods=['GET', 'POST'])
 @login_required
 def return_book(borrow_id):
@@ -171,64 +413,33 @@ def return_book(borrow_id):
         return redirect(url_for('borrowing.list_borrows'))
     
     if request.method == 'POST':
-        # Check if overdue
-        is_overdue = borrow_record.is_overdue
-        borrow_record.returned_at = datetime.utcnow()
-        borrow_record.notes = request.form.get('notes', borrow_record.notes)
-        fine = None
-        if is_overdue and borrow_record.student_id:
-            # Calculate fine amount (40 KES per day overdue)
-            days_overdue = borrow_record.days_overdue
-            fine_amount = days_overdue * 40
-            # Create fine if not already exists
-            fine = Fine.query.filter_by(borrow_record_id=borrow_record.id, student_id=borrow_record.student_id).first()
-            if not fine:
-                fine = Fine(
-                    student_id=borrow_record.student_id,
-                    borrow_record_id=borrow_record.id,
-                    amount=fine_amount,
-                    reason=f"Late return: {days_overdue} days overdue",
-                )
-                db.session.add(fine)
         try:
-            db.session.commit()
-            # Send return confirmation email
+            # Closes the loan only if it is still open, so a double submit cannot return it twice
+            borrow_record, fine = circulation.return_loan(borrow_id, notes=request.form.get('notes'))
+            # Send return confirmation email (queued in the same transaction)
             if borrow_record.student_id:
-                student = Student.query.get(borrow_record.student_id)
-                subject = f"Book Returned - {borrow_record.book_ref.title}"
-                body = f"Dear {student.name},\n\nYou have successfully returned the book:\n\nBook: {borrow_record.book_ref.title}\nAuthor: {borrow_record.book_ref.author or 'N/A'}\nReturned At: {borrow_record.returned_at.strftime('%Y-%m-%d %H:%M:%S')}\n\nThank you for using the library!\nConfucius Institute Library\nUniversity of Nairobi"
-                from utils.email_service import send_email
-                send_email(student.email, subject, body, 'return_confirmation', student.id, borrow_record.id)
+                _queue_return_confirmation(borrow_record, borrow_record.book_ref, borrow_record.student_ref, True, commit=False)
             elif borrow_record.staff_id:
-                staff = Staff.query.get(borrow_record.staff_id)
-                subject = f"Book Returned - {borrow_record.book_ref.title}"
-                body = f"Dear {staff.name},\n\nYou have successfully returned the book:\n\nBook: {borrow_record.book_ref.title}\nAuthor: {borrow_record.book_ref.author or 'N/A'}\nReturned At: {borrow_record.returned_at.strftime('%Y-%m-%d %H:%M:%S')}\n\nThank you for using the library!\nConfucius Institute Library\nUniversity of Nairobi"
-                from utils.email_service import send_email
-                send_email(staff.email, subject, body, 'return_confirmation', staff.id, borrow_record.id)
-            if is_overdue and fine:
-                flash(f'This book was overdue. Fine of KES {fine.amount} must be paid.', 'warning')
-                return redirect(url_for('borrowing.pay_fine_page', fine_id=fine.id))
-            else:
-                flash('Book returned successfully', 'success')
-                return redirect(url_for('borrowing.list_borrows'))
+                _queue_return_confirmation(borrow_record, borrow_record.book_ref, borrow_record.staff_ref, False, commit=False)
+            db.session.commit()
+        except ReturnError as e:
+            flash(str(e), 'error')
+            return redirect(url_for('borrowing.list_borrows'))
         except Exception as e:
             db.session.rollback()
             flash('Error processing return', 'error')
+        else:
+            if fine and not fine.paid and not fine.waived:
+                flash(f'This book was overdue. Fine of KES {fine.amount} must be paid.', 'warning')
+                return redirect(url_for('borrowing.pay_fine', fine_id=fine.id))
+            flash('Book returned successfully', 'success')
+            return redirect(url_for('borrowing.list_borrows'))
     # Ensure fine exists for overdue books before rendering form
+    fine = None
     if borrow_record.is_overdue and borrow_record.student_id:
-        fine = Fine.query.filter_by(borrow_record_id=borrow_record.id, student_id=borrow_record.student_id).first()
-        if not fine:
-            days_overdue = borrow_record.days_overdue
-            fine_amount = days_overdue * 40
-            fine = Fine(
-                student_id=borrow_record.student_id,
-                borrow_record_id=borrow_record.id,
-                amount=fine_amount,
-                reason=f"Late return: {days_overdue} days overdue",
-            )
-            db.session.add(fine)
-            db.session.commit()
-    return render_template('borrowing/return_form.html', borrow_record=borrow_record)
+        fine = assess_loan_fine(borrow_record)
+        db.session.commit()
+    return render_template('borrowing/return_form.html', borrow_record=borrow_record, fine=fine)
 
 @borrowing_bp.route('/fines')
 @login_required
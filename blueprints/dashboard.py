@@ -1,9 +1,8 @@
 
-from flask import Blueprint, render_template, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, flash, redirect, url_for, current_app, request
 from flask_login import login_required, current_user
-from models import Student, Staff, Book, BorrowRecord, Fine, db
-from sqlalchemy import func
 from utils.email_service import send_due_date_reminders, send_overdue_notices, get_email_statistics
+from utils.dashboard_metrics import get_dashboard_metrics
 from utils.decorators import library_access_required
 import os
 
@@ -53,22 +52,8 @@ def email_system():
 @login_required
 @library_access_required
 def index():
-    # Get dashboard statistics
-    total_students = Student.query.count()
-    total_staff = Staff.query.count()
-    total_books = Book.query.count()
-    active_borrows = BorrowRecord.query.filter_by(returned_at=None).count()
-    total_fines = db.session.query(func.sum(Fine.amount)).filter_by(paid=False).scalar() or 0
-    
-    # Get recent activities
-    recent_borrows = BorrowRecord.query.order_by(BorrowRecord.borrowed_at.desc()).limit(5).all()
-    overdue_books = BorrowRecord.query.filter(
-        BorrowRecord.returned_at.is_(None),
-        BorrowRecord.due_date < func.now()
-    ).all()
-    
-    # Get email statistics
-    email_stats = get_email_statistics()
+    # Dashboard statistics come from the metrics snapshot, not fresh queries
+    metrics = get_dashboard_metrics(refresh=request.args.get('refresh') == '1')
     
     # Check if email service is configured (prefer app config if available)
     try:
@@ -85,14 +70,7 @@ def index():
     has_email_service = has_gmail or has_sendgrid
     
     return render_template('dashboard/index.html',
-                         total_students=total_students,
-                         total_staff=total_staff,
-                         total_books=total_books,
-                         active_borrows=active_borrows,
-                         total_fines=total_fines,
-                         recent_borrows=recent_borrows,
-                         overdue_books=overdue_books,
-                         email_stats=email_stats,
+                         **metrics,
                          has_email_service=has_email_service,
                          has_gmail=has_gmail,
                          has_sendgrid=has_sendgrid)
@@ -1,15 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from werkzeug.utils import secure_filename
-from models import db, Video, Audio, ExamPaper, MarkingScheme, Announcement
+from models import db, Video, Audio, ExamPaper, MarkingScheme, Announcement, MediaFile
 from functools import wraps
-import os
+from utils.media_ingest import ingest_upload, media_status
 
 dukan_admin_bp = Blueprint('dukan_admin', __name__, template_folder='../templates')
 
 ALLOWED_AUDIO_EXTENSIONS = {'mp3', 'wav', 'm4a', 'ogg'}
 ALLOWED_PDF_EXTENSIONS = {'pdf'}
-UPLOAD_FOLDER = 'static/uploads'
 
 def admin_required(f):
     @wraps(f)
@@ -23,6 +21,15 @@ def admin_required(f):
 def allowed_file(filename, allowed_extensions):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
 
+def wants_json():
+    """API clients ask for JSON and get 202 with the queued job status instead of a redirect"""
+    return request.accept_mimetypes.best == 'application/json'
+
+def processing_note(media, deduplicated):
+    if deduplicated:
+        return 'An identical file was already uploaded, so the stored copy is reused.'
+    return f"Processing queued: {', '.join(job.job_type.replace('_', ' ') for job in media.jobs)}."
+
 
 @dukan_admin_bp.route('/')
 @login_required
@@ -146,17 +153,14 @@ def add_audio():
             return redirect(url_for('dukan_admin.add_audio'))
         
         if audio_file and allowed_file(audio_file.filename, ALLOWED_AUDIO_EXTENSIONS):
-            filename = secure_filename(audio_file.filename)
-            audio_path = os.path.join(UPLOAD_FOLDER, 'audios', filename)
-            os.makedirs(os.path.dirname(audio_path), exist_ok=True)
-            audio_file.save(audio_path)
+            media, deduplicated = ingest_upload(audio_file, 'audios', current_user.id)
+            audio_path = media.file_path
             
+            transcript_media = None
             transcript_path = None
             if transcript_file and allowed_file(transcript_file.filename, ALLOWED_PDF_EXTENSIONS):
-                transcript_filename = secure_filename(transcript_file.filename)
-                transcript_path = os.path.join(UPLOAD_FOLDER, 'transcripts', transcript_filename)
-                os.makedirs(os.path.dirname(transcript_path), exist_ok=True)
-                transcript_file.save(transcript_path)
+                transcript_media, transcript_deduplicated = ingest_upload(transcript_file, 'transcripts', current_user.id)
+                transcript_path = transcript_media.file_path
             
             audio = Audio(
                 title=title,
@@ -171,7 +175,13 @@ def add_audio():
             
             db.session.add(audio)
             db.session.commit()
-            flash('Audio added successfully!', 'success')
+            if wants_json():
+                return jsonify({
+                    'audio_id': audio.id,
+                    'media': media_status(media, deduplicated),
+                    'transcript': media_status(transcript_media, transcript_deduplicated) if transcript_media else None
+                }), 202
+            flash(f'Audio added successfully! {processing_note(media, deduplicated)}', 'success')
             return redirect(url_for('dukan_admin.audios'))
         else:
             flash('Invalid audio file format. Allowed formats: mp3, wav, m4a, ogg', 'danger')
@@ -217,10 +227,8 @@ def add_exam_paper():
             return redirect(url_for('dukan_admin.add_exam_paper'))
         
         if pdf_file and allowed_file(pdf_file.filename, ALLOWED_PDF_EXTENSIONS):
-            filename = secure_filename(pdf_file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, 'exam_papers', filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            pdf_file.save(file_path)
+            media, deduplicated = ingest_upload(pdf_file, 'exam_papers', current_user.id)
+            file_path = media.file_path
             
             exam_paper = ExamPaper(
                 title=title,
@@ -235,7 +243,9 @@ def add_exam_paper():
             
             db.session.add(exam_paper)
             db.session.commit()
-            flash('Exam paper added successfully!', 'success')
+            if wants_json():
+                return jsonify({'exam_paper_id': exam_paper.id, 'media': media_status(media, deduplicated)}), 202
+            flash(f'Exam paper added successfully! {processing_note(media, deduplicated)}', 'success')
             return redirect(url_for('dukan_admin.exam_papers'))
         else:
             flash('Invalid file format. Only PDF files are allowed.', 'danger')
@@ -280,10 +290,8 @@ def add_marking_scheme():
             return redirect(url_for('dukan_admin.add_marking_scheme'))
         
         if pdf_file and allowed_file(pdf_file.filename, ALLOWED_PDF_EXTENSIONS):
-            filename = secure_filename(pdf_file.filename)
-            file_path = os.path.join(UPLOAD_FOLDER, 'marking_schemes', filename)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            pdf_file.save(file_path)
+            media, deduplicated = ingest_upload(pdf_file, 'marking_schemes', current_user.id)
+            file_path = media.file_path
             
             marking_scheme = MarkingScheme(
                 title=title,
@@ -302,7 +310,9 @@ def add_marking_scheme():
                 exam_paper.marking_scheme_id = marking_scheme.id
                 db.session.commit()
             
-            flash('Marking scheme added successfully!', 'success')
+            if wants_json():
+                return jsonify({'marking_scheme_id': marking_scheme.id, 'media': media_status(media, deduplicated)}), 202
+            flash(f'Marking scheme added successfully! {processing_note(media, deduplicated)}', 'success')
             return redirect(url_for('dukan_admin.marking_schemes'))
         else:
             flash('Invalid file format. Only PDF files are allowed.', 'danger')
@@ -368,3 +378,11 @@ def delete_announcement(announcement_id):
     db.session.commit()
     flash('Announcement deleted successfully!', 'success')
     return redirect(url_for('dukan_admin.announcements'))
+
+
+@dukan_admin_bp.route('/media/<int:media_id>/status')
+@login_required
+@admin_required
+def media_job_status(media_id):
+    media = MediaFile.query.get_or_404(media_id)
+    return jsonify(media_status(media))
@@ -1,9 +1,9 @@
-from flask import Blueprint, render_template, request, send_from_directory, flash, redirect, url_for
+from flask import Blueprint, render_template, request, flash, redirect, url_for, abort
 from flask_login import login_required, current_user, login_user, logout_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from models import db, Video, Audio, ExamPaper, MarkingScheme, Announcement, StudentProgress, Student, User
+from utils.media_delivery import send_media
 from datetime import datetime
-import os
 
 elearning_bp = Blueprint('elearning', __name__, template_folder='../templates')
 
@@ -188,6 +188,16 @@ def audio_detail(audio_id):
     return render_template('elearning/audio_detail.html', audio=audio)
 
 
+@elearning_bp.route('/audios/<int:audio_id>/stream')
+@login_required
+def stream_audio(audio_id):
+    audio = Audio.query.get_or_404(audio_id)
+    if not audio.is_active:
+        abort(404)
+    # Players seek with Range requests, so each one only fetches the part being listened to
+    return send_media(audio.file_path)
+
+
 @elearning_bp.route('/exam-papers')
 @login_required
 def exam_papers():
@@ -233,10 +243,10 @@ def download_exam_paper(paper_id):
     if not paper.is_active:
         flash('This exam paper is no longer available.', 'warning')
         return redirect(url_for('elearning.exam_papers'))
-    log_progress('exam_paper', paper_id, 'download')
-    directory = os.path.dirname(paper.file_path)
-    filename = os.path.basename(paper.file_path)
-    return send_from_directory(directory, filename, as_attachment=True)
+    # Only the first request counts as a download; range and revalidation requests re-fetch it
+    if not request.range and not request.if_none_match:
+        log_progress('exam_paper', paper_id, 'download')
+    return send_media(paper.file_path, as_attachment=True)
 
 
 @elearning_bp.route('/marking-schemes')
@@ -279,10 +289,9 @@ def download_marking_scheme(scheme_id):
     if not scheme.is_active:
         flash('This marking scheme is no longer available.', 'warning')
         return redirect(url_for('elearning.marking_schemes'))
-    log_progress('marking_scheme', scheme_id, 'download')
-    directory = os.path.dirname(scheme.file_path)
-    filename = os.path.basename(scheme.file_path)
-    return send_from_directory(directory, filename, as_attachment=True)
+    if not request.range and not request.if_none_match:
+        log_progress('marking_scheme', scheme_id, 'download')
+    return send_media(scheme.file_path, as_attachment=True)
 
 
 @elearning_bp.route('/announcements')
@@ -1,8 +1,11 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
+from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 from models import Book, Student, Staff, BorrowRecord, Fine, Category, db
 from sqlalchemy import func, desc
 from datetime import datetime, timedelta
+from utils.stock_report import get_stock_page, count_stock_rows, LOW_STOCK_THRESHOLD
+from utils.activity_rollup import get_monthly_activity
+from utils import analytics_store
 
 reports_bp = Blueprint('reports', __name__)
 
@@ -23,6 +26,11 @@ def most_borrowed_books():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard.index'))
     
+    # Served from the columnar export when there is one, keeping the scan off the live tables
+    if analytics_store.use_analytics_export():
+        return render_template('reports/most_borrowed.html', books=analytics_store.most_borrowed_books(20),
+                             data_as_of=analytics_store.get_export_time())
+    
     # Get most borrowed books with borrow count
     subquery = db.session.query(
         BorrowRecord.book_id,
@@ -63,6 +71,10 @@ def category_trends():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard.index'))
     
+    if analytics_store.use_analytics_export():
+        return render_template('reports/category_trends.html', categories=analytics_store.category_trends(),
+                             data_as_of=analytics_store.get_export_time())
+    
     # Get borrowing trends by category
     category_stats = db.session.query(
         Category.name,
@@ -87,22 +99,11 @@ def stock_status():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard.index'))
     
-    # Get stock information for all books
-    books = Book.query.all()
-    stock_data = []
-    
-    for book in books:
-        stock_data.append({
-            'title': book.title,
-            'author': book.author,
-            'unique_id': book.unique_id,
-            'category': book.category_name,
-            'total_copies': book.total_copies,
-            'available_copies': book.available_copies,
-            'borrowed_copies': book.total_copies - book.available_copies
-        })
+    # Get one page of stock information
+    after_id = request.args.get('after', type=int)
+    stock_data, next_after_id = get_stock_page(after_id=after_id)
     
-    return render_template('reports/stock_status.html', books=stock_data)
+    return render_template('reports/stock_status.html', books=stock_data, next_after_id=next_after_id)
 
 @reports_bp.route('/overdue-items')
 @login_required
@@ -138,23 +139,24 @@ def stock_depletion():
         flash('Access denied. Admin privileges required.', 'error')
         return redirect(url_for('dashboard.index'))
     
-    # Get books with low stock (less than 2 available copies)
-    low_stock_books = []
-    books = Book.query.all()
-    
-    for book in books:
-        if book.available_copies <= 1:
-            low_stock_books.append({
-                'title': book.title,
-                'author': book.author,
-                'unique_id': book.unique_id,
-                'category': book.category_name,
-                'total_copies': book.total_copies,
-                'available_copies': book.available_copies,
-                'borrowed_copies': book.total_copies - book.available_copies
-            })
-    
-    return render_template('reports/stock_depletion.html', low_stock_books=low_stock_books)
+    # Books with at most `threshold` available copies, filtered in SQL
+    threshold = current_app.config.get('LOW_STOCK_THRESHOLD', LOW_STOCK_THRESHOLD)
+    if 'threshold' in request.args:
+        requested = request.args.get('threshold', type=int)
+        if requested is None or requested < 0:
+            flash('Threshold must be a whole number of copies (0 or more)', 'error')
+        else:
+            threshold = requested
+    
+    after_id = request.args.get('after', type=int)
+    low_stock_books, next_after_id = get_stock_page(max_available=threshold, after_id=after_id)
+    low_stock_count = count_stock_rows(max_available=threshold)
+    
+    return render_template('reports/stock_depletion.html', 
+                         low_stock_books=low_stock_books,
+                         low_stock_count=low_stock_count,
+                         next_after_id=next_after_id,
+                         threshold=threshold)
 
 @reports_bp.route('/inactive-students')
 @login_required
@@ -166,14 +168,34 @@ def inactive_students():
     # Students with no borrowing activity in the last 6 months
     six_months_ago = datetime.utcnow() - timedelta(days=180)
     
-    # Get students who have never borrowed or haven't borrowed in 6 months
+    if analytics_store.use_analytics_export():
+        return render_template('reports/inactive_students.html',
+                             inactive_students=analytics_store.inactive_students(six_months_ago),
+                             months_threshold=6,
+                             data_as_of=analytics_store.get_export_time())
+    
+    # Get students who have never borrowed or haven't borrowed in 6 months,
+    # with their last borrow date from the same grouped query
     from sqlalchemy import or_
-    inactive_students = db.session.query(Student).outerjoin(BorrowRecord).group_by(Student.id).having(
+    last_borrow = func.max(BorrowRecord.borrowed_at)
+    rows = db.session.query(Student, last_borrow.label('last_borrow')).outerjoin(BorrowRecord).group_by(Student.id).having(
         or_(
-            func.max(BorrowRecord.borrowed_at) < six_months_ago,
-            func.max(BorrowRecord.borrowed_at).is_(None)
+            last_borrow < six_months_ago,
+            last_borrow.is_(None)
         )
-    ).all()
+    ).order_by(last_borrow.asc().nullsfirst(), Student.name).all()
+    
+    now = datetime.utcnow()
+    inactive_students = []
+    for student, last_borrowed_at in rows:
+        last_activity = last_borrowed_at or student.created_at
+        inactive_students.append({
+            'id': student.id,
+            'name': student.name,
+            'identifier': student.identifier,
+            'last_borrow_date': last_borrowed_at.strftime('%Y-%m-%d') if last_borrowed_at else None,
+            'days_inactive': (now - last_activity).days if last_activity else None
+        })
     
     return render_template('reports/inactive_students.html', 
                          inactive_students=inactive_students,
@@ -185,12 +207,8 @@ def charts_data():
     if current_user.role != 'admin':
         return jsonify({'error': 'Access denied'}), 403
     
-    # Borrowing trends by month (last 12 months) - PostgreSQL compatible
-    one_year_ago = datetime.utcnow() - timedelta(days=365)
-    monthly_borrows = db.session.query(
-        func.to_char(BorrowRecord.borrowed_at, 'YYYY-MM').label('month'),
-        func.count(BorrowRecord.id).label('count')
-    ).filter(BorrowRecord.borrowed_at >= one_year_ago).group_by(func.to_char(BorrowRecord.borrowed_at, 'YYYY-MM')).all()
+    # Borrowing and fine trends by month (last 12 months), from the pre-rolled activity buckets
+    monthly_activity = get_monthly_activity(12)
     
     # Category distribution
     category_distribution = db.session.query(
@@ -206,24 +224,17 @@ def charts_data():
     if uncategorized_borrows > 0:
         category_distribution = list(category_distribution) + [('Uncategorized', uncategorized_borrows)]
     
-    # Fine collection trends (last 12 months) - PostgreSQL compatible
-    fine_trends = db.session.query(
-        func.to_char(Fine.created_at, 'YYYY-MM').label('month'),
-        func.sum(Fine.amount).label('total_amount'),
-        func.count(Fine.id).label('fine_count')
-    ).filter(
-        Fine.created_at >= one_year_ago,
-        Fine.paid == True
-    ).group_by(func.to_char(Fine.created_at, 'YYYY-MM')).all()
-    
     # Student vs Staff borrowing ratio
     student_borrows = BorrowRecord.query.filter(BorrowRecord.student_id.isnot(None)).count()
     staff_borrows = BorrowRecord.query.filter(BorrowRecord.staff_id.isnot(None)).count()
     
     return jsonify({
-        'monthly_borrows': [{'month': item[0], 'count': item[1]} for item in monthly_borrows],
+        'monthly_borrows': [{'month': item['month'], 'count': item['borrows_count']} for item in monthly_activity],
+        'monthly_returns': [{'month': item['month'], 'count': item['returns_count']} for item in monthly_activity],
         'category_distribution': [{'category': item[0], 'count': item[1]} for item in category_distribution],
-        'fine_trends': [{'month': item[0], 'amount': float(item[1]), 'count': item[2]} for item in fine_trends],
+        'fine_trends': [{'month': item['month'], 'amount': item['fines_collected_amount'], 'count': item['fines_collected_count'],
+                         'issued_amount': item['fines_issued_amount'], 'issued_count': item['fines_issued_count']}
+                        for item in monthly_activity],
         'borrower_ratio': {
             'students': student_borrows,
             'staff': staff_borrows
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models import Student, BorrowRecord, Fine, db
 from sqlalchemy import or_
+from sqlalchemy.orm import joinedload, undefer
 from utils.audit_logger import log_action
 from utils.decorators import library_access_required
 
@@ -19,8 +20,10 @@ def check_library_access():
 @library_access_required
 def list_students():
     search = request.args.get('search', '')
+    # Open-loan counts come back with the rows instead of one COUNT per student
+    query = Student.query.options(undefer(Student.current_borrowed_count))
     if search:
-        students = Student.query.filter(
+        students = query.filter(
             or_(
                 Student.name.contains(search),
                 Student.registration_number.contains(search),
@@ -29,7 +32,7 @@ def list_students():
             )
         ).all()
     else:
-        students = Student.query.all()
+        students = query.all()
     
     return render_template('students/list.html', students=students, search=search)
 
@@ -85,7 +88,7 @@ def add_student():
 @login_required
 def view_student(student_id):
     student = Student.query.get_or_404(student_id)
-    borrow_history = BorrowRecord.query.filter_by(student_id=student_id).order_by(BorrowRecord.borrowed_at.desc()).all()
+    borrow_history = BorrowRecord.query.options(joinedload(BorrowRecord.book_ref)).filter_by(student_id=student_id).order_by(BorrowRecord.borrowed_at.desc()).all()
     unpaid_fines = Fine.query.filter_by(student_id=student_id, paid=False).all()
     
     return render_template('students/detail.html', 
@@ -145,7 +148,7 @@ def api_search():
     """API endpoint for student search in borrowing forms"""
     query = request.args.get('q', '')
     if query:
-        students = Student.query.filter(
+        students = Student.query.options(undefer(Student.current_borrowed_count)).filter(
             or_(
                 Student.name.contains(query),
                 Student.registration_number.contains(query),
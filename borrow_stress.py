@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Concurrent Borrow Stress Test for Library System
+
+Starts several "desks" (threads, each with its own database session) at the
+same moment and has them all try to lend the last copies of one book, and
+push one student past the borrowing limit, through utils.circulation.
+Afterwards it checks that no book has more open loans than copies, no
+student has more than MAX_STUDENT_LOANS and every copies_on_loan counter
+matches its borrow records.
+
+Runs on a throwaway SQLite database unless --database-url points at a
+scratch database (for example PostgreSQL); rows are added to it.
+
+Usage:
+    python borrow_stress.py                          # 20 desks on a temporary SQLite file
+    python borrow_stress.py --desks 50 --rounds 10
+    python borrow_stress.py --database-url postgresql://localhost/library_stress
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+def main():
+    parser = argparse.ArgumentParser(description='Check borrows stay within copies and limits under concurrency')
+    parser.add_argument('--desks', type=int, default=20, help='Concurrent desks (threads)')
+    parser.add_argument('--rounds', type=int, default=5, help='Borrow attempts per desk for each contested target')
+    parser.add_argument('--copies', type=int, default=3, help='Copies of the contested book')
+    parser.add_argument('--database-url', help='Scratch database to run against (default: temporary SQLite file)')
+
+    args = parser.parse_args()
+
+    # The app reads DATABASE_URL when it is created, so this comes before importing it
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    else:
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'borrow_stress.db')}"
+    os.environ.setdefault('SESSION_SECRET', 'borrow-stress')
+    from main import app
+    from models import db, Book, BorrowRecord, Student
+    from utils.circulation import borrow_book, BorrowError, MAX_STUDENT_LOANS
+
+    run = uuid.uuid4().hex[:8]
+    with app.app_context():
+        contested = Book(title=f'Stress {run}', unique_id=f'STRESS-{run}', total_copies=args.copies)
+        other_books = [Book(title=f'Stress {run} {i}', unique_id=f'STRESS-{run}-{i}', total_copies=args.desks)
+                       for i in range(args.rounds)]
+        students = [Student(name=f'Stress {run} {i}', registration_number=f'STRESS/{run}/{i}',
+                            email=f'stress{i}@example.com') for i in range(args.desks + 1)]
+        db.session.add_all([contested] + other_books + students)
+        db.session.commit()
+        contested_id = contested.id
+        other_ids = [book.id for book in other_books]
+        busy_student_id, *desk_student_ids = [student.id for student in students]
+
+    outcomes = {'lent': 0, 'refused': 0, 'failed': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(args.desks)
+
+    def desk(index):
+        attempts = []
+        for round_number in range(args.rounds):
+            # Everyone wants the contested book, and everyone lends to the same busy student
+            attempts.append((contested_id, desk_student_ids[index]))
+            attempts.append((other_ids[round_number], busy_student_id))
+        with app.app_context():
+            start.wait()
+            for book_id, student_id in attempts:
+                try:
+                    borrow_book(book_id, student_id=student_id)
+                    db.session.commit()
+                    outcome = 'lent'
+                except BorrowError:
+                    outcome = 'refused'
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Desk {index}: {e}")
+                    outcome = 'failed'
+                with lock:
+                    outcomes[outcome] += 1
+            db.session.remove()
+
+    started = time.perf_counter()
+    desks = [threading.Thread(target=desk, args=(i,)) for i in range(args.desks)]
+    for thread in desks:
+        thread.start()
+    for thread in desks:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        contested_loans = BorrowRecord.query.filter_by(book_id=contested_id, returned_at=None).count()
+        busy_loans = BorrowRecord.query.filter_by(student_id=busy_student_id, returned_at=None).count()
+        drifted = [book.id for book in Book.query.filter(Book.id.in_([contested_id] + other_ids))
+                   if book.copies_on_loan != BorrowRecord.query.filter_by(book_id=book.id, returned_at=None).count()]
+
+    print(f"{sum(outcomes.values())} attempts in {elapsed:.2f}s: "
+          f"{outcomes['lent']} lent, {outcomes['refused']} refused, {outcomes['failed']} failed")
+    problems = []
+    if contested_loans > args.copies:
+        problems.append(f"contested book lent {contested_loans} times with {args.copies} copies")
+    if busy_loans > MAX_STUDENT_LOANS:
+        problems.append(f"busy student holds {busy_loans} books (limit {MAX_STUDENT_LOANS})")
+    if drifted:
+        problems.append(f"copies_on_loan counters out of step for books {drifted}")
+    if outcomes['failed']:
+        problems.append(f"{outcomes['failed']} attempts failed with errors")
+
+    if problems:
+        for problem in problems:
+            print(f"✗ {problem}")
+        sys.exit(1)
+    print(f"✓ No over-lends: contested book {contested_loans}/{args.copies}, "
+          f"busy student {busy_loans}/{MAX_STUDENT_LOANS}")
+
+if __name__ == '__main__':
+    main()
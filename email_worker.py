@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Outbound Email Worker for Library System
+
+Borrow and return confirmations are written to the email outbox instead of
+being sent inside the request. This worker delivers them, retrying failed
+messages with exponential backoff and dead-lettering them after
+EMAIL_MAX_ATTEMPTS attempts.
+
+Usage:
+    python email_worker.py                  # Run continuously
+    python email_worker.py --once           # Deliver whatever is due and exit (for cron)
+    python email_worker.py --requeue-dead   # Retry dead-lettered messages, then run
+
+For local testing point SMTP_HOST/SMTP_PORT at a stand-in server, e.g.:
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_USE_TLS=false python email_worker.py --once
+"""
+
+import argparse
+import time
+from main import app
+from utils.email_service import drain_outbox, requeue_dead_emails, create_smtp_pool
+
+def main():
+    parser = argparse.ArgumentParser(description='Deliver queued email notifications')
+    parser.add_argument('--once', action='store_true', help='Drain the due messages once and exit')
+    parser.add_argument('--requeue-dead', action='store_true', help='Requeue dead-lettered messages before draining')
+    parser.add_argument('--batch-size', type=int, default=50, help='Messages claimed per pass')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the outbox is empty')
+    parser.add_argument('--concurrency', type=int, default=None, help='Parallel SMTP sessions (default: SMTP_POOL_SIZE or 4)')
+    
+    args = parser.parse_args()
+    
+    # Use Flask app context
+    with app.app_context():
+        if args.requeue_dead:
+            print(f"✓ Requeued {requeue_dead_emails()} dead-lettered emails")
+        
+        # Sessions stay authenticated between passes
+        smtp_pool = create_smtp_pool(args.concurrency)
+        try:
+            while True:
+                processed = drain_outbox(args.batch_size, smtp_pool)
+                if processed:
+                    print(f"✓ Processed {processed} queued emails")
+                elif args.once:
+                    break
+                else:
+                    time.sleep(args.poll_interval)
+        finally:
+            if smtp_pool:
+                smtp_pool.close()
+
+if __name__ == '__main__':
+    main()
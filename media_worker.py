@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Media Processing Worker for Library System
+
+E-learning uploads are stored as soon as they arrive and their processing is
+queued as media jobs. This worker runs them:
+
+    audio_transcode  Loudness-normalised mono MP3 at MEDIA_AUDIO_BITRATE (ffmpeg)
+    pdf_linearize    "Fast web view" PDF so the first page shows before the rest loads (qpdf)
+    thumbnail        PNG of the first page (pdftoppm, from poppler-utils)
+
+A job whose tool is not installed is marked skipped and the file is served
+as uploaded. A failed job is retried after MEDIA_JOB_RETRY_BASE_SECONDS,
+doubling each time, until MEDIA_JOB_MAX_ATTEMPTS; --once leaves jobs that
+are not yet due for a later run.
+
+Usage:
+    python media_worker.py                  # Run continuously
+    python media_worker.py --once           # Process whatever is queued and exit (for cron)
+"""
+
+import argparse
+import time
+from main import app
+from utils.media_ingest import process_media_jobs
+
+def main():
+    parser = argparse.ArgumentParser(description='Process queued media jobs')
+    parser.add_argument('--once', action='store_true', help='Process the queued jobs once and exit')
+    parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per pass')
+    parser.add_argument('--poll-interval', type=float, default=5.0, help='Seconds to sleep when the queue is empty')
+
+    args = parser.parse_args()
+
+    # Use Flask app context
+    with app.app_context():
+        while True:
+            processed = process_media_jobs(args.batch_size)
+            if processed:
+                print(f"✓ Processed {processed} media jobs")
+            elif args.once:
+                break
+            else:
+                time.sleep(args.poll_interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""add materialized copies_on_loan counter to book
+
+Revision ID: a1c3e5f70001
+Revises: 
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1c3e5f70001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the column on fresh databases
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('book')]
+    if 'copies_on_loan' not in columns:
+        with op.batch_alter_table('book', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('copies_on_loan', sa.Integer(), nullable=False, server_default='0'))
+
+    # Backfill from the open borrow records
+    op.execute(
+        "UPDATE book SET copies_on_loan = ("
+        "SELECT COUNT(*) FROM borrow_record "
+        "WHERE borrow_record.book_id = book.id AND borrow_record.returned_at IS NULL)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('book', schema=None) as batch_op:
+        batch_op.drop_column('copies_on_loan')
@@ -0,0 +1,36 @@
+"""add notification_ledger table so reminder reruns skip borrows already notified
+
+Revision ID: a7c9e1f20007
+Revises: f6b8d0e10006
+Create Date: 2026-10-19 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c9e1f20007'
+down_revision = 'f6b8d0e10006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the table on fresh databases
+    if 'notification_ledger' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'notification_ledger',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('borrow_record_id', sa.Integer(), nullable=False),
+            sa.Column('email_type', sa.String(length=50), nullable=False),
+            sa.Column('period', sa.String(length=10), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['borrow_record_id'], ['borrow_record.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('borrow_record_id', 'email_type', 'period', name='uq_notification_ledger_key')
+        )
+
+
+def downgrade():
+    op.drop_table('notification_ledger')
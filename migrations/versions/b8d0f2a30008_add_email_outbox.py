@@ -0,0 +1,53 @@
+"""add email_outbox table for queued borrow/return emails
+
+Revision ID: b8d0f2a30008
+Revises: a7c9e1f20007
+Create Date: 2026-10-19 09:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d0f2a30008'
+down_revision = 'a7c9e1f20007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the table on fresh databases
+    inspector = sa.inspect(op.get_bind())
+    if 'email_outbox' not in inspector.get_table_names():
+        op.create_table(
+            'email_outbox',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('recipient_email', sa.String(length=120), nullable=False),
+            sa.Column('subject', sa.String(length=200), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+            sa.Column('email_type', sa.String(length=50), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=True),
+            sa.Column('borrow_record_id', sa.Integer(), nullable=True),
+            sa.Column('queued_by', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+            sa.Column('claimed_at', sa.DateTime(), nullable=True),
+            sa.Column('claim_token', sa.String(length=32), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('sent_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['student_id'], ['student.id']),
+            sa.ForeignKeyConstraint(['borrow_record_id'], ['borrow_record.id']),
+            sa.ForeignKeyConstraint(['queued_by'], ['user.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+    # The hot-path index migration skipped this one if the table did not exist yet
+    if 'ix_email_outbox_status_next_attempt' not in {ix['name'] for ix in inspector.get_indexes('email_outbox')}:
+        op.create_index('ix_email_outbox_status_next_attempt', 'email_outbox', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_status_next_attempt', table_name='email_outbox')
+    op.drop_table('email_outbox')
@@ -0,0 +1,32 @@
+"""add manifest and checksum to backup_log for incremental backups
+
+Revision ID: c3e5a7b90003
+Revises: b2d4f6a80002
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e5a7b90003'
+down_revision = 'b2d4f6a80002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the columns on fresh databases
+    columns = [c['name'] for c in sa.inspect(op.get_bind()).get_columns('backup_log')]
+    with op.batch_alter_table('backup_log', schema=None) as batch_op:
+        if 'manifest' not in columns:
+            batch_op.add_column(sa.Column('manifest', sa.Text(), nullable=True))
+        if 'checksum' not in columns:
+            batch_op.add_column(sa.Column('checksum', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('backup_log', schema=None) as batch_op:
+        batch_op.drop_column('checksum')
+        batch_op.drop_column('manifest')
@@ -0,0 +1,35 @@
+"""add next_attempt_at to media_job for retry backoff
+
+Revision ID: c9e1a3b40009
+Revises: b8d0f2a30008
+Create Date: 2026-10-19 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1a3b40009'
+down_revision = 'b8d0f2a30008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the column on fresh databases
+    inspector = sa.inspect(op.get_bind())
+    if 'next_attempt_at' not in [c['name'] for c in inspector.get_columns('media_job')]:
+        with op.batch_alter_table('media_job', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    if 'ix_media_job_status_next_attempt' not in {ix['name'] for ix in inspector.get_indexes('media_job')}:
+        op.create_index('ix_media_job_status_next_attempt', 'media_job', ['status', 'next_attempt_at'], unique=False)
+
+    # Queued jobs are due straight away
+    op.execute("UPDATE media_job SET next_attempt_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE next_attempt_at IS NULL")
+
+
+def downgrade():
+    op.drop_index('ix_media_job_status_next_attempt', table_name='media_job')
+    with op.batch_alter_table('media_job', schema=None) as batch_op:
+        batch_op.drop_column('next_attempt_at')
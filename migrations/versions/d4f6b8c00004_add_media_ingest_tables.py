@@ -0,0 +1,60 @@
+"""add media_file and media_job tables for the upload ingest pipeline
+
+Revision ID: d4f6b8c00004
+Revises: c3e5a7b90003
+Create Date: 2026-10-18 14:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4f6b8c00004'
+down_revision = 'c3e5a7b90003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the tables on fresh databases
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'media_file' not in tables:
+        op.create_table(
+            'media_file',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sha256', sa.String(length=64), nullable=False),
+            sa.Column('file_path', sa.String(length=500), nullable=False),
+            sa.Column('original_path', sa.String(length=500), nullable=False),
+            sa.Column('original_name', sa.String(length=200), nullable=True),
+            sa.Column('size', sa.Integer(), nullable=False),
+            sa.Column('thumbnail_path', sa.String(length=500), nullable=True),
+            sa.Column('created_by', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['created_by'], ['user.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sha256')
+        )
+    if 'media_job' not in tables:
+        op.create_table(
+            'media_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('media_file_id', sa.Integer(), nullable=False),
+            sa.Column('job_type', sa.String(length=30), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('claimed_at', sa.DateTime(), nullable=True),
+            sa.Column('claim_token', sa.String(length=32), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['media_file_id'], ['media_file.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_media_job_status_created', 'media_job', ['status', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_media_job_status_created', table_name='media_job')
+    op.drop_table('media_job')
+    op.drop_table('media_file')
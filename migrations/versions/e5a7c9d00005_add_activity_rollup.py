@@ -0,0 +1,37 @@
+"""add activity_rollup table for portable report chart aggregates
+
+Revision ID: e5a7c9d00005
+Revises: d4f6b8c00004
+Create Date: 2026-10-18 15:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a7c9d00005'
+down_revision = 'd4f6b8c00004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the table on fresh databases;
+    # fill it from existing history with `flask backfill-activity-rollup`
+    if 'activity_rollup' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            'activity_rollup',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('period', sa.String(length=5), nullable=False),
+            sa.Column('bucket_start', sa.Date(), nullable=False),
+            sa.Column('metric', sa.String(length=20), nullable=False),
+            sa.Column('count', sa.Integer(), nullable=False),
+            sa.Column('amount', sa.Float(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('period', 'bucket_start', 'metric', name='uq_activity_rollup_bucket')
+        )
+
+
+def downgrade():
+    op.drop_table('activity_rollup')
@@ -0,0 +1,27 @@
+"""add fine (student_id, paid) index for per-student fine totals
+
+Revision ID: f6b8d0e10006
+Revises: e5a7c9d00005
+Create Date: 2026-10-18 17:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6b8d0e10006'
+down_revision = 'e5a7c9d00005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # create_all() in the app factory already builds the index on fresh databases
+    inspector = sa.inspect(op.get_bind())
+    if 'ix_fine_student_paid' not in {ix['name'] for ix in inspector.get_indexes('fine')}:
+        op.create_index('ix_fine_student_paid', 'fine', ['student_id', 'paid'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_fine_student_paid', table_name='fine')
@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.ext.hybrid import hybrid_property
 from datetime import datetime, timedelta
 
 # Create SQLAlchemy instance that will be initialized in app.py
@@ -48,15 +49,7 @@ class Student(db.Model):
         else:
             return self.passport_number
     
-    @property
-    def current_borrowed_count(self):
-        """Get current number of borrowed books"""
-        return BorrowRecord.query.filter_by(student_id=self.id, returned_at=None).count()
-    
-    @property
-    def total_fines(self):
-        """Get total unpaid fines"""
-        return sum(fine.amount for fine in self.fines if not fine.paid)
+    # current_borrowed_count and total_fines are SQL aggregates, mapped below Fine
 
 class Staff(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -78,17 +71,21 @@ class Book(db.Model):
     unique_id = db.Column(db.String(50), unique=True, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=True)
     total_copies = db.Column(db.Integer, default=1)
+    copies_on_loan = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by utils.circulation
     shelf_location = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     borrow_records = db.relationship('BorrowRecord', backref='book_ref', lazy=True)
     
-    @property
+    @hybrid_property
     def available_copies(self):
-        """Get number of available copies"""
-        borrowed_count = BorrowRecord.query.filter_by(book_id=self.id, returned_at=None).count()
-        return self.total_copies - borrowed_count
+        """Get number of available copies from the materialized on-loan counter"""
+        return (self.total_copies or 0) - (self.copies_on_loan or 0)
+    
+    @available_copies.expression
+    def available_copies(cls):
+        return cls.total_copies - cls.copies_on_loan
     
     @property
     def category_name(self):
@@ -96,6 +93,17 @@ class Book(db.Model):
         return self.category_ref.name if self.category_ref else 'Uncategorized'
 
 class BorrowRecord(db.Model):
+    __table_args__ = (
+        db.Index('ix_borrow_record_book_returned', 'book_id', 'returned_at'),
+        db.Index('ix_borrow_record_student_returned', 'student_id', 'returned_at'),
+        db.Index('ix_borrow_record_borrowed_at_id', 'borrowed_at', 'id'),
+        # Open loans only: overdue and reminder scans never touch returned books, so this
+        # partial index stands in for a (returned_at, due_date) composite at a fraction of the size
+        db.Index('ix_borrow_record_open_due', 'due_date',
+                 sqlite_where=db.text('returned_at IS NULL'),
+                 postgresql_where=db.text('returned_at IS NULL')),
+    )
+    
     @property
     def fines(self):
         return Fine.query.filter_by(borrow_record_id=self.id).all()
@@ -111,11 +119,12 @@ class BorrowRecord(db.Model):
     def __init__(self, **kwargs):
         super(BorrowRecord, self).__init__(**kwargs)
         if not self.due_date:
-            # Students get 3 days, staff gets 30 days default
-            if self.student_id:
-                self.due_date = datetime.utcnow() + timedelta(days=3)
-            else:
-                self.due_date = datetime.utcnow() + timedelta(days=30)
+            self.due_date = BorrowRecord.default_due_date(bool(self.student_id))
+    
+    @staticmethod
+    def default_due_date(is_student, borrowed_at=None):
+        """Students get 3 days, staff gets 30 days default"""
+        return (borrowed_at or datetime.utcnow()) + timedelta(days=3 if is_student else 30)
     
     @property
     def is_overdue(self):
@@ -144,6 +153,12 @@ class BorrowRecord(db.Model):
         return "Student" if self.student_id else "Staff"
 
 class Fine(db.Model):
+    __table_args__ = (
+        db.Index('ix_fine_paid_waived_created', 'paid', 'waived', 'created_at'),
+        db.Index('ix_fine_borrow_record', 'borrow_record_id'),
+        db.Index('ix_fine_student_paid', 'student_id', 'paid'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=False)
     borrow_record_id = db.Column(db.Integer, db.ForeignKey('borrow_record.id'), nullable=False)
@@ -169,7 +184,31 @@ class Fine(db.Model):
     borrow_record = db.relationship('BorrowRecord', backref='fine_ref', lazy=True)
     waived_by_user = db.relationship('User', backref='waived_fines', lazy=True)
 
+# Student aggregates as correlated subqueries. They are deferred: a single student
+# loads each on first access, while list views add
+# .options(undefer(Student.current_borrowed_count)) to fetch them with the rows.
+Student.current_borrowed_count = db.column_property(
+    db.select(db.func.count(BorrowRecord.id))
+    .where(BorrowRecord.student_id == Student.id, BorrowRecord.returned_at.is_(None))
+    .correlate_except(BorrowRecord)
+    .scalar_subquery(),
+    deferred=True
+)
+
+# Total unpaid fines
+Student.total_fines = db.column_property(
+    db.select(db.func.coalesce(db.func.sum(Fine.amount), 0.0))
+    .where(Fine.student_id == Student.id, Fine.paid.isnot(True))
+    .correlate_except(Fine)
+    .scalar_subquery(),
+    deferred=True
+)
+
 class AuditLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_audit_log_entity', 'entity_type', 'entity_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     action = db.Column(db.String(100), nullable=False)  # e.g., 'CREATE_STUDENT', 'BORROW_BOOK', 'WAIVE_FINE'
@@ -190,6 +229,8 @@ class BackupLog(db.Model):
     file_size = db.Column(db.Integer, nullable=True)  # Size in bytes
     status = db.Column(db.String(20), default='completed')  # completed, failed, in_progress
     description = db.Column(db.Text, nullable=True)
+    manifest = db.Column(db.Text, nullable=True)  # JSON chunk list for incremental backups
+    checksum = db.Column(db.String(64), nullable=True)  # SHA-256 of the database (incremental) or archive file
     
     # Relationships
     created_by_user = db.relationship('User', backref='backups_created', lazy=True)
@@ -207,6 +248,10 @@ class NotificationPreference(db.Model):
     student = db.relationship('Student', backref='notification_preferences', lazy=True)
 
 class EmailLog(db.Model):
+    __table_args__ = (
+        db.Index('ix_email_log_status_type', 'status', 'email_type'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     recipient_email = db.Column(db.String(120), nullable=False)
     subject = db.Column(db.String(200), nullable=False)
@@ -222,6 +267,53 @@ class EmailLog(db.Model):
     student = db.relationship('Student', backref='emails_received', lazy=True)
     borrow_record = db.relationship('BorrowRecord', backref='emails_sent', lazy=True)
 
+class NotificationLedger(db.Model):
+    """One row per notification already sent for a borrow in a period, so reruns skip it"""
+    __table_args__ = (
+        db.UniqueConstraint('borrow_record_id', 'email_type', 'period', name='uq_notification_ledger_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    borrow_record_id = db.Column(db.Integer, db.ForeignKey('borrow_record.id'), nullable=False)
+    email_type = db.Column(db.String(50), nullable=False)  # 'due_reminder', 'overdue_notice'
+    period = db.Column(db.String(10), nullable=False)  # Day the notice covers, e.g. '2025-10-07'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ActivityRollup(db.Model):
+    """Pre-aggregated circulation and fine activity per day and per month, for the report charts"""
+    __table_args__ = (
+        db.UniqueConstraint('period', 'bucket_start', 'metric', name='uq_activity_rollup_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.String(5), nullable=False)  # 'day' or 'month'
+    bucket_start = db.Column(db.Date, nullable=False)  # The day, or the first day of the month (UTC)
+    metric = db.Column(db.String(20), nullable=False)  # borrows, returns, fines_issued, fines_collected
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0.0)  # KES, for the fine metrics
+
+class EmailOutbox(db.Model):
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    email_type = db.Column(db.String(50), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('student.id'), nullable=True)
+    borrow_record_id = db.Column(db.Integer, db.ForeignKey('borrow_record.id'), nullable=True)
+    queued_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Credited in the audit trail on delivery
+    status = db.Column(db.String(20), default='pending')  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)  # Set by the worker that is delivering the message
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
 
 class Video(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -292,6 +384,40 @@ class MarkingScheme(db.Model):
     exam_papers = db.relationship('ExamPaper', backref='marking_scheme', lazy=True)
 
 
+class MediaFile(db.Model):
+    """One stored upload; records that upload identical bytes share it"""
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)  # File served to users (the processed copy once ready)
+    original_path = db.Column(db.String(500), nullable=False)  # File exactly as uploaded
+    original_name = db.Column(db.String(200), nullable=True)
+    size = db.Column(db.Integer, nullable=False)
+    thumbnail_path = db.Column(db.String(500), nullable=True)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class MediaJob(db.Model):
+    __table_args__ = (
+        db.Index('ix_media_job_status_created', 'status', 'created_at'),
+        db.Index('ix_media_job_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    media_file_id = db.Column(db.Integer, db.ForeignKey('media_file.id'), nullable=False)
+    job_type = db.Column(db.String(30), nullable=False)  # audio_transcode, pdf_linearize, thumbnail
+    status = db.Column(db.String(20), default='pending')  # pending, running, done, skipped, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)  # A failed job waits until then before it is retried
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    media_file = db.relationship('MediaFile', backref='jobs', lazy=True)
+
+
 class Announcement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
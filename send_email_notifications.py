@@ -10,36 +10,46 @@ Usage:
     python send_email_notifications.py --reminders    # Send due date reminders
     python send_email_notifications.py --overdue      # Send overdue notices
     python send_email_notifications.py --all          # Send both types
+    python send_email_notifications.py --all --concurrency 8   # Use 8 parallel SMTP sessions
+
+All emails in a run share a pool of authenticated SMTP sessions, so the
+TLS handshake and login happen once per session rather than once per email.
 """
 
 import argparse
 import sys
 from main import app
-from utils.email_service import send_due_date_reminders, send_overdue_notices
+from utils.email_service import send_due_date_reminders, send_overdue_notices, create_smtp_pool
 
 def main():
     parser = argparse.ArgumentParser(description='Send automated email notifications')
     parser.add_argument('--reminders', action='store_true', help='Send due date reminder emails')
     parser.add_argument('--overdue', action='store_true', help='Send overdue notice emails')
     parser.add_argument('--all', action='store_true', help='Send all email notifications')
+    parser.add_argument('--concurrency', type=int, default=None, help='Parallel SMTP sessions (default: SMTP_POOL_SIZE or 4)')
     
     args = parser.parse_args()
     
     # Use Flask app context
     with app.app_context():
-        if args.all or args.reminders:
-            print("Sending due date reminder emails...")
-            sent_count = send_due_date_reminders()
-            print(f"✓ Sent {sent_count} due date reminder emails")
-        
-        if args.all or args.overdue:
-            print("Sending overdue notice emails...")
-            sent_count = send_overdue_notices()
-            print(f"✓ Sent {sent_count} overdue notice emails")
-        
         if not (args.reminders or args.overdue or args.all):
             parser.print_help()
             sys.exit(1)
+        
+        smtp_pool = create_smtp_pool(args.concurrency)
+        try:
+            if args.all or args.reminders:
+                print("Sending due date reminder emails...")
+                sent_count = send_due_date_reminders(smtp_pool)
+                print(f"✓ Sent {sent_count} due date reminder emails")
+            
+            if args.all or args.overdue:
+                print("Sending overdue notice emails...")
+                sent_count = send_overdue_notices(smtp_pool)
+                print(f"✓ Sent {sent_count} overdue notice emails")
+        finally:
+            if smtp_pool:
+                smtp_pool.close()
 
 if __name__ == '__main__':
     main()
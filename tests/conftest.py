@@ -0,0 +1,72 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# The app reads its configuration when it is created, so the scratch database comes first
+_scratch = tempfile.mkdtemp(prefix='library_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_scratch, 'library.db')}"
+os.environ['SESSION_SECRET'] = 'tests'
+os.environ['AUDIT_LOG_MODE'] = 'sync'
+os.environ['BACKUP_DIR'] = os.path.join(_scratch, 'backups')
+for key in ('GMAIL_USER', 'GMAIL_APP_PASSWORD', 'SENDGRID_API_KEY'):
+    os.environ.pop(key, None)
+
+from main import app as _app
+from models import db, Book, Student, Staff
+
+@pytest.fixture(scope='session')
+def app():
+    _app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return _app
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.rollback()
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+@pytest.fixture
+def make_book(ctx):
+    """Add a book with a unique code and return its id"""
+    def make(total_copies=1, **fields):
+        code = uuid.uuid4().hex[:10]
+        book = Book(title=fields.pop('title', f'Book {code}'), unique_id=fields.pop('unique_id', f'T-{code}'),
+                    total_copies=total_copies, **fields)
+        db.session.add(book)
+        db.session.commit()
+        return book.id
+    return make
+
+@pytest.fixture
+def make_student(ctx):
+    """Add a student with a unique registration number and return its id"""
+    def make(**fields):
+        code = uuid.uuid4().hex[:10]
+        student = Student(name=fields.pop('name', f'Student {code}'),
+                          registration_number=fields.pop('registration_number', f'T/{code}'),
+                          email=fields.pop('email', f'{code}@example.com'), **fields)
+        db.session.add(student)
+        db.session.commit()
+        return student.id
+    return make
+
+@pytest.fixture
+def make_staff(ctx):
+    """Add a staff member and return its id"""
+    def make(**fields):
+        code = uuid.uuid4().hex[:10]
+        staff = Staff(name=fields.pop('name', f'Staff {code}'), staff_type=fields.pop('staff_type', 'teacher'),
+                      email=fields.pop('email', f'{code}@example.com'), **fields)
+        db.session.add(staff)
+        db.session.commit()
+        return staff.id
+    return make
@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+
+from models import db, ActivityRollup, BorrowRecord, Fine
+from utils.activity_rollup import backfill_activity_rollup, get_monthly_activity, record_activity
+
+def _bucket(period, bucket_start, metric):
+    row = ActivityRollup.query.filter_by(period=period, bucket_start=bucket_start, metric=metric).first()
+    return (row.count, row.amount) if row else (0, 0.0)
+
+def _loan(make_book, student_id, borrowed_at):
+    record = BorrowRecord(book_id=make_book(), student_id=student_id, borrowed_at=borrowed_at,
+                          due_date=borrowed_at + timedelta(days=14))
+    db.session.add(record)
+    db.session.commit()
+    return record
+
+def test_flushes_update_day_and_month_buckets(ctx, make_book, make_student):
+    student_id = make_student()
+    borrowed_at = datetime(1995, 3, 10, 9, 0)
+    record = _loan(make_book, student_id, borrowed_at)
+    _loan(make_book, student_id, datetime(1995, 3, 20, 9, 0))
+
+    assert _bucket('day', date(1995, 3, 10), 'borrows') == (1, 0.0)
+    assert _bucket('month', date(1995, 3, 1), 'borrows') == (2, 0.0)
+
+    record.returned_at = datetime(1995, 4, 2, 12, 0)
+    fine = Fine(student_id=student_id, borrow_record_id=record.id, amount=40.0, created_at=record.returned_at)
+    db.session.add(fine)
+    db.session.commit()
+    fine.paid, fine.paid_at = True, datetime(1995, 4, 5)
+    db.session.commit()
+
+    assert _bucket('month', date(1995, 4, 1), 'returns') == (1, 0.0)
+    assert _bucket('month', date(1995, 4, 1), 'fines_issued') == (1, 40.0)
+    assert _bucket('day', date(1995, 4, 5), 'fines_collected') == (1, 40.0)
+
+def test_rollback_leaves_buckets_untouched(ctx, make_book, make_student):
+    book_id, student_id = make_book(), make_student()
+    db.session.add(BorrowRecord(book_id=book_id, student_id=student_id, borrowed_at=datetime(1996, 5, 5),
+                                due_date=datetime(1996, 5, 19)))
+    db.session.flush()
+    db.session.rollback()
+    assert _bucket('month', date(1996, 5, 1), 'borrows') == (0, 0.0)
+
+def test_bulk_activity_is_recorded_explicitly(ctx):
+    record_activity([(datetime(1997, 7, 1), 'fines_issued', 3, 90.0), (datetime(1997, 7, 2), 'fines_issued', 1, 10.0)])
+    db.session.commit()
+    assert _bucket('month', date(1997, 7, 1), 'fines_issued') == (4, 100.0)
+
+def test_backfill_matches_incremental_maintenance(ctx, make_book, make_student):
+    student_id = make_student()
+    for day in (3, 3, 17):
+        record = _loan(make_book, student_id, datetime(1998, 9, day, 10, 0))
+    record.returned_at = datetime(1998, 10, 1)
+    db.session.add(Fine(student_id=student_id, borrow_record_id=record.id, amount=25.0, paid=True,
+                        paid_at=datetime(1998, 10, 2), created_at=datetime(1998, 10, 1)))
+    db.session.commit()
+
+    buckets = [('month', date(1998, 9, 1), 'borrows'), ('day', date(1998, 9, 3), 'borrows'),
+               ('month', date(1998, 10, 1), 'returns'), ('month', date(1998, 10, 1), 'fines_collected')]
+    incremental = [_bucket(*key) for key in buckets]
+    assert incremental == [(3, 0.0), (2, 0.0), (1, 0.0), (1, 25.0)]
+
+    assert backfill_activity_rollup() > 0
+    assert [_bucket(*key) for key in buckets] == incremental
+
+def test_monthly_activity_fills_quiet_months(ctx, make_book, make_student):
+    before = get_monthly_activity(3)
+    _loan(make_book, make_student(), datetime.utcnow())
+    after = get_monthly_activity(3)
+
+    assert [entry['month'] for entry in after] == [entry['month'] for entry in before]
+    assert after[-1]['month'] == datetime.utcnow().strftime('%Y-%m')
+    assert after[-1]['borrows_count'] == before[-1]['borrows_count'] + 1
+    assert set(after[0]) == {'month'} | {f'{metric}_{part}' for metric in
+                                         ('borrows', 'returns', 'fines_issued', 'fines_collected')
+                                         for part in ('count', 'amount')}
+
+def test_reassessed_and_adjusted_fines_match_the_backfill(ctx, make_book, make_student):
+    from utils.fine_engine import assess_overdue_fines
+    student_id = make_student()
+    growing = _loan(make_book, student_id, datetime(1991, 4, 14))
+    adjusted = _loan(make_book, student_id, datetime(1991, 4, 14))
+
+    first_run = datetime(1991, 5, 1, 12, 0)
+    assess_overdue_fines(now=first_run)
+    assess_overdue_fines(now=first_run + timedelta(days=3))
+    fine = Fine.query.filter_by(borrow_record_id=adjusted.id).one()
+    fine.amount, fine.adjustment_amount = 10.0, 10.0 - fine.amount
+    db.session.commit()
+
+    assert Fine.query.filter_by(borrow_record_id=growing.id).one().amount == 240.0
+    buckets = [('month', date(1991, 5, 1), 'fines_issued'), ('day', date(1991, 5, 1), 'fines_issued')]
+    incremental = [_bucket(*key) for key in buckets]
+    assert incremental[0] == (2, 250.0)
+
+    backfill_activity_rollup()
+    assert [_bucket(*key) for key in buckets] == incremental
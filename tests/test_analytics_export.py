@@ -0,0 +1,70 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+pytest.importorskip('duckdb')
+import pyarrow.parquet
+
+from sqlalchemy import func
+
+from models import db, BorrowRecord
+from utils import analytics_store
+from utils.analytics_store import export_analytics, most_borrowed_books, use_analytics_export
+
+@pytest.fixture
+def analytics_dir(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'ANALYTICS_DIR', str(tmp_path))
+    return tmp_path
+
+def _loan(book_id, student_id, borrowed_at):
+    db.session.add(BorrowRecord(book_id=book_id, student_id=student_id, borrowed_at=borrowed_at,
+                                due_date=borrowed_at + timedelta(days=14), returned_at=borrowed_at + timedelta(days=3)))
+    db.session.commit()
+
+def _partition(analytics_dir, month):
+    return analytics_dir / 'borrow_record' / f'month={month}' / 'data.parquet'
+
+def test_full_export_covers_every_row(ctx, analytics_dir, make_book, make_student):
+    _loan(make_book(), make_student(), datetime(1992, 1, 15))
+    summary = export_analytics(full=True)
+
+    assert summary['borrow_record']['rows'] == BorrowRecord.query.count()
+    assert pyarrow.parquet.read_table(_partition(analytics_dir, '1992-01')).num_rows >= 1
+    student_columns = pyarrow.parquet.read_schema(analytics_dir / 'student' / 'snapshot.parquet').names
+    assert 'email' not in student_columns and 'phone' not in student_columns
+
+def test_incremental_export_rewrites_only_changed_months(ctx, analytics_dir, make_book, make_student):
+    book_id, student_id = make_book(), make_student()
+    _loan(book_id, student_id, datetime(1992, 2, 10))
+    export_analytics(full=True)
+    untouched = _partition(analytics_dir, '1992-02').stat().st_mtime_ns
+
+    _loan(book_id, student_id, datetime(1993, 6, 1))
+    summary = export_analytics()
+
+    assert summary['borrow_record']['partitions'] <= 1 + analytics_store.ANALYTICS_REFRESH_MONTHS
+    assert _partition(analytics_dir, '1993-06').exists()
+    assert _partition(analytics_dir, '1992-02').stat().st_mtime_ns == untouched
+    assert not [name for name in os.listdir(analytics_dir) if name.endswith('.tmp')]
+
+def test_reports_read_the_export(app, ctx, analytics_dir, make_book, make_student, monkeypatch):
+    assert not use_analytics_export()
+    book_id, student_id = make_book(), make_student()
+    for day in range(1, 4):
+        _loan(book_id, student_id, datetime(1994, 3, day))
+    export_analytics(full=True)
+    assert use_analytics_export()
+
+    live = dict(db.session.query(BorrowRecord.book_id, func.count(BorrowRecord.id)).group_by(BorrowRecord.book_id))
+    exported = {book['id']: count for book, count in most_borrowed_books(len(live))}
+    assert exported == live
+
+    monkeypatch.setitem(app.config, 'REPORTS_SOURCE', 'live')
+    assert not use_analytics_export()
+
+def test_report_page_says_when_the_export_was_taken(ctx, client, analytics_dir):
+    export_analytics(full=True)
+    response = client.get('/reports/most-borrowed')
+    assert b'From the analytics export of' in response.data
@@ -0,0 +1,70 @@
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import event
+
+from models import db, AuditLog, User
+from utils.audit_logger import AuditWriter, log_action
+
+def _entry(action, user_id, **fields):
+    return dict({'user_id': user_id, 'action': action, 'entity_type': 'Test', 'entity_id': None,
+                 'details': None, 'ip_address': None, 'timestamp': datetime.utcnow()}, **fields)
+
+def _admin_id():
+    return User.query.filter_by(username='admin').first().id
+
+def _count(action):
+    db.session.rollback()
+    return AuditLog.query.filter_by(action=action).count()
+
+def test_entries_are_written_in_multi_row_batches(app, ctx):
+    action, user_id = f'BATCH_{uuid.uuid4().hex[:8]}', _admin_id()
+    inserts = []
+    listener = lambda conn, cursor, statement, *args: inserts.append(statement) if 'INSERT INTO audit_log' in statement else None
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        writer = AuditWriter(app, batch_size=100, flush_interval=5)
+        for _ in range(250):
+            writer.submit(_entry(action, user_id))
+        writer.close()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert _count(action) == 250
+    assert len(inserts) == 3
+
+def test_partial_batch_is_written_after_the_interval(app, ctx):
+    action = f'TIMED_{uuid.uuid4().hex[:8]}'
+    writer = AuditWriter(app, batch_size=100, flush_interval=0.05)
+    try:
+        writer.submit(_entry(action, _admin_id()))
+        deadline = time.monotonic() + 5
+        while _count(action) == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert _count(action) == 1
+    finally:
+        writer.close()
+
+def test_a_bad_entry_does_not_lose_the_batch(app, ctx):
+    action, user_id = f'MIXED_{uuid.uuid4().hex[:8]}', _admin_id()
+    writer = AuditWriter(app, batch_size=10, flush_interval=5)
+    writer.submit(_entry(action, user_id))
+    writer.submit(_entry(action, user_id, entity_type=None))
+    writer.submit(_entry(action, user_id))
+    writer.close()
+    assert _count(action) == 2
+
+def test_flush_writes_from_the_calling_thread(app, ctx):
+    action = f'FLUSH_{uuid.uuid4().hex[:8]}'
+    writer = AuditWriter(app, batch_size=2, flush_interval=5)
+    # Queued without starting the thread, as after a fork before the first submit
+    for _ in range(5):
+        writer._queue.put(_entry(action, _admin_id()))
+    writer.flush()
+    assert _count(action) == 5
+
+def test_log_action_commits_immediately_in_sync_mode(ctx):
+    action = f'SYNC_{uuid.uuid4().hex[:8]}'
+    log_action(action, 'Test', 7, {'n': 1}, user_id=_admin_id())
+    entry = AuditLog.query.filter_by(action=action).one()
+    assert (entry.entity_id, entry.details) == (7, '{"n": 1}')
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import pytest
+
+from models import db, BackupLog, User
+from utils import backup_engine
+from utils.backup_chunks import MANIFEST_SUFFIX
+from utils.backup_engine import (apply_sqlite_journal_mode, archive_extension, get_sqlite_database_path,
+                                 run_backup, verify_backup, materialize_backup, _snapshot_sqlite)
+
+def _journal_mode():
+    connection = sqlite3.connect(get_sqlite_database_path())
+    try:
+        return connection.execute('PRAGMA journal_mode').fetchone()[0].lower()
+    finally:
+        connection.close()
+
+def _backup(suffix):
+    admin = User.query.filter_by(username='admin').first()
+    backup_log = BackupLog(filename=f'test_{uuid.uuid4().hex}{suffix}', created_by=admin.id,
+                           description='test', status='queued')
+    db.session.add(backup_log)
+    db.session.commit()
+    assert run_backup(backup_log.id)
+    db.session.refresh(backup_log)
+    return backup_log
+
+@pytest.mark.parametrize('suffix', ['.db' + archive_extension(), MANIFEST_SUFFIX])
+def test_backup_leaves_journal_mode_alone(ctx, suffix, tmp_path):
+    mode = _journal_mode()
+    backup_log = _backup(suffix)
+    assert backup_log.status == 'completed'
+    assert _journal_mode() == mode
+    assert not os.path.exists(get_sqlite_database_path() + '-wal')
+    assert verify_backup(backup_log) == []
+
+    restored = tmp_path / 'restored.db'
+    materialize_backup(backup_log, str(restored))
+    assert sqlite3.connect(restored).execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+
+def test_wal_is_an_explicit_setting(app, ctx):
+    assert apply_sqlite_journal_mode() is None
+    app.config['SQLITE_JOURNAL_MODE'] = 'wal'
+    try:
+        db.session.remove()
+        assert apply_sqlite_journal_mode() == 'wal'
+        assert _backup('.db' + archive_extension()).status == 'completed'
+        assert _journal_mode() == 'wal'
+
+        app.config['SQLITE_JOURNAL_MODE'] = 'memory'
+        with pytest.raises(ValueError):
+            apply_sqlite_journal_mode()
+    finally:
+        app.config['SQLITE_JOURNAL_MODE'] = 'delete'
+        # Leaving WAL needs the only connection to the database
+        db.session.remove()
+        db.engine.dispose()
+        apply_sqlite_journal_mode()
+        app.config.pop('SQLITE_JOURNAL_MODE')
+    assert _journal_mode() == 'delete'
+
+def _probe_writes(path, stop, count=None, pause=0.05):
+    """Commit rows from another connection until stopped; returns each commit's latency"""
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    latencies = []
+    try:
+        while not stop.is_set() and (count is None or len(latencies) < count):
+            started = time.monotonic()
+            connection.execute('INSERT INTO backup_probe DEFAULT VALUES')
+            latencies.append(time.monotonic() - started)
+            time.sleep(pause)
+    finally:
+        connection.close()
+    return latencies
+
+def _snapshot_in_thread(app, snapshot_path):
+    def run():
+        with app.app_context():
+            _snapshot_sqlite(None, snapshot_path)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+@pytest.fixture
+def probe_table(ctx):
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE backup_probe (id INTEGER PRIMARY KEY)')
+    yield
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('DROP TABLE backup_probe')
+
+def _probe_rows(path):
+    return sqlite3.connect(path).execute('SELECT count(*) FROM backup_probe').fetchone()[0]
+
+def test_rollback_journal_copy_lets_writers_commit_between_steps(app, probe_table, tmp_path, monkeypatch):
+    assert _journal_mode() != 'wal'
+    monkeypatch.setattr(backup_engine, '_set_status', lambda *args, **kwargs: None)
+    for key, value in (('BACKUP_PAGES_PER_STEP', 2), ('BACKUP_STEP_PAUSE', 0.01), ('BACKUP_MAX_RESTARTS', 1000)):
+        monkeypatch.setitem(app.config, key, value)
+
+    snapshot_path = str(tmp_path / 'snapshot.db')
+    copy = _snapshot_in_thread(app, snapshot_path)
+    latencies = _probe_writes(get_sqlite_database_path(), threading.Event(), count=5)
+    writes_done_during_copy = copy.is_alive()
+    copy.join()
+
+    assert writes_done_during_copy
+    assert max(latencies) < 1
+    # The copy started over after each commit, so it holds every row
+    assert _probe_rows(snapshot_path) == 5
+
+def test_copy_finishes_in_one_pass_when_writes_keep_restarting_it(app, probe_table, tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_engine, '_set_status', lambda *args, **kwargs: None)
+    for key, value in (('BACKUP_PAGES_PER_STEP', 2), ('BACKUP_STEP_PAUSE', 0.01), ('BACKUP_MAX_RESTARTS', 2)):
+        monkeypatch.setitem(app.config, key, value)
+
+    snapshot_path = str(tmp_path / 'snapshot.db')
+    stop = threading.Event()
+    copy = _snapshot_in_thread(app, snapshot_path)
+    writer = threading.Thread(target=_probe_writes, args=(get_sqlite_database_path(), stop))
+    writer.start()
+    copy.join(timeout=60)
+    stop.set()
+    writer.join()
+
+    assert not copy.is_alive()
+    assert sqlite3.connect(snapshot_path).execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    assert _probe_rows(snapshot_path) >= 1
@@ -0,0 +1,86 @@
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pytest
+
+from models import db, BackupLog, User
+from utils.backup_chunks import (MANIFEST_SUFFIX, collect_garbage, materialize, store_snapshot,
+                                 verify_manifest, _find_chunk)
+from utils.backup_engine import find_backup_at, get_sqlite_database_path, run_backup
+
+PAGE = 4096
+
+def _snapshot(path, pages):
+    path.write_bytes(b''.join(bytes([fill]) * PAGE for fill in pages))
+    return str(path)
+
+def test_unchanged_chunks_are_stored_once(tmp_path):
+    chunks = str(tmp_path / 'chunks')
+    first, first_added = store_snapshot(_snapshot(tmp_path / 'a.db', [1, 2, 3, 4]), chunks, PAGE, 2 * PAGE)
+    second, second_added = store_snapshot(_snapshot(tmp_path / 'b.db', [1, 2, 3, 9]), chunks, PAGE, 2 * PAGE)
+
+    assert first['chunk_size'] == 2 * PAGE and len(first['chunks']) == 2
+    assert first['chunks'][0] == second['chunks'][0]
+    assert first['chunks'][1] != second['chunks'][1]
+    assert 0 < second_added < first_added
+    assert store_snapshot(str(tmp_path / 'b.db'), chunks, PAGE, 2 * PAGE)[1] == 0
+
+def test_chunks_never_split_a_page(tmp_path):
+    manifest, _ = store_snapshot(_snapshot(tmp_path / 'a.db', [1, 2, 3]), str(tmp_path / 'chunks'), PAGE, PAGE + 100)
+    assert manifest['chunk_size'] == PAGE
+
+def test_materialize_rebuilds_the_exact_file(tmp_path):
+    chunks = str(tmp_path / 'chunks')
+    source = _snapshot(tmp_path / 'a.db', [5, 6, 7])
+    manifest, _ = store_snapshot(source, chunks, PAGE, PAGE)
+    materialize(manifest, chunks, str(tmp_path / 'out.db'))
+    assert (tmp_path / 'out.db').read_bytes() == (tmp_path / 'a.db').read_bytes()
+
+def test_damage_is_detected_and_nothing_is_written(tmp_path):
+    chunks = str(tmp_path / 'chunks')
+    manifest, _ = store_snapshot(_snapshot(tmp_path / 'a.db', [5, 6, 7]), chunks, PAGE, PAGE)
+    os.remove(_find_chunk(chunks, manifest['chunks'][1]))
+
+    assert verify_manifest(manifest, chunks) == [f"Chunk {manifest['chunks'][1]} is missing"]
+    with pytest.raises(ValueError):
+        materialize(manifest, chunks, str(tmp_path / 'out.db'))
+    assert not (tmp_path / 'out.db').exists()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_garbage_collection_keeps_referenced_chunks(tmp_path):
+    chunks = str(tmp_path / 'chunks')
+    old, _ = store_snapshot(_snapshot(tmp_path / 'a.db', [1, 2]), chunks, PAGE, PAGE)
+    new, _ = store_snapshot(_snapshot(tmp_path / 'b.db', [1, 3]), chunks, PAGE, PAGE)
+
+    assert collect_garbage(chunks, [new]) == 1
+    assert verify_manifest(new, chunks) == []
+    assert verify_manifest(old, chunks) != []
+
+def _backup_row(created_at=None, status='queued'):
+    admin = User.query.filter_by(username='admin').first()
+    backup_log = BackupLog(filename=f'test_{uuid.uuid4().hex}{MANIFEST_SUFFIX}', created_by=admin.id,
+                           description='test', status=status)
+    if created_at:
+        backup_log.created_at = created_at
+    db.session.add(backup_log)
+    db.session.commit()
+    return backup_log
+
+def test_second_incremental_backup_adds_little(ctx):
+    first, second = _backup_row(), _backup_row()
+    assert run_backup(first.id) and run_backup(second.id)
+    db.session.refresh(second)
+    manifest = json.loads(second.manifest)
+    assert manifest['size'] == os.path.getsize(get_sqlite_database_path())
+    assert second.file_size < manifest['size'] / 2
+
+def test_find_backup_at_picks_the_latest_completed_backup(ctx):
+    early = _backup_row(datetime(1990, 1, 1), 'completed')
+    later = _backup_row(datetime(1990, 2, 1), 'completed')
+    _backup_row(datetime(1990, 3, 1), 'failed')
+
+    assert find_backup_at(datetime(1989, 12, 31)) is None
+    assert find_backup_at(datetime(1990, 1, 15)).id == early.id
+    assert find_backup_at(datetime(1990, 3, 15)).id == later.id
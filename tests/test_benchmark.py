@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from benchmark import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = {'dashboard', 'list_borrows', 'book_search', 'borrow_book', 'return_book'}
+
+def _run_benchmark(data_dir, *extra):
+    env = dict(os.environ, AUDIT_LOG_MODE='sync')
+    env.pop('DATABASE_URL', None)
+    output = os.path.join(data_dir, 'results.json')
+    subprocess.run([sys.executable, 'benchmark.py', '--books', '60', '--loans', '1500', '--requests', '5',
+                    '--warmup', '1', '--data-dir', data_dir, '--output', output, *extra],
+                   cwd=ROOT, env=env, check=True, capture_output=True, timeout=300)
+    with open(output) as f:
+        return json.load(f)
+
+def _snapshot_rows(data_dir):
+    connection = sqlite3.connect(os.path.join(data_dir, 'library_b60_l1500_s42.db'))
+    try:
+        return {
+            'books': connection.execute("SELECT title, author, total_copies FROM book WHERE unique_id LIKE 'SYN-%' ORDER BY id").fetchall(),
+            'loans': connection.execute('SELECT book_id, student_id, staff_id, returned_at IS NULL FROM borrow_record ORDER BY id').fetchall(),
+            'overcommitted': connection.execute('SELECT count(*) FROM book WHERE copies_on_loan > total_copies').fetchone()[0],
+            'counter_drift': connection.execute(
+                'SELECT count(*) FROM book b WHERE copies_on_loan != '
+                '(SELECT count(*) FROM borrow_record r WHERE r.book_id = b.id AND r.returned_at IS NULL)').fetchone()[0],
+        }
+    finally:
+        connection.close()
+
+def test_percentile_is_nearest_rank():
+    samples = list(range(1, 101))
+    assert (percentile(samples, 50), percentile(samples, 95), percentile(samples, 99)) == (50, 95, 99)
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) is None
+
+def test_benchmark_runs_every_endpoint_on_reproducible_data(tmp_path):
+    first_dir, second_dir = str(tmp_path / 'first'), str(tmp_path / 'second')
+    report = _run_benchmark(first_dir)
+    _run_benchmark(second_dir)
+
+    assert set(report['results']) == ENDPOINTS
+    for name, result in report['results'].items():
+        assert (result['requests'], result['errors']) == (5, 0), name
+        assert result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+    assert report['parameters']['loans'] == 1500
+
+    first, second = _snapshot_rows(first_dir), _snapshot_rows(second_dir)
+    assert first['books'] == second['books'] and first['loans'] == second['loans']
+    assert len(first['loans']) >= 1500
+    assert first['overcommitted'] == first['counter_drift'] == 0
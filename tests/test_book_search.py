@@ -0,0 +1,54 @@
+import uuid
+from models import db, Book
+from utils.book_search import book_search_filter
+
+def _matches(query):
+    return {book.id for book in Book.query.filter(book_search_filter(query)).all()}
+
+def test_sqlite_uses_the_fts_index(app):
+    assert app.config['BOOK_SEARCH_BACKEND'] == 'fts5'
+
+def test_matches_substrings_of_each_searchable_column(make_book):
+    word = uuid.uuid4().hex[:8]
+    by_title = make_book(title=f'The {word} Chronicles')
+    by_author = make_book(author=f'Ann {word}son')
+    by_isbn = make_book(isbn=f'978{word}')
+    other = make_book()
+
+    found = _matches(word[1:6])
+    assert {by_title, by_author, by_isbn} <= found
+    assert other not in found
+
+def test_short_queries_fall_back_to_like(make_book):
+    book_id = make_book(title='Zq')
+    assert book_id in _matches('Zq')
+
+def test_fts_syntax_in_queries_is_matched_literally(make_book):
+    book_id = make_book(title=f'Cats "and" dogs {uuid.uuid4().hex[:6]}')
+    assert book_id in _matches('"and" dogs')
+    assert _matches('title:* OR NEAR(') == set()
+
+def test_index_follows_inserts_updates_and_deletes(ctx, make_book):
+    old_word, new_word = uuid.uuid4().hex[:8], uuid.uuid4().hex[:8]
+    book_id = make_book(title=f'Before {old_word}')
+    assert book_id in _matches(old_word)
+
+    db.session.get(Book, book_id).title = f'After {new_word}'
+    db.session.commit()
+    assert book_id not in _matches(old_word)
+    assert book_id in _matches(new_word)
+
+    db.session.delete(db.session.get(Book, book_id))
+    db.session.commit()
+    assert _matches(new_word) == set()
+
+def test_api_search_lists_only_available_books(client, make_book):
+    word = uuid.uuid4().hex[:8]
+    on_shelf = make_book(total_copies=2, title=f'Shelf {word}')
+    all_out = make_book(total_copies=1, title=f'Loaned {word}')
+    db.session.get(Book, all_out).copies_on_loan = 1
+    db.session.commit()
+
+    results = client.get(f'/books/api/search?q={word}').get_json()
+    assert [(row['id'], row['available_copies']) for row in results] == [(on_shelf, 2)]
+    assert client.get('/books/api/search?q=').get_json() == []
@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+from models import db, BorrowRecord
+from blueprints.borrowing import _encode_cursor, _decode_cursor
+
+def _add_returned_loans(book_id, student_id, borrowed_times):
+    records = [BorrowRecord(book_id=book_id, student_id=student_id, borrowed_at=when,
+                            due_date=when + timedelta(days=14), returned_at=when + timedelta(days=1))
+               for when in borrowed_times]
+    db.session.add_all(records)
+    db.session.commit()
+    return {record.id for record in records}
+
+def _walk(client, status, limit):
+    rows, cursor, pages = [], None, 0
+    while True:
+        url = f'/borrowing/api/borrows?status={status}&limit={limit}'
+        data = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        rows += data['borrows']
+        pages += 1
+        cursor = data['next_cursor']
+        if not cursor:
+            return rows, pages
+
+def test_cursor_round_trip():
+    record = BorrowRecord(id=42, book_id=1, borrowed_at=datetime(2026, 3, 1, 9, 30), due_date=datetime(2026, 3, 15))
+    assert _decode_cursor(_encode_cursor(record)) == (datetime(2026, 3, 1, 9, 30), 42)
+    assert _decode_cursor('not a cursor') is None
+
+def test_pages_are_newest_first_without_gaps_or_repeats(client, make_book, make_student):
+    # Equal borrowed_at values are ordered by id, so ties cannot straddle a page boundary unseen
+    base = datetime(2001, 1, 1)
+    times = [base + timedelta(hours=hour) for hour in range(5) for _ in range(3)]
+    ids = _add_returned_loans(make_book(total_copies=20), make_student(), times)
+
+    rows, pages = _walk(client, 'returned', limit=4)
+    keys = [(row['borrowed_at'], row['id']) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+    assert len(keys) == len(set(keys))
+    assert ids <= {row['id'] for row in rows}
+    assert pages > 1
+
+def test_status_filters_apply_across_pages(client, make_book, make_student):
+    book_id, student_id = make_book(total_copies=5), make_student()
+    returned_ids = _add_returned_loans(book_id, student_id, [datetime(2002, 6, 1)])
+    open_loan = BorrowRecord(book_id=book_id, student_id=student_id, due_date=datetime.utcnow() - timedelta(days=2))
+    db.session.add(open_loan)
+    db.session.commit()
+
+    active = {row['id'] for row in _walk(client, 'active', limit=50)[0]}
+    overdue = {row['id'] for row in _walk(client, 'overdue', limit=50)[0]}
+    assert open_loan.id in active and open_loan.id in overdue
+    assert not returned_ids & active
+
+def test_limit_is_capped(client, make_book, make_student):
+    _add_returned_loans(make_book(total_copies=5), make_student(),
+                        [datetime(2003, 1, 1) + timedelta(minutes=m) for m in range(3)])
+    assert len(client.get('/borrowing/api/borrows?status=returned&limit=1').get_json()['borrows']) == 1
+    assert len(client.get('/borrowing/api/borrows?status=returned&limit=0').get_json()['borrows']) == 1
+    capped = client.get('/borrowing/api/borrows?status=returned&limit=100000').get_json()['borrows']
+    assert len(capped) <= 200
+
+def test_bad_cursor_restarts_from_the_first_page(client):
+    first = client.get('/borrowing/api/borrows?status=returned').get_json()
+    garbled = client.get('/borrowing/api/borrows?status=returned&cursor=%%%').get_json()
+    assert garbled == first
+
+def test_list_page_links_to_older_rows(client, make_book, make_student):
+    _add_returned_loans(make_book(total_copies=5), make_student(),
+                        [datetime(2004, 1, 1) + timedelta(minutes=m) for m in range(51)])
+    response = client.get('/borrowing/?status=returned')
+    assert response.status_code == 200
+    assert b'cursor=' in response.data
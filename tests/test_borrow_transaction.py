@@ -0,0 +1,106 @@
+import threading
+
+import pytest
+
+from models import db, Book, BorrowRecord, Fine
+from utils.circulation import borrow_book, return_loan, BorrowError, ReturnError, MAX_STUDENT_LOANS
+
+def _open_loans(book_id):
+    return BorrowRecord.query.filter_by(book_id=book_id, returned_at=None).count()
+
+def test_borrow_takes_a_copy(make_book, make_student):
+    book_id, student_id = make_book(total_copies=1), make_student()
+    borrow_record, book, student = borrow_book(book_id, student_id=student_id)
+    db.session.commit()
+    assert borrow_record.id and student.id == student_id
+    assert db.session.get(Book, book_id).available_copies == 0
+    with pytest.raises(BorrowError):
+        borrow_book(book_id, student_id=make_student())
+
+def test_borrow_enforces_student_limit(make_book, make_student):
+    student_id = make_student()
+    for _ in range(MAX_STUDENT_LOANS):
+        borrow_book(make_book(), student_id=student_id)
+        db.session.commit()
+    book_id = make_book()
+    with pytest.raises(BorrowError, match='limit'):
+        borrow_book(book_id, student_id=student_id)
+    assert db.session.get(Book, book_id).copies_on_loan == 0
+
+def test_return_loan_closes_once(make_book, make_student):
+    book_id = make_book(total_copies=2)
+    borrow_record, _, _ = borrow_book(book_id, student_id=make_student())
+    db.session.commit()
+
+    returned, fine = return_loan(borrow_record.id, notes='Returned at desk')
+    db.session.commit()
+    assert returned.returned_at is not None and returned.notes == 'Returned at desk'
+    assert fine is None
+    with pytest.raises(ReturnError):
+        return_loan(borrow_record.id)
+    assert db.session.get(Book, book_id).copies_on_loan == 0
+
+def test_late_return_is_fined(make_book, make_student):
+    from datetime import datetime, timedelta
+    borrow_record, _, _ = borrow_book(make_book(), student_id=make_student())
+    borrow_record.due_date = datetime.utcnow() - timedelta(days=3)
+    db.session.commit()
+    _, fine = return_loan(borrow_record.id)
+    db.session.commit()
+    assert fine is not None and fine.amount > 0
+    assert Fine.query.filter_by(borrow_record_id=borrow_record.id).count() == 1
+
+def _race(app, attempts, action, expected_errors):
+    start = threading.Barrier(len(attempts))
+    outcomes = []
+
+    def desk(args):
+        with app.app_context():
+            start.wait()
+            try:
+                action(*args)
+                db.session.commit()
+                outcomes.append('ok')
+            except expected_errors:
+                outcomes.append('refused')
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=desk, args=(args,)) for args in attempts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_concurrent_borrows_never_over_lend(app, make_book, make_student):
+    book_id = make_book(total_copies=2)
+    students = [make_student() for _ in range(6)]
+    outcomes = _race(app, [(book_id, student_id) for student_id in students],
+                     lambda book, student: borrow_book(book, student_id=student), BorrowError)
+    assert outcomes.count('ok') == 2
+    db.session.expire_all()
+    assert _open_loans(book_id) == 2 == db.session.get(Book, book_id).copies_on_loan
+
+def test_concurrent_returns_of_one_loan_move_counter_once(app, make_book, make_student):
+    book_id = make_book(total_copies=2)
+    borrow_book(book_id, student_id=make_student())
+    borrow_record, _, _ = borrow_book(book_id, student_id=make_student())
+    db.session.commit()
+    outcomes = _race(app, [(borrow_record.id,)] * 4, return_loan, ReturnError)
+    assert outcomes.count('ok') == 1
+    db.session.expire_all()
+    assert _open_loans(book_id) == 1 == db.session.get(Book, book_id).copies_on_loan
+
+def test_return_route_refuses_a_second_submit(client, make_book, make_student):
+    book_id = make_book()
+    borrow_record, _, _ = borrow_book(book_id, student_id=make_student())
+    db.session.commit()
+    borrow_id = borrow_record.id
+
+    response = client.post(f'/borrowing/return/{borrow_id}', data={'notes': ''})
+    assert response.status_code == 302
+    response = client.post(f'/borrowing/return/{borrow_id}', data={'notes': ''}, follow_redirects=True)
+    assert b'already been returned' in response.data
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).copies_on_loan == 0
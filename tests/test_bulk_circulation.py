@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from models import db, AuditLog, Book, BorrowRecord, EmailOutbox, Fine
+from utils.circulation import MAX_STUDENT_LOANS
+
+def _copies_on_loan(book_id):
+    db.session.expire_all()
+    return db.session.get(Book, book_id).copies_on_loan
+
+def _borrow(client, books, **borrower):
+    return client.post('/borrowing/api/bulk-borrow', json={'books': books, **borrower})
+
+def _return(client, books, **borrower):
+    return client.post('/borrowing/api/bulk-return', json={'books': books, **borrower})
+
+def test_class_set_is_lent_in_one_go(client, make_book, make_staff):
+    readers, workbook = make_book(total_copies=20), make_book(total_copies=20)
+    workbook_code = db.session.get(Book, workbook).unique_id
+    staff_id = make_staff()
+
+    response = _borrow(client, [readers] * 12 + [workbook_code] * 12, staff_id=staff_id, notes='Class 3B')
+    assert response.status_code == 201
+    data = response.get_json()
+    assert data['borrowed'] == 24
+    assert [(book['id'], book['copies']) for book in data['books']] == [(readers, 12), (workbook, 12)]
+    assert (_copies_on_loan(readers), _copies_on_loan(workbook)) == (12, 12)
+
+    loans = BorrowRecord.query.filter(BorrowRecord.id.in_(data['borrow_record_ids'])).all()
+    assert {(loan.staff_id, loan.notes, loan.returned_at) for loan in loans} == {(staff_id, 'Class 3B', None)}
+    assert EmailOutbox.query.filter(EmailOutbox.borrow_record_id.in_(data['borrow_record_ids'])).count() == 1
+    assert AuditLog.query.filter_by(action='BULK_BORROW').filter(
+        AuditLog.details.contains(f'"borrow_record_ids": {data["borrow_record_ids"]}')).count() == 1
+
+def test_short_stock_lends_nothing(client, make_book, make_staff):
+    plenty, scarce = make_book(total_copies=10), make_book(total_copies=2)
+    response = _borrow(client, [plenty] * 3 + [scarce] * 3, staff_id=make_staff())
+    assert response.status_code == 400
+    assert 'Not enough copies' in response.get_json()['error']
+    assert (_copies_on_loan(plenty), _copies_on_loan(scarce)) == (0, 0)
+
+def test_student_limit_applies_to_the_whole_set(client, make_book, make_student):
+    book_id, student_id = make_book(total_copies=10), make_student()
+    response = _borrow(client, [book_id] * (MAX_STUDENT_LOANS + 1), student_id=student_id)
+    assert response.status_code == 400
+    assert 'limit' in response.get_json()['error']
+    assert _copies_on_loan(book_id) == 0
+
+def test_bad_requests_are_refused(client, make_book, make_student, make_staff):
+    book_id = make_book()
+    assert _borrow(client, [book_id, 'NO-SUCH-BOOK'], staff_id=make_staff()).status_code == 400
+    assert _borrow(client, [book_id], student_id=make_student(), staff_id=make_staff()).status_code == 400
+    assert _borrow(client, [], staff_id=make_staff()).status_code == 400
+    assert client.post('/borrowing/api/bulk-borrow', json={'books': 'all'}).status_code == 400
+    assert _borrow(client, [True, book_id], staff_id=make_staff()).status_code == 400
+    assert _borrow(client, [[book_id]], staff_id=make_staff()).status_code == 400
+    assert _borrow(client, [book_id], student_id=True).status_code == 400
+    assert _borrow(client, [book_id], staff_id=str(make_staff())).status_code == 400
+    assert _copies_on_loan(book_id) == 0
+
+def test_class_set_comes_back_oldest_loans_first_with_fines(client, make_book, make_student):
+    book_id, student_id = make_book(total_copies=5), make_student()
+    late_loan = _borrow(client, [book_id] * 3, student_id=student_id).get_json()['borrow_record_ids'][0]
+    BorrowRecord.query.filter_by(id=late_loan).update({
+        'borrowed_at': datetime.utcnow() - timedelta(days=10), 'due_date': datetime.utcnow() - timedelta(days=4)})
+    db.session.commit()
+
+    response = _return(client, [book_id, book_id], student_id=student_id)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['returned'] == 2 and late_loan in data['borrow_record_ids']
+    assert data['fines_due'] > 0
+    assert Fine.query.filter_by(borrow_record_id=late_loan).count() == 1
+    assert _copies_on_loan(book_id) == 1
+    assert EmailOutbox.query.filter_by(borrow_record_id=data['borrow_record_ids'][0],
+                                       email_type='return_confirmation').count() == 1
+
+def test_returning_more_than_is_out_returns_nothing(client, make_book, make_student):
+    book_id, other_book, student_id = make_book(total_copies=5), make_book(), make_student()
+    _borrow(client, [book_id], student_id=student_id)
+
+    response = _return(client, [book_id, other_book], student_id=student_id)
+    assert response.status_code == 400
+    assert 'Not on loan to this borrower' in response.get_json()['error']
+    assert _copies_on_loan(book_id) == 1
+    assert BorrowRecord.query.filter_by(book_id=book_id, returned_at=None).count() == 1
+
+def test_bool_ids_are_not_taken_for_books(client, make_book, make_student):
+    book_id, student_id = make_book(total_copies=2), make_student()
+    _borrow(client, [book_id], student_id=student_id)
+
+    response = _return(client, [book_id, False], student_id=student_id)
+    assert response.status_code == 400
+    assert 'list of book ids' in response.get_json()['error']
+    assert _copies_on_loan(book_id) == 1
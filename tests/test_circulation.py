@@ -0,0 +1,67 @@
+from models import db, Book
+from utils.circulation import adjust_copies_on_loan, rebuild_loan_counters
+
+def test_adjust_copies_on_loan_moves_counter(make_book):
+    book_id = make_book(total_copies=2)
+    assert adjust_copies_on_loan(book_id, 1)
+    db.session.commit()
+    assert db.session.get(Book, book_id).copies_on_loan == 1
+    assert db.session.get(Book, book_id).available_copies == 1
+
+def test_adjust_copies_on_loan_never_goes_below_zero(make_book):
+    book_id = make_book(total_copies=1)
+    assert not adjust_copies_on_loan(book_id, -1)
+    db.session.commit()
+    assert db.session.get(Book, book_id).copies_on_loan == 0
+
+def test_adjust_copies_on_loan_never_passes_total_copies(make_book):
+    book_id = make_book(total_copies=1)
+    assert adjust_copies_on_loan(book_id, 1)
+    assert not adjust_copies_on_loan(book_id, 1)
+    db.session.commit()
+    assert db.session.get(Book, book_id).copies_on_loan == 1
+
+def test_rebuild_loan_counters_corrects_drift(make_book):
+    book_id = make_book(total_copies=3)
+    db.session.get(Book, book_id).copies_on_loan = 2
+    db.session.commit()
+    assert rebuild_loan_counters() >= 1
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).copies_on_loan == 0
+
+def test_returns_are_taken_after_total_copies_is_lowered(make_book, make_staff):
+    from utils.circulation import borrow_book, bulk_return, return_loan
+    book_id, staff_id = make_book(total_copies=4), make_staff()
+    loans = []
+    for _ in range(4):
+        borrow_record, _, _ = borrow_book(book_id, staff_id=staff_id)
+        db.session.commit()
+        loans.append(borrow_record.id)
+    # Written directly, as a librarian could before the edit form refused it
+    db.session.get(Book, book_id).total_copies = 1
+    db.session.commit()
+
+    return_loan(loans[0])
+    db.session.commit()
+    bulk_return([book_id, book_id], staff_id=staff_id)
+    db.session.commit()
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).copies_on_loan == 1
+    assert not adjust_copies_on_loan(book_id, 1)
+
+def test_edit_refuses_fewer_copies_than_are_on_loan(client, make_book):
+    book_id = make_book(total_copies=3)
+    book = db.session.get(Book, book_id)
+    book.copies_on_loan = 2
+    db.session.commit()
+
+    form = {'title': book.title, 'unique_id': book.unique_id, 'total_copies': '1'}
+    response = client.post(f'/books/{book_id}/edit', data=form)
+    assert b'cannot be less than the 2 copies currently on loan' in response.data
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).total_copies == 3
+
+    form['total_copies'] = '2'
+    assert client.post(f'/books/{book_id}/edit', data=form).status_code == 302
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).total_copies == 2
@@ -0,0 +1,48 @@
+import uuid
+
+from models import db, Book, User
+from utils.audit_logger import log_action
+from utils.circulation import adjust_copies_on_loan
+from utils.dashboard_metrics import get_dashboard_metrics, invalidate_dashboard_metrics
+
+def _fresh_snapshot():
+    invalidate_dashboard_metrics()
+    return get_dashboard_metrics()
+
+def test_snapshot_is_reused_until_something_changes(ctx):
+    snapshot = _fresh_snapshot()
+    assert get_dashboard_metrics() is snapshot
+
+    # Audit entries are not dashboard figures
+    log_action('DASHBOARD_TEST', 'Test', user_id=User.query.filter_by(username='admin').first().id)
+    assert get_dashboard_metrics() is snapshot
+
+def test_committed_catalogue_change_invalidates(ctx, make_book):
+    snapshot = _fresh_snapshot()
+    make_book()
+    refreshed = get_dashboard_metrics()
+    assert refreshed is not snapshot
+    assert refreshed['total_books'] == snapshot['total_books'] + 1
+
+def test_bulk_counter_update_invalidates(ctx, make_book):
+    book_id = make_book(total_copies=2)
+    snapshot = _fresh_snapshot()
+    assert adjust_copies_on_loan(book_id, 1)
+    db.session.commit()
+    assert get_dashboard_metrics() is not snapshot
+
+def test_rolled_back_change_keeps_the_snapshot(ctx):
+    snapshot = _fresh_snapshot()
+    db.session.add(Book(title='Never saved', unique_id=f'T-{uuid.uuid4().hex[:10]}', total_copies=1))
+    db.session.flush()
+    db.session.rollback()
+    assert get_dashboard_metrics() is snapshot
+
+def test_ttl_bounds_staleness(app, ctx, monkeypatch):
+    monkeypatch.setitem(app.config, 'DASHBOARD_METRICS_TTL', 0)
+    snapshot = _fresh_snapshot()
+    assert get_dashboard_metrics() is not snapshot
+
+def test_dashboard_page_renders_the_snapshot(client):
+    response = client.get('/dashboard/')
+    assert response.status_code == 200
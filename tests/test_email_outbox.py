@@ -0,0 +1,62 @@
+import uuid
+from datetime import datetime, timedelta
+
+from models import db, EmailLog, EmailOutbox
+from utils import email_service
+from utils.email_service import drain_outbox, queue_email, requeue_dead_emails, EMAIL_MAX_ATTEMPTS
+
+def _queue(**kwargs):
+    subject = f'Test {uuid.uuid4().hex}'
+    return queue_email('reader@example.com', subject, 'Body', 'test', **kwargs), subject
+
+def _deliver(status, error=None):
+    return lambda items, smtp_pool=None: [(status, error)] * len(items)
+
+def test_queue_email_without_commit_joins_the_callers_transaction(ctx):
+    message, subject = _queue(commit=False)
+    assert message.status == 'pending'
+    db.session.rollback()
+    assert EmailOutbox.query.filter_by(subject=subject).count() == 0
+
+def test_queue_email_skips_missing_recipient(ctx):
+    assert queue_email('', 'Subject', 'Body', 'test') is None
+
+def test_drain_delivers_and_logs(ctx, monkeypatch):
+    message, subject = _queue()
+    monkeypatch.setattr(email_service, '_deliver_many', _deliver('sent'))
+    assert drain_outbox(batch_size=1000) >= 1
+    db.session.refresh(message)
+    assert message.status == 'sent' and message.attempts == 1 and message.sent_at
+    assert EmailLog.query.filter_by(subject=subject, status='sent').count() == 1
+
+def test_failed_delivery_backs_off_then_dead_letters(ctx, monkeypatch):
+    message, subject = _queue()
+    monkeypatch.setattr(email_service, '_deliver_many', _deliver('failed', 'mailbox unavailable'))
+    drain_outbox(batch_size=1000)
+    db.session.refresh(message)
+    assert message.status == 'pending' and message.attempts == 1
+    assert message.next_attempt_at > datetime.utcnow()
+
+    for _ in range(EMAIL_MAX_ATTEMPTS - 1):
+        message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        drain_outbox(batch_size=1000)
+        db.session.refresh(message)
+    assert message.status == 'dead' and message.last_error == 'mailbox unavailable'
+    assert EmailLog.query.filter_by(subject=subject, status='failed').count() == 1
+
+    assert requeue_dead_emails() >= 1
+    db.session.refresh(message)
+    assert message.status == 'pending' and message.attempts == 0
+
+def test_claims_do_not_overlap(ctx):
+    first, _ = _queue()
+    second, _ = _queue()
+    claimed = email_service._claim_due_messages(1000)
+    again = email_service._claim_due_messages(1000)
+    ids = {message.id for message in claimed}
+    assert {first.id, second.id} <= ids
+    assert not ids & {message.id for message in again}
+    # Release the claims for the other tests
+    EmailOutbox.query.filter(EmailOutbox.id.in_(ids)).update({'status': 'sent', 'claim_token': None})
+    db.session.commit()
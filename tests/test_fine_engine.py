@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from utils import fine_engine
+from utils.fine_engine import compute_fines
+
+NOW = datetime(2026, 3, 10, 12, 0)
+
+def test_compute_fines_charges_daily_rate(ctx):
+    days, amounts = compute_fines([NOW - timedelta(days=3), NOW + timedelta(days=1)], ['student', 'student'], NOW)
+    assert days == [3, 0]
+    assert amounts == [120.0, 0.0]
+
+def test_compute_fines_applies_grace_and_cap(ctx):
+    schedule = {'student': {'daily_rate': 10.0, 'grace_days': 2, 'cap': 25.0},
+                'staff': {'daily_rate': 5.0, 'grace_days': 0, 'cap': None}}
+    due = [NOW - timedelta(days=1), NOW - timedelta(days=4), NOW - timedelta(days=30), NOW - timedelta(days=30)]
+    _, amounts = compute_fines(due, ['student', 'student', 'student', 'staff'], NOW, schedule)
+    assert amounts == [0.0, 20.0, 25.0, 150.0]
+
+def test_compute_fines_without_numpy_matches(ctx, monkeypatch):
+    due = [NOW - timedelta(days=d, hours=5) for d in range(0, 40, 7)]
+    types = ['student', 'staff'] * 3
+    expected = compute_fines(due, types, NOW)
+    monkeypatch.setattr(fine_engine, 'numpy', None)
+    assert compute_fines(due, types, NOW) == expected
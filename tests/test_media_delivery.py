@@ -0,0 +1,74 @@
+import pytest
+
+from models import db, Audio, User
+
+BODY = bytes(range(256)) * 8
+
+@pytest.fixture
+def audio_id(ctx, tmp_path):
+    path = tmp_path / 'listening.mp3'
+    path.write_bytes(BODY)
+    admin = User.query.filter_by(username='admin').first()
+    audio = Audio(title='Listening test', exam_code='H11001', file_path=str(path), created_by=admin.id)
+    db.session.add(audio)
+    db.session.commit()
+    return audio.id
+
+def test_players_use_the_streaming_route(client, audio_id):
+    stream_url = f'/elearning/audios/{audio_id}/stream'.encode()
+    assert stream_url in client.get('/elearning/audios').data
+    assert stream_url in client.get(f'/elearning/audios/{audio_id}').data
+    assert stream_url in client.get('/dukan/admin/audios').data
+
+def test_full_response_has_validators(client, audio_id):
+    response = client.get(f'/elearning/audios/{audio_id}/stream')
+    assert response.status_code == 200
+    assert response.data == BODY
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['ETag']
+
+def test_byte_range(client, audio_id):
+    response = client.get(f'/elearning/audios/{audio_id}/stream', headers={'Range': 'bytes=10-19'})
+    assert response.status_code == 206
+    assert response.data == BODY[10:20]
+    assert response.headers['Content-Range'] == f'bytes 10-19/{len(BODY)}'
+
+    response = client.get(f'/elearning/audios/{audio_id}/stream', headers={'Range': 'bytes=-4'})
+    assert response.status_code == 206 and response.data == BODY[-4:]
+
+def test_unsatisfiable_range(client, audio_id):
+    response = client.get(f'/elearning/audios/{audio_id}/stream', headers={'Range': f'bytes={len(BODY)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(BODY)}'
+
+def test_conditional_get(client, audio_id):
+    etag = client.get(f'/elearning/audios/{audio_id}/stream').headers['ETag']
+    response = client.get(f'/elearning/audios/{audio_id}/stream', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and not response.data
+
+    # A range against a changed file (stale If-Range) gets the whole file
+    response = client.get(f'/elearning/audios/{audio_id}/stream',
+                          headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200 and response.data == BODY
+
+def test_inactive_audio_is_not_streamed(client, audio_id):
+    db.session.get(Audio, audio_id).is_active = False
+    db.session.commit()
+    assert client.get(f'/elearning/audios/{audio_id}/stream').status_code == 404
+
+def test_if_range_uses_strong_comparison(client, audio_id):
+    url = f'/elearning/audios/{audio_id}/stream'
+    full = client.get(url)
+    etag, last_modified = full.headers['ETag'], full.headers['Last-Modified']
+
+    for validator in (etag, last_modified):
+        response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': validator})
+        assert response.status_code == 206 and response.data == BODY[:10], validator
+
+    # A weak tag never matches, even when the opaque part is the current one
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': f'W/{etag}'})
+    assert response.status_code == 200 and response.data == BODY
+
+    # A date only matches the exact Last-Modified, not any later one
+    response = client.get(url, headers={'Range': 'bytes=0-9', 'If-Range': 'Fri, 01 Jan 2038 00:00:00 GMT'})
+    assert response.status_code == 200 and response.data == BODY
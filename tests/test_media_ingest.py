@@ -0,0 +1,80 @@
+import hashlib
+import io
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from models import db, MediaFile, MediaJob
+from utils import media_ingest
+from utils.media_ingest import ingest_upload, media_status, process_media_jobs, MEDIA_JOB_MAX_ATTEMPTS, \
+    MEDIA_JOB_RETRY_BASE_SECONDS
+
+@pytest.fixture
+def media_root(app, tmp_path, monkeypatch):
+    monkeypatch.setitem(app.config, 'MEDIA_ROOT', str(tmp_path))
+    return tmp_path
+
+def _upload(data, filename='Lesson 1.MP3'):
+    return FileStorage(stream=io.BytesIO(data), filename=filename)
+
+def test_upload_is_stored_under_its_digest(ctx, media_root, monkeypatch):
+    monkeypatch.setattr(media_ingest, 'INGEST_CHUNK_SIZE', 7)
+    data = b'audio ' + uuid.uuid4().bytes * 10
+    media, deduplicated = ingest_upload(_upload(data), 'audios')
+
+    sha256 = hashlib.sha256(data).hexdigest()
+    assert not deduplicated
+    assert (media.sha256, media.size, media.original_name) == (sha256, len(data), 'Lesson_1.MP3')
+    assert media.file_path == os.path.join(str(media_root), 'audios', f'{sha256}.mp3')
+    assert open(media.file_path, 'rb').read() == data
+    assert os.listdir(media_root / '.incoming') == []
+    assert [job.job_type for job in media.jobs] == ['audio_transcode']
+
+def test_identical_bytes_are_stored_once(ctx, media_root):
+    data = b'%PDF-1.4 ' + uuid.uuid4().bytes
+    first, _ = ingest_upload(_upload(data, 'paper.pdf'), 'exam_papers')
+    second, deduplicated = ingest_upload(_upload(data, 'copy of paper.pdf'), 'marking_schemes')
+
+    assert deduplicated and second.id == first.id
+    assert MediaFile.query.filter_by(sha256=first.sha256).count() == 1
+    assert MediaJob.query.filter_by(media_file_id=first.id).count() == 2
+    assert os.listdir(media_root / '.incoming') == []
+
+def test_jobs_without_their_tool_are_skipped(ctx, media_root, monkeypatch):
+    monkeypatch.setattr(media_ingest.shutil, 'which', lambda name: None)
+    media, _ = ingest_upload(_upload(b'%PDF-1.4 ' + uuid.uuid4().bytes, 'notes.pdf'), 'transcripts')
+    process_media_jobs(batch_size=100)
+
+    db.session.refresh(media)
+    status = media_status(media)
+    assert {job['type']: job['status'] for job in status['jobs']} == {'pdf_linearize': 'skipped', 'thumbnail': 'skipped'}
+    assert status['file_path'] == media.original_path
+
+def test_failing_jobs_are_retried_then_failed(ctx, media_root, monkeypatch):
+    def broken(media):
+        raise RuntimeError('tool crashed')
+
+    monkeypatch.setattr(media_ingest.shutil, 'which', lambda name: None)
+    monkeypatch.setitem(media_ingest.JOB_HANDLERS, 'audio_transcode', broken)
+    media, _ = ingest_upload(_upload(uuid.uuid4().bytes), 'audios')
+    job = media.jobs[0]
+
+    for attempt in range(1, MEDIA_JOB_MAX_ATTEMPTS + 1):
+        started = datetime.utcnow()
+        process_media_jobs(batch_size=100)
+        db.session.refresh(job)
+        assert job.attempts == attempt
+        assert job.status == ('failed' if attempt == MEDIA_JOB_MAX_ATTEMPTS else 'pending')
+        if job.status == 'pending':
+            # The retry waits, twice as long after each attempt, and is not claimed before then
+            delay = timedelta(seconds=MEDIA_JOB_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+            assert started + delay <= job.next_attempt_at <= datetime.utcnow() + delay
+            process_media_jobs(batch_size=100)
+            db.session.refresh(job)
+            assert (job.attempts, job.status) == (attempt, 'pending')
+            job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            db.session.commit()
+    assert job.last_error == 'tool crashed'
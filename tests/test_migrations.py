@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter: Alembic's env.py reconfigures logging for the whole process.
+# create_all() in the app factory builds every table, so the table under test is dropped
+# and the database stamped at the migration before it, as an existing deployment would be.
+SCRIPT = '''
+import json, sys
+import sqlalchemy as sa
+from flask_migrate import downgrade, stamp, upgrade
+from main import app
+from models import db
+table, previous = sys.argv[1], sys.argv[2]
+with app.app_context():
+    stamp(revision='head')
+    downgrade(revision=previous)
+    db.session.remove()
+    with db.engine.begin() as conn:
+        conn.execute(sa.text(f'DROP TABLE IF EXISTS {table}'))
+    upgrade()
+    inspector = sa.inspect(db.engine)
+    print(json.dumps({
+        'exists': table in inspector.get_table_names(),
+        'indexes': sorted(ix['name'] for ix in inspector.get_indexes(table)),
+        'unique': sorted(uc['name'] for uc in inspector.get_unique_constraints(table) if uc['name']),
+    }))
+'''
+
+def _migrate(tmp_path, table, previous):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'migrated.db'}")
+    result = subprocess.run([sys.executable, '-c', SCRIPT, table, previous],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_notification_ledger_migration(tmp_path):
+    result = _migrate(tmp_path, 'notification_ledger', 'f6b8d0e10006')
+    assert result['exists']
+    assert 'uq_notification_ledger_key' in result['unique']
+
+def test_email_outbox_migration(tmp_path):
+    result = _migrate(tmp_path, 'email_outbox', 'a7c9e1f20007')
+    assert result['exists']
+    assert 'ix_email_outbox_status_next_attempt' in result['indexes']
+
+# Existing deployments already have media_job; the column is added in place and queued jobs made due
+MEDIA_JOB_SCRIPT = '''
+import json
+import sqlalchemy as sa
+from flask_migrate import downgrade, stamp, upgrade
+from main import app
+from models import db
+with app.app_context():
+    stamp(revision='head')
+    downgrade(revision='b8d0f2a30008')
+    db.session.remove()
+    with db.engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO media_file (sha256, file_path, original_path, size) VALUES ('x', 'x', 'x', 1)"))
+        conn.execute(sa.text("INSERT INTO media_job (media_file_id, job_type, status, created_at) "
+                             "SELECT id, 'thumbnail', 'pending', '2026-01-01 00:00:00' FROM media_file"))
+    upgrade()
+    inspector = sa.inspect(db.engine)
+    with db.engine.connect() as conn:
+        due = conn.execute(sa.text('SELECT next_attempt_at FROM media_job')).scalars().all()
+    print(json.dumps({
+        'indexes': sorted(ix['name'] for ix in inspector.get_indexes('media_job')),
+        'due': [str(value) for value in due],
+    }))
+'''
+
+def test_media_job_backoff_migration(tmp_path):
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'migrated.db'}")
+    result = subprocess.run([sys.executable, '-c', MEDIA_JOB_SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    result = json.loads(result.stdout.strip().splitlines()[-1])
+    assert 'ix_media_job_status_next_attempt' in result['indexes']
+    assert result['due'] == ['2026-01-01 00:00:00']
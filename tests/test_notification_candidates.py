@@ -0,0 +1,78 @@
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import event
+
+from models import db, BorrowRecord, NotificationPreference
+from utils import email_service
+
+def _loan(make_book, student_id, due_in_days):
+    due = datetime.combine(datetime.utcnow().date() + timedelta(days=due_in_days), time.max)
+    record = BorrowRecord(book_id=make_book(), student_id=student_id, due_date=due)
+    db.session.add(record)
+    db.session.commit()
+    return record.id
+
+def _prefer(student_id, **fields):
+    db.session.add(NotificationPreference(student_id=student_id, **fields))
+    db.session.commit()
+
+def _capture(monkeypatch):
+    captured = {}
+
+    def send(messages, email_type, period, smtp_pool=None):
+        captured.setdefault(email_type, []).extend(m['borrow_record_id'] for m in messages)
+        return len(messages)
+
+    monkeypatch.setattr(email_service, '_send_notifications', send)
+    return captured
+
+def test_reminder_window_comes_from_each_students_preference(make_book, make_student, monkeypatch):
+    default_student, wide_window, opted_out = make_student(), make_student(), make_student()
+    _prefer(wide_window, days_before_due=3)
+    _prefer(opted_out, email_due_reminder=False, days_before_due=5)
+
+    due_tomorrow = _loan(make_book, default_student, 1)
+    due_later = _loan(make_book, default_student, 3)
+    wide_due_later = _loan(make_book, wide_window, 3)
+    wide_too_far = _loan(make_book, wide_window, 4)
+    opted_out_loan = _loan(make_book, opted_out, 1)
+
+    captured = _capture(monkeypatch)
+    email_service.send_due_date_reminders()
+    reminded = set(captured.get('due_reminder', []))
+    assert {due_tomorrow, wide_due_later} <= reminded
+    assert not {due_later, wide_too_far, opted_out_loan} & reminded
+
+def test_overdue_notices_respect_the_opt_out(make_book, make_student, monkeypatch):
+    notify, silent = make_student(), make_student()
+    _prefer(silent, email_overdue_notice=False)
+    notified_loan, silent_loan = _loan(make_book, notify, -3), _loan(make_book, silent, -3)
+
+    captured = _capture(monkeypatch)
+    email_service.send_overdue_notices()
+    assert notified_loan in captured['overdue_notice']
+    assert silent_loan not in captured['overdue_notice']
+
+def test_first_preference_row_wins(make_book, make_student, monkeypatch):
+    student_id = make_student()
+    _prefer(student_id, email_due_reminder=False)
+    _prefer(student_id, email_due_reminder=True)
+    loan = _loan(make_book, student_id, 1)
+
+    captured = _capture(monkeypatch)
+    email_service.send_due_date_reminders()
+    assert loan not in captured.get('due_reminder', [])
+
+def test_query_count_does_not_grow_with_candidates(make_book, make_student, monkeypatch):
+    for _ in range(6):
+        _loan(make_book, make_student(), -2)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        _capture(monkeypatch)
+        email_service.send_overdue_notices()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert len([s for s in statements if s.lstrip().upper().startswith('SELECT')]) == 1
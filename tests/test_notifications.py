@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+from models import db, BorrowRecord
+from utils import email_service
+from utils.circulation import borrow_book
+
+def _deliver_all(items, smtp_pool=None):
+    return [('sent', None)] * len(items)
+
+def _overdue_loans(make_book, make_student, count):
+    borrow_ids = []
+    for _ in range(count):
+        borrow_record, _, _ = borrow_book(make_book(), student_id=make_student())
+        borrow_record.due_date = datetime.utcnow() - timedelta(days=2)
+        db.session.commit()
+        borrow_ids.append(borrow_record.id)
+    return borrow_ids
+
+def test_overdue_notices_compute_fines_per_chunk(make_book, make_student, monkeypatch):
+    borrow_ids = _overdue_loans(make_book, make_student, 7)
+    chunk_sizes = []
+    compute_fines = email_service.compute_fines
+
+    def recording_compute_fines(due_dates, borrower_types, now):
+        chunk_sizes.append(len(due_dates))
+        return compute_fines(due_dates, borrower_types, now)
+
+    monkeypatch.setattr(email_service, 'NOTIFICATION_FETCH_SIZE', 3)
+    monkeypatch.setattr(email_service, 'compute_fines', recording_compute_fines)
+    monkeypatch.setattr(email_service, '_deliver_many', _deliver_all)
+    sent = []
+    record_email = email_service._record_email
+    monkeypatch.setattr(email_service, '_record_email',
+                        lambda *args, **kwargs: sent.append(args[5]) or record_email(*args, **kwargs))
+
+    assert email_service.send_overdue_notices() >= 7
+    assert chunk_sizes and max(chunk_sizes) <= 3
+    assert set(borrow_ids) <= set(sent)
+
+def test_overdue_notices_are_not_repeated_in_a_period(make_book, make_student, monkeypatch):
+    _overdue_loans(make_book, make_student, 2)
+    monkeypatch.setattr(email_service, '_deliver_many', _deliver_all)
+    assert email_service.send_overdue_notices() >= 2
+    assert email_service.send_overdue_notices() == 0
+
+def test_large_claims_stay_under_the_parameter_limit(ctx):
+    import sqlite3
+    from models import NotificationLedger
+    # Hold the connection to SQLite's historical default of 999 bound parameters
+    connection = db.session.connection().connection.driver_connection
+    limit = connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    borrow_ids = list(range(10_000_000, 10_001_200))
+    try:
+        assert email_service._claim_notifications(borrow_ids, 'overdue_notice', 'test-batch') == set(borrow_ids)
+        assert email_service._claim_notifications(borrow_ids, 'overdue_notice', 'test-batch') == set()
+    finally:
+        connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, limit)
+        NotificationLedger.query.filter_by(period='test-batch').delete()
+        db.session.commit()
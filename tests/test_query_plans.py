@@ -0,0 +1,44 @@
+import os
+import shutil
+import subprocess
+import sys
+
+from sqlalchemy import text
+
+from models import db
+from utils.query_plans import check_query_plans
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _failures():
+    return [result['name'] for result in check_query_plans() if not result['passed']]
+
+def test_hot_queries_use_their_indexes(ctx):
+    assert _failures() == []
+
+def test_check_ignores_statistics_from_small_tables(ctx):
+    db.session.execute(text('ANALYZE'))
+    # Statistics describing a nearly empty borrow_record table
+    db.session.execute(text("DELETE FROM sqlite_stat1 WHERE tbl = 'borrow_record'"))
+    db.session.execute(text("INSERT INTO sqlite_stat1 VALUES ('borrow_record', NULL, '1')"))
+    db.session.execute(text("INSERT INTO sqlite_stat1 VALUES ('borrow_record', 'ix_borrow_record_open_due', '1 1')"))
+    db.session.commit()
+    try:
+        assert _failures() == []
+    finally:
+        db.session.execute(text('DELETE FROM sqlite_stat1'))
+        db.session.commit()
+
+def _flask(database, *args):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database}')
+    return subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', *args],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+
+def test_upgraded_baseline_database_passes_plan_check(tmp_path):
+    database = tmp_path / 'upgraded.db'
+    shutil.copy(os.path.join(ROOT, 'instance', 'confucius_library.db'), database)
+
+    upgrade = _flask(database, 'db', 'upgrade')
+    assert upgrade.returncode == 0, upgrade.stderr
+    plans = _flask(database, 'check-query-plans')
+    assert plans.returncode == 0, plans.stdout
@@ -0,0 +1,31 @@
+from utils.query_profiler import get_query_profile, reset_query_profile, statement_shape
+
+def test_statement_shape_collapses_literals_and_in_lists():
+    assert statement_shape('SELECT *  FROM book\n WHERE id IN (?, ?, ?) AND total_copies > 3') == \
+        'SELECT * FROM book WHERE id IN (?) AND total_copies > ?'
+    assert statement_shape('SELECT * FROM book WHERE id = %(id_1)s') == statement_shape('SELECT * FROM book WHERE id = $1')
+
+def test_every_response_reports_its_queries(client):
+    response = client.get('/borrowing/api/borrows')
+    assert int(response.headers['X-Query-Count']) >= 1
+    assert float(response.headers['X-Query-Time-Ms']) >= 0
+    assert 'X-N-Plus-One' not in response.headers
+
+def test_repeated_select_shapes_are_flagged(app, client, monkeypatch):
+    reset_query_profile()
+    monkeypatch.setitem(app.config, 'QUERY_N_PLUS_ONE_THRESHOLD', 1)
+    response = client.get('/borrowing/api/borrows')
+    assert int(response.headers['X-N-Plus-One']) >= 1
+
+    profile = get_query_profile()
+    stats = next(stats for stats in profile['endpoints'] if stats['endpoint'] == 'borrowing.api_list_borrows')
+    assert stats['requests'] == 1 and stats['n_plus_one_requests'] == 1
+    assert profile['recent'][0]['path'] == '/borrowing/api/borrows'
+    assert profile['recent'][0]['repeated'][0]['shape'].startswith('SELECT')
+
+def test_admin_page_lists_and_resets_the_statistics(client):
+    client.get('/borrowing/api/borrows')
+    assert b'borrowing.api_list_borrows' in client.get('/audit/queries').data
+
+    client.post('/audit/queries/reset')
+    assert all(stats['endpoint'] != 'borrowing.api_list_borrows' for stats in get_query_profile()['endpoints'])
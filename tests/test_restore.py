@@ -0,0 +1,92 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import db_restore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(db_restore.fcntl is None, reason='cross-process restore needs fcntl')
+
+# Each role runs in its own interpreter, as separate gunicorn workers would, against one database
+PRELUDE = '''
+import sys, time
+from main import app
+from models import db, Category, User, BackupLog
+from utils.backup_engine import run_backup
+from utils.db_restore import restore_sqlite_backup
+'''
+
+SETUP = PRELUDE + '''
+with app.app_context():
+    admin = User.query.filter_by(username='admin').first()
+    backup_log = BackupLog(filename='library_backup_test.db.gz', created_by=admin.id, description='test', status='queued')
+    db.session.add(backup_log)
+    db.session.commit()
+    assert run_backup(backup_log.id)
+    # Written after the backup, so gone once it is restored
+    db.session.add(Category(name='After the backup'))
+    db.session.commit()
+    print(backup_log.id)
+'''
+
+HOLDER = PRELUDE + '''
+hold = float(sys.argv[1])
+with app.app_context():
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('SELECT 1')
+        print('ready', flush=True)
+        time.sleep(hold)
+    # A fresh checkout after the restore must see the restored file
+    print(Category.query.filter_by(name='After the backup').count(), flush=True)
+'''
+
+RESTORER = PRELUDE + '''
+with app.app_context():
+    app.config['RESTORE_QUIESCE_TIMEOUT'] = float(sys.argv[2])
+    try:
+        stats = restore_sqlite_backup(db.session.get(BackupLog, int(sys.argv[1])))
+        print('restored', stats['downtime_ms'])
+    except ValueError as e:
+        print('refused', e)
+'''
+
+@pytest.fixture
+def env(tmp_path):
+    return dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path / 'library.db'}", BACKUP_DIR=str(tmp_path / 'backups'))
+
+def _run(script, env, *args):
+    result = subprocess.run([sys.executable, '-c', script, *map(str, args)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip().splitlines()[-1]
+
+def _start_holder(env, hold):
+    holder = subprocess.Popen([sys.executable, '-c', HOLDER, str(hold)], cwd=ROOT, env=env,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    assert holder.stdout.readline().strip() == 'ready', holder.stderr.read()
+    return holder
+
+def test_restore_waits_for_other_worker_processes(env):
+    backup_id = _run(SETUP, env)
+    holder = _start_holder(env, 5.0)
+    outcome = _run(RESTORER, env, backup_id, 15)
+    assert outcome.startswith('restored')
+    assert float(outcome.split()[1]) >= 1000  # Waited for the other process's connection
+    out, err = holder.communicate(timeout=30)
+    assert holder.returncode == 0, err
+    assert out.strip().splitlines()[-1] == '0'
+
+def test_restore_is_abandoned_while_another_worker_is_busy(env):
+    backup_id = _run(SETUP, env)
+    holder = _start_holder(env, 8.0)
+    try:
+        outcome = _run(RESTORER, env, backup_id, 0.5)
+        assert outcome.startswith('refused') and 'Another worker' in outcome
+    finally:
+        out, err = holder.communicate(timeout=30)
+    assert holder.returncode == 0, err
+    # Nothing was swapped: the row written after the backup is still there
+    assert out.strip().splitlines()[-1] == '1'
@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+
+from models import db, Book, Student
+from utils.scan_station import clear_scan_cache
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    clear_scan_cache()
+
+def _scan(client, **body):
+    response = client.post('/borrowing/api/scan', json=body)
+    return response.status_code, response.get_json()
+
+def _isbn():
+    return str(9780000000000 + uuid.uuid4().int % 10**9)
+
+def test_scan_borrow_and_return_by_codes(client, make_book, make_student):
+    book_id = make_book(total_copies=2)
+    student_id = make_student()
+    book, student = db.session.get(Book, book_id), db.session.get(Student, student_id)
+
+    status, body = _scan(client, action='borrow', book=book.unique_id, student=student.registration_number)
+    assert status == 201
+    assert body['book']['id'] == book_id and body['student']['id'] == student_id
+
+    # The student card is optional when only one borrower has the book out
+    status, body = _scan(client, action='return', book=book.unique_id)
+    assert status == 200 and body['borrow_record_id']
+    db.session.expire_all()
+    assert db.session.get(Book, book_id).copies_on_loan == 0
+
+def test_numeric_codes_are_accepted(client, make_book, make_student):
+    isbn = _isbn()
+    make_book(isbn=isbn)
+    student = db.session.get(Student, make_student())
+    status, body = _scan(client, action='borrow', book=int(isbn), student=student.registration_number)
+    assert status == 201, body
+    status, body = _scan(client, action='return', book=int(isbn), student=student.registration_number)
+    assert status == 200, body
+
+@pytest.mark.parametrize('code', [True, ['x'], {'code': 'x'}, 1.5])
+def test_unusable_codes_are_refused(client, code):
+    status, body = _scan(client, action='borrow', book=code, student='T/none')
+    assert status == 400
+    assert 'text or a whole number' in body['error']
+
+def test_unknown_codes_and_actions_are_refused(client, make_book):
+    book = db.session.get(Book, make_book())
+    assert _scan(client, action='borrow', book='no-such-book', student='x')[0] == 400
+    assert _scan(client, action='borrow', book=book.unique_id, student='no-such-student')[0] == 400
+    assert _scan(client, action='borrow', book=book.unique_id)[0] == 400
+    assert _scan(client, action='lend', book=book.unique_id)[0] == 400
+    assert _scan(client, action='return', book=book.unique_id)[0] == 400
+
+def test_stale_cached_code_is_resolved_again(client, make_book, make_student):
+    first, second = make_book(), make_book()
+    code = db.session.get(Book, first).unique_id
+    student = db.session.get(Student, make_student())
+    assert client.get(f'/borrowing/api/scan/lookup?code={code}').get_json()['id'] == first
+
+    # The code moves to another book after it was cached
+    db.session.get(Book, first).unique_id = f'{code}-old'
+    db.session.flush()
+    db.session.get(Book, second).unique_id = code
+    db.session.commit()
+
+    status, body = _scan(client, action='borrow', book=code, student=student.registration_number)
+    assert status == 201 and body['book']['id'] == second
+
+def test_lookup(client, make_book, make_student):
+    book = db.session.get(Book, make_book())
+    student = db.session.get(Student, make_student())
+    assert client.get(f'/borrowing/api/scan/lookup?code={book.unique_id}').get_json()['type'] == 'book'
+    assert client.get(f'/borrowing/api/scan/lookup?code={student.registration_number}').get_json()['type'] == 'student'
+    assert client.get('/borrowing/api/scan/lookup?code=nothing-here').status_code == 404
+    assert client.get('/borrowing/api/scan/lookup').status_code == 400
@@ -0,0 +1,111 @@
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+
+import pytest
+
+from utils import smtp_pool
+from utils.smtp_pool import SMTPSessionPool
+
+class FakeSMTP:
+    """Stands in for smtplib.SMTP and records every connection it is asked to make"""
+    connections = []
+    lock = threading.Lock()
+    open_now = 0
+    most_open = 0
+
+    def __init__(self, host, port, timeout=None):
+        self.logins, self.sent, self.closed = 0, [], False
+        self.drop_next = False
+        self.refuse = set()
+        with FakeSMTP.lock:
+            FakeSMTP.connections.append(self)
+            FakeSMTP.open_now += 1
+            FakeSMTP.most_open = max(FakeSMTP.most_open, FakeSMTP.open_now)
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        self.logins += 1
+
+    def send_message(self, msg):
+        if self.drop_next:
+            self.drop_next = False
+            raise smtplib.SMTPServerDisconnected('idle timeout')
+        if msg['To'] in self.refuse:
+            raise smtplib.SMTPRecipientsRefused({msg['To']: (550, b'no such user')})
+        time.sleep(0.005)
+        self.sent.append(msg['To'])
+
+    def quit(self):
+        if not self.closed:
+            self.closed = True
+            with FakeSMTP.lock:
+                FakeSMTP.open_now -= 1
+
+    close = quit
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.connections, FakeSMTP.open_now, FakeSMTP.most_open = [], 0, 0
+    monkeypatch.setattr(smtp_pool.smtplib, 'SMTP', FakeSMTP)
+    return FakeSMTP
+
+def _message(to):
+    msg = EmailMessage()
+    msg['To'] = to
+    msg.set_content('hello')
+    return msg
+
+def test_one_handshake_for_many_messages(fake_smtp):
+    with SMTPSessionPool('smtp.test', 587, user='u', password='p', size=1) as pool:
+        for n in range(10):
+            pool.send_message(_message(f'r{n}@test'))
+    assert len(fake_smtp.connections) == 1
+    assert fake_smtp.connections[0].logins == 1
+    assert len(fake_smtp.connections[0].sent) == 10
+    assert fake_smtp.open_now == 0
+
+def test_sessions_are_recycled_after_the_message_cap(fake_smtp):
+    with SMTPSessionPool('smtp.test', 587, size=1, max_messages_per_session=3) as pool:
+        for n in range(7):
+            pool.send_message(_message(f'r{n}@test'))
+    assert [len(conn.sent) for conn in fake_smtp.connections] == [3, 3, 1]
+
+def test_dropped_session_is_reconnected(fake_smtp):
+    with SMTPSessionPool('smtp.test', 587, size=1) as pool:
+        pool.send_message(_message('first@test'))
+        fake_smtp.connections[0].drop_next = True
+        pool.send_message(_message('second@test'))
+    assert len(fake_smtp.connections) == 2
+    assert fake_smtp.connections[1].sent == ['second@test']
+
+def test_refused_recipient_keeps_the_session(fake_smtp):
+    with SMTPSessionPool('smtp.test', 587, size=1) as pool:
+        pool.send_message(_message('ok@test'))
+        fake_smtp.connections[0].refuse.add('bad@test')
+        with pytest.raises(smtplib.SMTPRecipientsRefused):
+            pool.send_message(_message('bad@test'))
+        pool.send_message(_message('ok2@test'))
+    assert len(fake_smtp.connections) == 1
+
+def test_concurrent_senders_share_at_most_size_sessions(fake_smtp):
+    pool = SMTPSessionPool('smtp.test', 587, size=2)
+    threads = [threading.Thread(target=pool.send_message, args=(_message(f'r{n}@test'),)) for n in range(12)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    pool.close()
+    assert fake_smtp.most_open <= 2
+    assert sum(len(conn.sent) for conn in fake_smtp.connections) == 12
+
+def test_deliver_many_goes_through_the_pool(app, ctx, fake_smtp, monkeypatch):
+    from utils import email_service
+    monkeypatch.setitem(app.config, 'SMTP_HOST', 'smtp.test')
+    monkeypatch.setitem(app.config, 'SMTP_POOL_SIZE', 1)
+    results = email_service._deliver_many([(f'r{n}@test', 'Subject', 'Body') for n in range(5)])
+    assert results == [('sent', None)] * 5
+    assert len(fake_smtp.connections) == 1
@@ -0,0 +1,53 @@
+from models import db, Book
+from utils.stock_report import count_stock_rows, get_stock_page
+
+def _ids(rows):
+    return {row['id'] for row in rows}
+
+def _all_pages(**kwargs):
+    rows, after_id = get_stock_page(page_size=7, **kwargs)
+    while after_id:
+        page, after_id = get_stock_page(after_id=after_id, page_size=7, **kwargs)
+        rows += page
+    return rows
+
+def test_threshold_filters_on_available_copies(make_book):
+    empty, one_left, plenty = make_book(total_copies=0), make_book(total_copies=1), make_book(total_copies=5)
+    db.session.get(Book, plenty).copies_on_loan = 2
+    db.session.commit()
+
+    assert {empty, one_left} <= _ids(_all_pages(max_available=1))
+    assert plenty not in _ids(_all_pages(max_available=1))
+    assert plenty in _ids(_all_pages(max_available=3))
+    assert one_left not in _ids(_all_pages(max_available=0))
+
+def test_pages_cover_every_book_once(make_book):
+    for _ in range(10):
+        make_book()
+    rows = _all_pages()
+    assert len(rows) == len(_ids(rows)) == count_stock_rows()
+
+def test_rows_carry_counter_figures(make_book):
+    book_id = make_book(total_copies=4)
+    db.session.get(Book, book_id).copies_on_loan = 3
+    db.session.commit()
+    row = next(row for row in _all_pages() if row['id'] == book_id)
+    assert (row['total_copies'], row['borrowed_copies'], row['available_copies']) == (4, 3, 1)
+    assert row['category'] == 'Uncategorized'
+
+def test_report_threshold_from_query_and_config(app, client):
+    assert b'value="1"' in client.get('/reports/stock-depletion').data
+    assert b'value="4"' in client.get('/reports/stock-depletion?threshold=4').data
+
+    app.config['LOW_STOCK_THRESHOLD'] = 2
+    try:
+        assert b'value="2"' in client.get('/reports/stock-depletion').data
+    finally:
+        app.config.pop('LOW_STOCK_THRESHOLD')
+
+def test_report_refuses_bad_thresholds(client):
+    for bad in ('-1', 'lots', '1.5'):
+        response = client.get(f'/reports/stock-depletion?threshold={bad}')
+        assert response.status_code == 200
+        assert b'Threshold must be a whole number' in response.data
+        assert b'value="1"' in response.data
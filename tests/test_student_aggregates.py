@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+from sqlalchemy.orm import undefer
+
+from models import db, BorrowRecord, Fine, Student
+
+def _loan(book_id, student_id, returned=False):
+    now = datetime.utcnow()
+    record = BorrowRecord(book_id=book_id, student_id=student_id, borrowed_at=now, due_date=now + timedelta(days=3),
+                          returned_at=now if returned else None)
+    db.session.add(record)
+    db.session.commit()
+    return record.id
+
+def test_aggregates_count_open_loans_and_unpaid_fines(ctx, make_book, make_student):
+    student_id = make_student()
+    _loan(make_book(), student_id)
+    _loan(make_book(), student_id)
+    returned = _loan(make_book(), student_id, returned=True)
+    db.session.add_all([
+        Fine(student_id=student_id, borrow_record_id=returned, amount=40.0),
+        Fine(student_id=student_id, borrow_record_id=returned, amount=10.0, paid=True),
+        Fine(student_id=student_id, borrow_record_id=returned, amount=5.0, paid=None),
+    ])
+    db.session.commit()
+    db.session.expunge_all()
+
+    student = db.session.get(Student, student_id)
+    assert student.current_borrowed_count == 2
+    assert student.total_fines == 45.0
+    assert db.session.get(Student, make_student()).total_fines == 0.0
+
+def test_undefer_loads_counts_with_the_rows(ctx, make_book, make_student):
+    student_ids = [make_student() for _ in range(4)]
+    for student_id in student_ids:
+        _loan(make_book(), student_id)
+    db.session.expunge_all()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        students = Student.query.options(undefer(Student.current_borrowed_count)) \
+            .filter(Student.id.in_(student_ids)).all()
+        counts = [student.current_borrowed_count for student in students]
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert counts == [1, 1, 1, 1]
+    assert len(statements) == 1
+
+def test_student_list_query_count_does_not_grow_with_students(client, make_book, make_student):
+    before = int(client.get('/students/').headers['X-Query-Count'])
+    for _ in range(3):
+        _loan(make_book(), make_student())
+    assert int(client.get('/students/').headers['X-Query-Count']) == before
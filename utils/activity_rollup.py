@@ -0,0 +1,162 @@
+from collections import defaultdict
+from datetime import datetime, date
+from sqlalchemy import event, insert, update, delete, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from models import db, ActivityRollup, BorrowRecord, Fine
+
+ROLLUP_METRICS = ('borrows', 'returns', 'fines_issued', 'fines_collected')
+BACKFILL_BATCH_SIZE = 5000
+
+def _buckets(when):
+    day = (when or datetime.utcnow()).date()
+    return (('day', day), ('month', day.replace(day=1)))
+
+def _add(deltas, when, metric, amount=0.0, count=1):
+    for period, bucket_start in _buckets(when):
+        delta = deltas[(period, bucket_start, metric)]
+        delta[0] += count
+        delta[1] += amount or 0.0
+
+def _apply_deltas(connection, deltas):
+    """Add counts and amounts to their rollup rows, creating rows as needed, in one statement each"""
+    table = ActivityRollup.__table__
+    dialect = {'sqlite': sqlite, 'postgresql': postgresql}.get(connection.dialect.name)
+    for (period, bucket_start, metric), (count, amount) in deltas.items():
+        key = {'period': period, 'bucket_start': bucket_start, 'metric': metric}
+        if dialect:
+            stmt = dialect.insert(table).values(**key, count=count, amount=amount)
+            connection.execute(stmt.on_conflict_do_update(
+                index_elements=['period', 'bucket_start', 'metric'],
+                set_={'count': table.c.count + stmt.excluded.count, 'amount': table.c.amount + stmt.excluded.amount}
+            ))
+        else:
+            result = connection.execute(
+                update(table)
+                .where(table.c.period == period, table.c.bucket_start == bucket_start, table.c.metric == metric)
+                .values(count=table.c.count + count, amount=table.c.amount + amount)
+            )
+            if result.rowcount == 0:
+                connection.execute(insert(table).values(**key, count=count, amount=amount))
+
+def _became_set(obj, attribute):
+    """True if this flush changes the attribute from empty/false to a set value"""
+    history = inspect(obj).attrs[attribute].history
+    return bool(history.added) and bool(history.added[0]) and not any(history.deleted)
+
+def _amount_change(fine):
+    """How much this flush changes a fine's amount (waivers, adjustments, re-assessment)"""
+    history = inspect(fine).attrs['amount'].history
+    if history.added and history.deleted:
+        return (history.added[0] or 0.0) - (history.deleted[0] or 0.0)
+    return 0.0
+
+def _collect_deltas(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0.0])
+    for obj in session.new:
+        if isinstance(obj, BorrowRecord):
+            _add(deltas, obj.borrowed_at, 'borrows')
+            if obj.returned_at:
+                _add(deltas, obj.returned_at, 'returns')
+        elif isinstance(obj, Fine):
+            _add(deltas, obj.created_at, 'fines_issued', obj.amount)
+            if obj.paid:
+                _add(deltas, obj.paid_at, 'fines_collected', obj.amount)
+    for obj in session.dirty:
+        if isinstance(obj, BorrowRecord) and _became_set(obj, 'returned_at'):
+            _add(deltas, obj.returned_at, 'returns')
+        elif isinstance(obj, Fine):
+            if _became_set(obj, 'paid'):
+                _add(deltas, obj.paid_at, 'fines_collected', obj.amount)
+            # fines_issued carries each fine's current amount, as backfill_activity_rollup computes it
+            change = _amount_change(obj)
+            if change:
+                _add(deltas, obj.created_at, 'fines_issued', change, count=0)
+    if deltas:
+        # Same transaction as the change itself, so the rollup cannot drift on rollback
+        _apply_deltas(session.connection(), deltas)
+
+def record_activity(entries):
+    """
+    Add activity written with bulk statements, which bypass the flush listener
+
+    Args:
+        entries (list): (when, metric, count, amount) tuples; applied within
+                        the caller's transaction
+    """
+    deltas = defaultdict(lambda: [0, 0.0])
+    for when, metric, count, amount in entries:
+        _add(deltas, when, metric, amount, count)
+    if deltas:
+        _apply_deltas(db.session.connection(), deltas)
+
+def install_rollup_maintenance():
+    """
+    Keep the activity rollup current as borrows, returns and fines are flushed
+
+    Safe to call more than once.
+    """
+    if not event.contains(Session, 'after_flush', _collect_deltas):
+        event.listen(Session, 'after_flush', _collect_deltas)
+
+def backfill_activity_rollup():
+    """
+    Rebuild the activity rollup from the full borrow and fine history
+
+    Rows are streamed in batches and bucketed in Python, so the same code
+    runs on SQLite and PostgreSQL.
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    deltas = defaultdict(lambda: [0, 0.0])
+    borrows = db.session.query(BorrowRecord.borrowed_at, BorrowRecord.returned_at)
+    for borrowed_at, returned_at in borrows.yield_per(BACKFILL_BATCH_SIZE):
+        _add(deltas, borrowed_at, 'borrows')
+        if returned_at:
+            _add(deltas, returned_at, 'returns')
+
+    fines = db.session.query(Fine.created_at, Fine.amount, Fine.paid, Fine.paid_at)
+    for created_at, amount, paid, paid_at in fines.yield_per(BACKFILL_BATCH_SIZE):
+        _add(deltas, created_at, 'fines_issued', amount)
+        if paid:
+            _add(deltas, paid_at or created_at, 'fines_collected', amount)
+
+    db.session.execute(delete(ActivityRollup))
+    if deltas:
+        db.session.execute(insert(ActivityRollup), [
+            {'period': period, 'bucket_start': bucket_start, 'metric': metric, 'count': count, 'amount': amount}
+            for (period, bucket_start, metric), (count, amount) in deltas.items()
+        ])
+    db.session.commit()
+    return len(deltas)
+
+def _month_starts(months):
+    today = datetime.utcnow().date()
+    index = today.year * 12 + today.month - 1
+    return [date(i // 12, i % 12 + 1, 1) for i in range(index - months + 1, index + 1)]
+
+def get_monthly_activity(months=12):
+    """
+    Monthly totals for the last `months` months, oldest first, from the rollup
+
+    Returns:
+        list: One dict per month: month ('YYYY-MM') and, for each metric,
+              {metric}_count and {metric}_amount (zero for quiet months)
+    """
+    month_starts = _month_starts(months)
+    rows = ActivityRollup.query.filter(
+        ActivityRollup.period == 'month',
+        ActivityRollup.bucket_start >= month_starts[0]
+    ).all()
+    totals = {(row.bucket_start, row.metric): row for row in rows}
+
+    activity = []
+    for month_start in month_starts:
+        entry = {'month': month_start.strftime('%Y-%m')}
+        for metric in ROLLUP_METRICS:
+            row = totals.get((month_start, metric))
+            entry[f'{metric}_count'] = row.count if row else 0
+            entry[f'{metric}_amount'] = row.amount if row else 0.0
+        activity.append(entry)
+    return activity
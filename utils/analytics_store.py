@@ -0,0 +1,296 @@
+import json
+import os
+from datetime import datetime, date
+from flask import current_app
+import sqlalchemy as sa
+from models import db, BorrowRecord, Fine, Book, Category, Student
+
+# Optional: columnar export needs pyarrow, querying the export needs duckdb.
+# Without them the reports keep running against the live tables.
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ANALYTICS_REFRESH_MONTHS = 2  # Recent partitions rewritten on every run, to pick up returns and payments
+EXPORT_BATCH_SIZE = 10000
+STATE_FILE = '_export_state.json'
+
+# What is exported: fact tables are partitioned by month of `partition_by`;
+# dimension tables are small and rewritten whole on each run.
+# Student contact details are left out of the offline files.
+ANALYTICS_TABLES = {
+    'borrow_record': {'model': BorrowRecord, 'partition_by': 'borrowed_at'},
+    'fine': {'model': Fine, 'partition_by': 'created_at'},
+    'book': {'model': Book},
+    'category': {'model': Category},
+    'student': {'model': Student, 'columns': ('id', 'name', 'registration_number', 'id_number',
+                                              'passport_number', 'membership_status', 'created_at')},
+}
+
+def get_analytics_dir():
+    """Directory holding the columnar export (ANALYTICS_DIR, default: ./analytics)"""
+    return current_app.config.get('ANALYTICS_DIR') or 'analytics'
+
+def _arrow_type(column_type):
+    if isinstance(column_type, sa.Boolean):
+        return pyarrow.bool_()
+    if isinstance(column_type, sa.Integer):
+        return pyarrow.int64()
+    if isinstance(column_type, (sa.Float, sa.Numeric)):
+        return pyarrow.float64()
+    if isinstance(column_type, sa.DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(column_type, sa.Date):
+        return pyarrow.date32()
+    return pyarrow.string()
+
+def _table_columns(spec):
+    table = spec['model'].__table__
+    names = spec.get('columns') or [column.name for column in table.columns]
+    return [table.c[name] for name in names]
+
+def _write_parquet(path, columns, query):
+    """Stream query rows into a zstd-compressed Parquet file, replacing any previous one atomically"""
+    schema = pyarrow.schema([pyarrow.field(column.name, _arrow_type(column.type)) for column in columns])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    rows_written = 0
+    with pyarrow.parquet.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+        batch = []
+        for row in query.yield_per(EXPORT_BATCH_SIZE) if query is not None else ():
+            batch.append(row)
+            if len(batch) >= EXPORT_BATCH_SIZE:
+                writer.write_batch(_record_batch(schema, batch))
+                rows_written += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(_record_batch(schema, batch))
+            rows_written += len(batch)
+    os.replace(tmp_path, path)
+    return rows_written
+
+def _record_batch(schema, rows):
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)],
+        schema=schema
+    )
+
+def _month_start(value):
+    return date(value.year, value.month, 1)
+
+def _next_month(month_start):
+    return date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+
+def _recent_months(count):
+    month = _month_start(datetime.utcnow())
+    months = []
+    for _ in range(count):
+        months.append(month)
+        month = date(month.year - (month.month == 1), (month.month - 2) % 12 + 1, 1)
+    return months
+
+def _partition_path(table_dir, month):
+    return os.path.join(table_dir, f'month={month.strftime("%Y-%m")}', 'data.parquet')
+
+def _export_fact_table(spec, table_dir, last_id, full):
+    model = spec['model']
+    columns = _table_columns(spec)
+    timestamp = getattr(model, spec['partition_by'])
+    # Read first: rows added while the export runs are picked up by the next one
+    max_id = db.session.query(sa.func.max(model.id)).scalar() or 0
+
+    # Partitions to rewrite: every month on a full export; otherwise the months
+    # that gained rows since the last run plus the most recent ones
+    if full:
+        stale = db.session.query(timestamp).filter(timestamp.isnot(None))
+    else:
+        stale = db.session.query(timestamp).filter(timestamp.isnot(None), model.id > last_id)
+    months = {_month_start(value) for (value,) in stale.yield_per(EXPORT_BATCH_SIZE)}
+    if not full:
+        months.update(_recent_months(current_app.config.get('ANALYTICS_REFRESH_MONTHS', ANALYTICS_REFRESH_MONTHS)))
+
+    # A zero-row file carrying the schema keeps the table readable before any partition exists
+    _write_parquet(os.path.join(table_dir, 'schema.parquet'), columns, None)
+
+    rows = 0
+    for month in sorted(months):
+        path = _partition_path(table_dir, month)
+        query = db.session.query(*columns).filter(timestamp >= month, timestamp < _next_month(month)).order_by(model.id)
+        written = _write_parquet(path, columns, query)
+        if not written:
+            os.remove(path)
+        rows += written
+
+    # Drop emptied partitions and, on a full export, months that no longer have rows
+    for entry in os.listdir(table_dir):
+        if not entry.startswith('month='):
+            continue
+        partition_dir = os.path.join(table_dir, entry)
+        data_path = os.path.join(partition_dir, 'data.parquet')
+        if full and os.path.exists(data_path) and datetime.strptime(entry[6:], '%Y-%m').date() not in months:
+            os.remove(data_path)
+        if not os.listdir(partition_dir):
+            os.rmdir(partition_dir)
+
+    return rows, len(months), max_id
+
+def export_analytics(full=False):
+    """
+    Snapshot circulation history into compressed Parquet files for offline reporting
+
+    Borrow records and fines are partitioned by month; only the partitions
+    that gained rows since the last run, plus the last ANALYTICS_REFRESH_MONTHS
+    months (where returns and payments still land), are rewritten. Books,
+    categories and students are rewritten whole. Each file is written beside
+    its target and renamed into place, so readers never see a partial file.
+
+    Args:
+        full (bool): Rewrite every partition (after restores or bulk corrections)
+
+    Returns:
+        dict: Per table: rows written and partitions rewritten
+
+    Raises:
+        RuntimeError: If pyarrow is not installed
+    """
+    if pyarrow is None:
+        raise RuntimeError('pyarrow is not installed; install it to export analytics')
+
+    analytics_dir = get_analytics_dir()
+    state_path = os.path.join(analytics_dir, STATE_FILE)
+    state = {}
+    if os.path.exists(state_path) and not full:
+        with open(state_path) as f:
+            state = json.load(f)
+
+    summary = {}
+    new_state = {'exported_at': datetime.utcnow().isoformat(), 'tables': {}}
+    for name, spec in ANALYTICS_TABLES.items():
+        table_dir = os.path.join(analytics_dir, name)
+        if 'partition_by' in spec:
+            last_id = state.get('tables', {}).get(name, {}).get('last_id', 0)
+            rows, partitions, max_id = _export_fact_table(spec, table_dir, last_id, full)
+            new_state['tables'][name] = {'last_id': max_id}
+        else:
+            columns = _table_columns(spec)
+            rows = _write_parquet(os.path.join(table_dir, 'snapshot.parquet'), columns,
+                                  db.session.query(*columns).order_by(spec['model'].id))
+            partitions = 1
+        summary[name] = {'rows': rows, 'partitions': partitions}
+
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(new_state, f, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+    return summary
+
+def get_export_time():
+    """When the export was last refreshed, or None if there is no usable export"""
+    state_path = os.path.join(get_analytics_dir(), STATE_FILE)
+    if duckdb is None or not os.path.exists(state_path):
+        return None
+    with open(state_path) as f:
+        return datetime.fromisoformat(json.load(f)['exported_at'])
+
+def use_analytics_export():
+    """
+    True if reports should read the columnar export instead of the live tables
+
+    REPORTS_SOURCE is 'auto' (default: the export when one exists and duckdb
+    is installed), 'analytics' or 'live'.
+    """
+    source = current_app.config.get('REPORTS_SOURCE', 'auto')
+    if source == 'live':
+        return False
+    return get_export_time() is not None
+
+def _connect():
+    """In-memory DuckDB session with the exported tables as views"""
+    analytics_dir = os.path.abspath(get_analytics_dir())
+    conn = duckdb.connect()
+    for name in ANALYTICS_TABLES:
+        pattern = os.path.join(analytics_dir, name, '**', '*.parquet').replace("'", "''")
+        conn.execute(f"CREATE VIEW {name} AS SELECT * FROM read_parquet('{pattern}')")
+    return conn
+
+def _fetch_dicts(conn, sql, params=()):
+    cursor = conn.execute(sql, params)
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+def most_borrowed_books(limit=20):
+    """
+    Most borrowed books from the export
+
+    Returns:
+        list: (book, borrow_count) pairs; book is a dict with id, title and author
+    """
+    conn = _connect()
+    try:
+        rows = _fetch_dicts(conn, """
+            SELECT b.id, b.title, b.author, count(*) AS borrow_count
+            FROM borrow_record r JOIN book b ON b.id = r.book_id
+            GROUP BY b.id, b.title, b.author
+            ORDER BY borrow_count DESC, b.id
+            LIMIT ?
+        """, [limit])
+    finally:
+        conn.close()
+    return [(row, row['borrow_count']) for row in rows]
+
+def category_trends():
+    """
+    Borrows and book counts per category from the export
+
+    Returns:
+        list: Dicts with name, borrow_count and book_count ('Uncategorized' last)
+    """
+    conn = _connect()
+    try:
+        return _fetch_dicts(conn, """
+            WITH borrows AS (SELECT book_id, count(*) AS n FROM borrow_record GROUP BY book_id)
+            SELECT coalesce(c.name, 'Uncategorized') AS name,
+                   coalesce(sum(borrows.n), 0) AS borrow_count,
+                   count(*) AS book_count
+            FROM book b
+            LEFT JOIN category c ON c.id = b.category_id
+            LEFT JOIN borrows ON borrows.book_id = b.id
+            GROUP BY c.name
+            ORDER BY c.name IS NULL, c.name
+        """)
+    finally:
+        conn.close()
+
+def inactive_students(since):
+    """
+    Students with no borrow on or after `since`, from the export
+
+    Returns:
+        list: Dicts with id, name, identifier, last_borrow_date and days_inactive
+    """
+    conn = _connect()
+    try:
+        rows = _fetch_dicts(conn, """
+            SELECT s.id, s.name, s.created_at,
+                   coalesce(s.registration_number, s.id_number, s.passport_number) AS identifier,
+                   max(r.borrowed_at) AS last_borrow
+            FROM student s LEFT JOIN borrow_record r ON r.student_id = s.id
+            GROUP BY s.id, s.name, s.created_at, identifier
+            HAVING max(r.borrowed_at) IS NULL OR max(r.borrowed_at) < ?
+            ORDER BY last_borrow NULLS FIRST, s.name
+        """, [since])
+    finally:
+        conn.close()
+
+    now = datetime.utcnow()
+    for row in rows:
+        last_activity = row['last_borrow'] or row['created_at']
+        row['last_borrow_date'] = row['last_borrow'].strftime('%Y-%m-%d') if row['last_borrow'] else None
+        row['days_inactive'] = (now - last_activity).days if last_activity else None
+    return rows
@@ -1,13 +1,150 @@
+import atexit
 import json
-from flask import request
+import os
+import queue
+import threading
+import time
+from flask import request, current_app, has_app_context
 from flask_login import current_user
 from models import AuditLog, db
 from datetime import datetime
 
+# Sentinel telling the writer thread to stop
+_STOP = object()
+
+class AuditWriter:
+    """
+    Buffers audit entries and writes them with multi-row INSERTs from a background thread
+    
+    A batch is written when batch_size entries are waiting or flush_interval
+    seconds after its first entry, whichever comes first. Pending entries are
+    written on interpreter shutdown.
+    
+    Args:
+        app (Flask): Application whose database receives the entries
+        batch_size (int): Maximum entries per INSERT
+        flush_interval (float): Maximum seconds an entry waits before being written
+    """
+    
+    def __init__(self, app, batch_size=100, flush_interval=0.2):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+    
+    def submit(self, entry):
+        """Queue one audit entry (a dict of AuditLog column values)"""
+        self._ensure_thread()
+        self._queue.put(entry)
+    
+    def _ensure_thread(self):
+        # Started lazily, and restarted in a forked worker where the parent's thread does not exist
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                return
+            batch = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    self._write(batch)
+                    return
+                batch.append(entry)
+            
+            self._write(batch)
+    
+    def _write(self, batch):
+        with self.app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(AuditLog.__table__.insert().values(batch))
+            except Exception as e:
+                # One bad entry must not lose the rest of the batch
+                print(f"Audit batch write failed, retrying entries individually: {e}")
+                for entry in batch:
+                    try:
+                        with db.engine.begin() as conn:
+                            conn.execute(AuditLog.__table__.insert().values([entry]))
+                    except Exception as entry_error:
+                        print(f"Audit logging failed: {entry_error}")
+    
+    def flush(self):
+        """Write everything queued so far from the calling thread"""
+        batch = []
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                batch.append(entry)
+        for start in range(0, len(batch), self.batch_size):
+            self._write(batch[start:start + self.batch_size])
+    
+    def close(self):
+        """Stop the writer thread after it has written every queued entry"""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            self._thread.join(timeout=10)
+        self.flush()
+
+def init_audit_writer(app):
+    """
+    Set up audit log writing for the app
+    
+    AUDIT_LOG_MODE='async' (the default) writes entries in batches from a
+    background thread; 'sync' commits each entry immediately, as does any
+    app with TESTING set. AUDIT_BATCH_SIZE and AUDIT_FLUSH_INTERVAL_MS tune
+    the batching.
+    """
+    mode = app.config.get('AUDIT_LOG_MODE') or os.environ.get('AUDIT_LOG_MODE') or 'async'
+    if mode != 'async':
+        return None
+    writer = AuditWriter(
+        app,
+        batch_size=int(app.config.get('AUDIT_BATCH_SIZE', 100)),
+        flush_interval=int(app.config.get('AUDIT_FLUSH_INTERVAL_MS', 200)) / 1000
+    )
+    app.extensions['audit_writer'] = writer
+    return writer
+
+def flush_audit_log():
+    """Write any buffered audit entries now (no-op in sync mode)"""
+    writer = current_app.extensions.get('audit_writer')
+    if writer:
+        writer.flush()
+
 def log_action(action, entity_type, entity_id=None, details=None, user_id=None):
     """
     Log an action to the audit trail
     
+    In async mode the entry is queued and written in a batch shortly after;
+    in sync mode it is committed before returning.
+    
     Args:
         action (str): Action performed (e.g., 'CREATE_STUDENT', 'BORROW_BOOK')
         entity_type (str): Type of entity affected (e.g., 'Student', 'Book')
@@ -30,18 +167,28 @@ def log_action(action, entity_type, entity_id=None, details=None, user_id=None):
         if details:
             details_json = json.dumps(details, default=str)
         
+        if user_id is None:
+            print(f"Audit logging failed: no user to attribute {action} to")
+            return
+        
         # Create audit log entry
-        audit_log = AuditLog(
-            user_id=user_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            details=details_json,
-            ip_address=ip_address,
-            timestamp=datetime.utcnow()
-        )
+        entry = {
+            'user_id': user_id,
+            'action': action,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'details': details_json,
+            'ip_address': ip_address,
+            'timestamp': datetime.utcnow()
+        }
+        
+        # Hand off to the batching writer when enabled; it never touches the caller's transaction
+        writer = current_app.extensions.get('audit_writer') if has_app_context() else None
+        if writer and not current_app.config.get('TESTING'):
+            writer.submit(entry)
+            return
         
-        db.session.add(audit_log)
+        db.session.add(AuditLog(**entry))
         db.session.commit()
         
     except Exception as e:
@@ -0,0 +1,205 @@
+# Content-addressed chunk store for incremental backups. Deliberately free of
+# Flask and database imports so backups can be verified and restored offline.
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST_FORMAT = 1
+MANIFEST_SUFFIX = '.manifest.json'
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+def get_chunk_dir(backup_dir):
+    """Directory holding the chunks shared by every incremental backup in backup_dir"""
+    return os.path.join(backup_dir, 'chunks')
+
+def _chunk_base(chunk_dir, digest):
+    return os.path.join(chunk_dir, digest[:2], digest)
+
+def _find_chunk(chunk_dir, digest):
+    base = _chunk_base(chunk_dir, digest)
+    for suffix in ('.zst', '.gz'):
+        if os.path.exists(base + suffix):
+            return base + suffix
+    return None
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _store_chunk(chunk_dir, digest, data):
+    """Store one chunk unless it already exists; returns the bytes written"""
+    if _find_chunk(chunk_dir, digest):
+        return 0
+    if zstandard:
+        path, payload = _chunk_base(chunk_dir, digest) + '.zst', zstandard.ZstdCompressor(level=3).compress(data)
+    else:
+        path, payload = _chunk_base(chunk_dir, digest) + '.gz', gzip.compress(data, compresslevel=6)
+    _write_atomic(path, payload)
+    return len(payload)
+
+def read_chunk(chunk_dir, digest):
+    """
+    Read and verify one chunk
+
+    Args:
+        chunk_dir (str): Chunk store directory
+        digest (str): SHA-256 hex digest of the chunk
+
+    Returns:
+        bytes: The chunk's contents
+
+    Raises:
+        ValueError: If the chunk is missing or its contents do not match the digest
+    """
+    path = _find_chunk(chunk_dir, digest)
+    if not path:
+        raise ValueError(f'Chunk {digest} is missing')
+    with open(path, 'rb') as f:
+        payload = f.read()
+    if path.endswith('.zst'):
+        if not zstandard:
+            raise ValueError(f'Chunk {digest} is zstd-compressed but zstandard is not installed')
+        data = zstandard.ZstdDecompressor().decompress(payload)
+    else:
+        data = gzip.decompress(payload)
+    if hashlib.sha256(data).hexdigest() != digest:
+        raise ValueError(f'Chunk {digest} is corrupt')
+    return data
+
+def store_snapshot(snapshot_path, chunk_dir, page_size, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Cut a database snapshot into chunks and store the ones not already present
+
+    Args:
+        snapshot_path (str): Consistent copy of the database file
+        chunk_dir (str): Chunk store directory
+        page_size (int): Database page size; chunks are a whole number of pages
+        chunk_size (int): Target chunk size in bytes
+
+    Returns:
+        tuple: (manifest dict without backup metadata, bytes newly written to the store)
+    """
+    chunk_size = max(page_size, chunk_size - chunk_size % page_size)
+    whole = hashlib.sha256()
+    digests = []
+    size = 0
+    bytes_added = 0
+
+    with open(snapshot_path, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_size), b''):
+            digest = hashlib.sha256(data).hexdigest()
+            bytes_added += _store_chunk(chunk_dir, digest, data)
+            whole.update(data)
+            digests.append(digest)
+            size += len(data)
+
+    manifest = {
+        'format': MANIFEST_FORMAT,
+        'page_size': page_size,
+        'chunk_size': chunk_size,
+        'size': size,
+        'sha256': whole.hexdigest(),
+        'chunks': digests,
+    }
+    return manifest, bytes_added
+
+def write_manifest(path, manifest):
+    """Write a manifest file atomically, after all of its chunks are stored"""
+    _write_atomic(path, json.dumps(manifest, indent=1).encode())
+
+def load_manifest(path):
+    """Read a manifest file"""
+    with open(path) as f:
+        return json.load(f)
+
+def iter_snapshot(manifest, chunk_dir):
+    """
+    Yield the snapshot's bytes chunk by chunk, verifying each one
+
+    Raises:
+        ValueError: If a chunk is missing or corrupt, or the rebuilt file does
+                    not match the manifest's size and digest
+    """
+    whole = hashlib.sha256()
+    size = 0
+    for digest in manifest['chunks']:
+        data = read_chunk(chunk_dir, digest)
+        whole.update(data)
+        size += len(data)
+        yield data
+    if size != manifest['size'] or whole.hexdigest() != manifest['sha256']:
+        raise ValueError('Rebuilt snapshot does not match its manifest checksum')
+
+def verify_manifest(manifest, chunk_dir):
+    """
+    Check that a backup can be rebuilt exactly
+
+    Returns:
+        list: Problems found; empty when the backup is intact
+    """
+    try:
+        for _ in iter_snapshot(manifest, chunk_dir):
+            pass
+    except ValueError as e:
+        return [str(e)]
+    return []
+
+def materialize(manifest, chunk_dir, target_path):
+    """
+    Rebuild a snapshot into target_path, verifying it on the way
+
+    The file only appears at target_path once it has been rebuilt and verified.
+    """
+    directory = os.path.dirname(os.path.abspath(target_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for data in iter_snapshot(manifest, chunk_dir):
+                f.write(data)
+        os.replace(tmp_path, target_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def collect_garbage(chunk_dir, manifests):
+    """
+    Delete chunks no manifest refers to
+
+    Args:
+        chunk_dir (str): Chunk store directory
+        manifests (list): Every manifest that must stay restorable
+
+    Returns:
+        int: Number of chunks deleted
+    """
+    keep = set()
+    for manifest in manifests:
+        keep.update(manifest['chunks'])
+
+    deleted = 0
+    if not os.path.isdir(chunk_dir):
+        return deleted
+    for prefix in os.listdir(chunk_dir):
+        prefix_dir = os.path.join(chunk_dir, prefix)
+        for name in os.listdir(prefix_dir):
+            digest = name.split('.')[0]
+            if digest not in keep and not name.endswith('.tmp'):
+                os.remove(os.path.join(prefix_dir, name))
+                deleted += 1
+    return deleted
@@ -0,0 +1,469 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from models import db, BackupLog
+from utils.audit_logger import log_action
+from utils.backup_chunks import (MANIFEST_SUFFIX, get_chunk_dir, store_snapshot, write_manifest, load_manifest,
+                                 iter_snapshot, materialize, collect_garbage)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BACKUP_PAGES_PER_STEP = 1024  # SQLite pages copied between pauses
+BACKUP_STEP_PAUSE = 0.005  # Seconds yielded to other connections after each step
+BACKUP_MAX_RESTARTS = 3  # Stepped copies restarted by concurrent writes before finishing in one pass
+COPY_CHUNK_SIZE = 1024 * 1024
+
+def get_backup_dir():
+    """
+    Get the directory backups are written to, creating it if needed
+
+    Returns:
+        str: BACKUP_DIR from the config, 'backups' by default
+    """
+    backup_dir = current_app.config.get('BACKUP_DIR') or 'backups'
+    os.makedirs(backup_dir, exist_ok=True)
+    return backup_dir
+
+def get_database_backend():
+    """
+    Get the backend of the configured database
+
+    Returns:
+        str: 'sqlite' or 'postgresql'
+    """
+    return db.engine.url.get_backend_name()
+
+def get_sqlite_database_path():
+    """
+    Get the file behind the configured SQLite database
+
+    Returns:
+        str: Path from SQLALCHEMY_DATABASE_URI (resolved into the instance folder
+             by Flask-SQLAlchemy), or None when the database is not SQLite
+    """
+    if get_database_backend() != 'sqlite':
+        return None
+    return db.engine.url.database
+
+SQLITE_JOURNAL_MODES = ('delete', 'truncate', 'persist', 'wal')
+
+def apply_sqlite_journal_mode():
+    """
+    Switch the SQLite database to the configured SQLITE_JOURNAL_MODE, if any
+
+    The journal mode is stored in the database file, so this is a deliberate,
+    persistent setting: 'wal' lets a backup copy the database without being
+    restarted by the library's writes, at the cost of -wal/-shm files beside it.
+    Nothing changes when the key is unset.
+
+    Returns:
+        str: The journal mode now in effect, or None when not configured or not SQLite
+    """
+    mode = (current_app.config.get('SQLITE_JOURNAL_MODE') or '').lower()
+    if not mode or get_database_backend() != 'sqlite':
+        return None
+    if mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"SQLITE_JOURNAL_MODE must be one of {', '.join(SQLITE_JOURNAL_MODES)}, not {mode!r}")
+    with db.engine.connect() as conn:
+        return conn.exec_driver_sql(f'PRAGMA journal_mode={mode}').scalar().lower()
+
+def archive_extension():
+    """Compression suffix for new archives: zstd when installed, gzip otherwise"""
+    return '.zst' if zstandard else '.gz'
+
+def _open_compressed_writer(path):
+    if zstandard:
+        return zstandard.ZstdCompressor(level=3).stream_writer(open(path, 'wb'), closefd=True)
+    return gzip.open(path, 'wb', compresslevel=6)
+
+def open_archive(path):
+    """
+    Open a backup archive for streaming reads, decompressing on the fly
+
+    Args:
+        path (str): Archive path; .zst and .gz are decompressed, anything else is read as is
+
+    Returns:
+        file: Binary file-like object
+    """
+    if path.endswith('.zst'):
+        if not zstandard:
+            raise RuntimeError('zstandard is not installed; install it to read .zst backups')
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def is_incremental(backup_log):
+    """Whether a backup is stored as chunks plus a manifest rather than as one archive"""
+    return backup_log.filename.endswith(MANIFEST_SUFFIX)
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _set_status(backup_log_id, status, **fields):
+    fields['status'] = status
+    BackupLog.query.filter_by(id=backup_log_id).update(fields)
+    db.session.commit()
+
+class _SnapshotRestarting(Exception):
+    """Raised from the backup progress callback to stop a copy that keeps starting over"""
+
+def _snapshot_sqlite(backup_log_id, snapshot_path):
+    """
+    Copy the live SQLite database to snapshot_path in small steps; returns its page size
+
+    Locks are only held while a step runs, and other connections get
+    BACKUP_STEP_PAUSE between steps to commit. With a rollback journal a
+    commit by another connection makes SQLite start the copy over from page
+    0; after BACKUP_MAX_RESTARTS of those the rest is copied in one pass,
+    holding writers off only for that final pass.
+    """
+    source_path = get_sqlite_database_path()
+    if not source_path or not os.path.exists(source_path):
+        raise FileNotFoundError(f'Database file not found: {source_path}')
+
+    source = sqlite3.connect(source_path, timeout=30, isolation_level=None)
+    snapshot = sqlite3.connect(snapshot_path)
+    try:
+        # Only read the journal mode: it is stored in the database file, and
+        # switching it is left to SQLITE_JOURNAL_MODE (apply_sqlite_journal_mode)
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0].lower() == 'wal'
+        page_size = source.execute('PRAGMA page_size').fetchone()[0]
+
+        if wal:
+            # In WAL mode a reader does not block writers, so hold one read
+            # transaction across every step and the copy never restarts
+            source.execute('BEGIN')
+            source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        else:
+            _set_status(backup_log_id, 'copying')
+
+        max_restarts = current_app.config.get('BACKUP_MAX_RESTARTS', BACKUP_MAX_RESTARTS)
+        progress_state = {'copied': 0, 'restarts': 0, 'percent': -1}
+
+        def progress(status, remaining, total):
+            copied = total - remaining
+            if copied < progress_state['copied']:
+                progress_state['restarts'] += 1
+                progress_state['percent'] = -1
+                if progress_state['restarts'] > max_restarts:
+                    raise _SnapshotRestarting()
+            progress_state['copied'] = copied
+            percent = int(100 * copied / total) if total else 100
+            # Progress goes to the same database, and a commit would restart a rollback-journal copy
+            if wal and percent >= progress_state['percent'] + 5:
+                progress_state['percent'] = percent
+                _set_status(backup_log_id, f'copying {percent}%')
+            time.sleep(current_app.config.get('BACKUP_STEP_PAUSE', BACKUP_STEP_PAUSE))
+
+        try:
+            source.backup(snapshot, pages=current_app.config.get('BACKUP_PAGES_PER_STEP', BACKUP_PAGES_PER_STEP),
+                          progress=progress)
+        except _SnapshotRestarting:
+            current_app.logger.warning(f'Backup {backup_log_id}: database changed during {max_restarts} '
+                                       f'stepped copies, finishing in one pass')
+            _set_status(backup_log_id, 'copying')
+            source.backup(snapshot)
+
+        if wal:
+            source.execute('COMMIT')
+    finally:
+        snapshot.close()
+        source.close()
+    return page_size
+
+def _backup_sqlite(backup_log_id, archive_path):
+    fd, snapshot_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(archive_path))
+    os.close(fd)
+    try:
+        _snapshot_sqlite(backup_log_id, snapshot_path)
+        _set_status(backup_log_id, 'compressing')
+        with open(snapshot_path, 'rb') as src, _open_compressed_writer(archive_path) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    finally:
+        os.remove(snapshot_path)
+
+def _backup_sqlite_incremental(backup_log, manifest_path):
+    """Snapshot the database and store only the chunks no earlier backup holds"""
+    backup_dir = os.path.dirname(manifest_path)
+    fd, snapshot_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(fd)
+    try:
+        page_size = _snapshot_sqlite(backup_log.id, snapshot_path)
+        _set_status(backup_log.id, 'storing chunks')
+        manifest, bytes_added = store_snapshot(
+            snapshot_path, get_chunk_dir(backup_dir), page_size,
+            current_app.config.get('BACKUP_CHUNK_SIZE', 64 * 1024)
+        )
+    finally:
+        os.remove(snapshot_path)
+
+    manifest.update({
+        'backup_id': backup_log.id,
+        'filename': backup_log.filename,
+        'created_at': backup_log.created_at.isoformat(),
+        'database': 'sqlite',
+    })
+    write_manifest(manifest_path, manifest)
+    return manifest, bytes_added
+
+def _backup_postgresql(backup_log_id, archive_path):
+    url = db.engine.url
+    env = dict(os.environ)
+    if url.password:
+        env['PGPASSWORD'] = url.password
+    dsn = url.set(drivername='postgresql', password=None).render_as_string(hide_password=False)
+
+    # pg_dump reads from a single repeatable-read snapshot, so users are never blocked
+    process = subprocess.Popen(['pg_dump', '--no-owner', '--no-privileges', '--dbname', dsn],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    dumped = 0
+    last_reported = 0
+    with _open_compressed_writer(archive_path) as dst:
+        for chunk in iter(lambda: process.stdout.read(COPY_CHUNK_SIZE), b''):
+            dst.write(chunk)
+            dumped += len(chunk)
+            if dumped - last_reported >= 16 * COPY_CHUNK_SIZE:
+                last_reported = dumped
+                _set_status(backup_log_id, f'dumped {dumped // COPY_CHUNK_SIZE} MB')
+
+    stderr = process.stderr.read().decode(errors='replace')
+    if process.wait() != 0:
+        raise RuntimeError(f'pg_dump failed: {stderr.strip()}')
+
+def run_backup(backup_log_id):
+    """
+    Take the backup described by a queued BackupLog row
+
+    Copies the database in small steps and either stores its changed chunks
+    (incremental) or streams it into a compressed archive, recording progress
+    on BackupLog.status. Must run inside an application context.
+
+    Args:
+        backup_log_id (int): ID of the BackupLog row created by start_backup
+
+    Returns:
+        bool: True if the backup completed
+    """
+    backup_log = db.session.get(BackupLog, backup_log_id)
+    archive_path = os.path.join(get_backup_dir(), backup_log.filename)
+    started = time.monotonic()
+
+    try:
+        _set_status(backup_log_id, 'in_progress')
+        if is_incremental(backup_log):
+            manifest, file_size = _backup_sqlite_incremental(backup_log, archive_path)
+            _set_status(backup_log_id, 'completed', file_size=file_size,
+                        manifest=json.dumps(manifest), checksum=manifest['sha256'])
+        else:
+            if get_database_backend() == 'sqlite':
+                _backup_sqlite(backup_log_id, archive_path)
+            else:
+                _backup_postgresql(backup_log_id, archive_path)
+            file_size = os.path.getsize(archive_path)
+            _set_status(backup_log_id, 'completed', file_size=file_size, checksum=_file_sha256(archive_path))
+
+        log_action(
+            action='CREATE_BACKUP',
+            entity_type='Backup',
+            entity_id=backup_log_id,
+            details={
+                'filename': backup_log.filename,
+                'file_size': file_size,
+                'description': backup_log.description,
+                'duration_seconds': round(time.monotonic() - started, 2)
+            },
+            user_id=backup_log.created_by
+        )
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Backup {backup_log.filename} failed: {e}')
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+        _set_status(backup_log_id, 'failed', description=f'Backup failed: {str(e)}')
+        return False
+
+def get_backup_manifest(backup_log):
+    """
+    Get the chunk manifest of an incremental backup
+
+    Returns:
+        dict: The manifest stored on the row (or, for rows written before the
+              column was filled, the manifest file), None for archive backups
+    """
+    if not is_incremental(backup_log):
+        return None
+    if backup_log.manifest:
+        return json.loads(backup_log.manifest)
+    return load_manifest(os.path.join(get_backup_dir(), backup_log.filename))
+
+def verify_backup(backup_log):
+    """
+    Check a completed backup against its checksum
+
+    Returns:
+        list: Problems found; empty when the backup is intact
+    """
+    backup_dir = get_backup_dir()
+    manifest = get_backup_manifest(backup_log)
+    if manifest is not None:
+        if backup_log.checksum and manifest['sha256'] != backup_log.checksum:
+            return ['Manifest does not match the checksum recorded for this backup']
+        try:
+            for _ in iter_snapshot(manifest, get_chunk_dir(backup_dir)):
+                pass
+        except ValueError as e:
+            return [str(e)]
+        return []
+
+    archive_path = os.path.join(backup_dir, backup_log.filename)
+    if not os.path.exists(archive_path):
+        return ['Backup file not found']
+    if backup_log.checksum and _file_sha256(archive_path) != backup_log.checksum:
+        return ['Archive does not match the checksum recorded for this backup']
+    return []
+
+def iter_backup_bytes(backup_log):
+    """Yield the backed-up database (or SQL dump) uncompressed, in blocks"""
+    manifest = get_backup_manifest(backup_log)
+    if manifest is not None:
+        yield from iter_snapshot(manifest, get_chunk_dir(get_backup_dir()))
+        return
+    with open_archive(os.path.join(get_backup_dir(), backup_log.filename)) as src:
+        yield from iter(lambda: src.read(COPY_CHUNK_SIZE), b'')
+
+def materialize_backup(backup_log, target_path):
+    """
+    Rebuild a SQLite backup into target_path, verifying its checksum
+
+    The file only appears at target_path once it is complete and verified.
+
+    Raises:
+        ValueError: If the backup is damaged or does not match its checksum
+    """
+    manifest = get_backup_manifest(backup_log)
+    if manifest is not None:
+        if backup_log.checksum and manifest['sha256'] != backup_log.checksum:
+            raise ValueError('Manifest does not match the checksum recorded for this backup')
+        materialize(manifest, get_chunk_dir(get_backup_dir()), target_path)
+        return
+
+    problems = verify_backup(backup_log)
+    if problems:
+        raise ValueError(problems[0])
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target_path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as dst:
+            for block in iter_backup_bytes(backup_log):
+                dst.write(block)
+        os.replace(tmp_path, target_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def find_backup_at(when):
+    """
+    Find the backup to restore for a point in time
+
+    Args:
+        when (datetime): Point in time (UTC)
+
+    Returns:
+        BackupLog: Latest completed backup taken at or before `when`, or None
+    """
+    return BackupLog.query.filter(
+        BackupLog.status == 'completed',
+        BackupLog.created_at <= when
+    ).order_by(BackupLog.created_at.desc()).first()
+
+def delete_backup_files(backup_log):
+    """
+    Remove a backup's files, and any chunks no remaining backup needs
+
+    Chunk clean-up keys off the manifest files on disk rather than BackupLog
+    rows, since restoring an older database drops the rows of newer backups
+    whose chunks must survive. It is skipped while a backup is running.
+
+    Returns:
+        int: Number of chunks deleted
+    """
+    backup_dir = get_backup_dir()
+    path = os.path.join(backup_dir, backup_log.filename)
+    if os.path.exists(path):
+        os.remove(path)
+    if not is_incremental(backup_log):
+        return 0
+
+    running = BackupLog.query.filter(BackupLog.status.notin_(['completed', 'failed'])).count()
+    if running:
+        return 0
+    manifests = [load_manifest(os.path.join(backup_dir, name))
+                 for name in os.listdir(backup_dir) if name.endswith(MANIFEST_SUFFIX)]
+    return collect_garbage(get_chunk_dir(backup_dir), manifests)
+
+def _run_backup_job(app, backup_log_id):
+    with app.app_context():
+        try:
+            run_backup(backup_log_id)
+        finally:
+            db.session.remove()
+
+def _get_runner(app):
+    runner = app.extensions.get('backup_runner')
+    if runner is None or runner[0] != os.getpid():
+        # One worker: backups run one at a time, in the order they were requested
+        runner = (os.getpid(), ThreadPoolExecutor(max_workers=1, thread_name_prefix='backup'))
+        app.extensions['backup_runner'] = runner
+    return runner[1]
+
+def start_backup(description, user_id):
+    """
+    Queue a backup and return immediately
+
+    Args:
+        description (str): Description stored on the BackupLog row
+        user_id (int): User who requested the backup
+
+    Returns:
+        BackupLog: The queued row; its status is updated as the backup runs
+    """
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    if get_database_backend() != 'sqlite':
+        suffix = '.sql' + archive_extension()
+    elif current_app.config.get('BACKUP_MODE', 'incremental') == 'incremental':
+        suffix = MANIFEST_SUFFIX
+    else:
+        suffix = '.db' + archive_extension()
+
+    backup_log = BackupLog(
+        filename=f'library_backup_{timestamp}{suffix}',
+        created_by=user_id,
+        description=description,
+        status='queued'
+    )
+    db.session.add(backup_log)
+    db.session.commit()
+
+    app = current_app._get_current_object()
+    _get_runner(app).submit(_run_backup_job, app, backup_log.id)
+    return backup_log
@@ -0,0 +1,103 @@
+from flask import current_app
+from sqlalchemy import or_, text
+from models import Book, db
+
+# The trigram indexes cannot serve queries shorter than one trigram
+MIN_INDEXED_QUERY_LENGTH = 3
+
+# Searchable text on PostgreSQL; the query must repeat it verbatim to hit the GIN index
+_TRIGRAM_EXPRESSION = (
+    "(coalesce(book.title, '') || ' ' || coalesce(book.author, '') || ' ' || "
+    "coalesce(book.isbn, '') || ' ' || book.unique_id)"
+)
+
+_SQLITE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE book_search USING fts5(
+        title, author, isbn, unique_id,
+        content='book', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER book_search_ai AFTER INSERT ON book BEGIN
+        INSERT INTO book_search(rowid, title, author, isbn, unique_id)
+        VALUES (new.id, new.title, new.author, new.isbn, new.unique_id);
+    END""",
+    """CREATE TRIGGER book_search_ad AFTER DELETE ON book BEGIN
+        INSERT INTO book_search(book_search, rowid, title, author, isbn, unique_id)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.unique_id);
+    END""",
+    # Only the searchable columns: copies_on_loan changes on every borrow and must not churn the index
+    """CREATE TRIGGER book_search_au AFTER UPDATE OF title, author, isbn, unique_id ON book BEGIN
+        INSERT INTO book_search(book_search, rowid, title, author, isbn, unique_id)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.unique_id);
+        INSERT INTO book_search(rowid, title, author, isbn, unique_id)
+        VALUES (new.id, new.title, new.author, new.isbn, new.unique_id);
+    END""",
+    "INSERT INTO book_search(book_search) VALUES ('rebuild')",
+]
+
+def ensure_search_index():
+    """
+    Create the book search index for the configured database if it is missing
+    
+    SQLite gets an FTS5 trigram table kept in sync by triggers; PostgreSQL
+    gets a pg_trgm GIN index. Any other backend, or a failure to create the
+    index (old SQLite build, no CREATE EXTENSION privilege), falls back to
+    plain LIKE matching.
+    
+    Returns:
+        str: Search backend in use ('fts5', 'trigram' or 'like')
+    """
+    dialect = db.engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            with db.engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_search'"
+                )).first()
+                if not exists:
+                    for statement in _SQLITE_FTS_DDL:
+                        conn.execute(text(statement))
+            return 'fts5'
+        
+        if dialect == 'postgresql':
+            with db.engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_book_search_trgm ON book "
+                    f"USING gin ({_TRIGRAM_EXPRESSION} gin_trgm_ops)"
+                ))
+            return 'trigram'
+    except Exception as e:
+        current_app.logger.warning(f"Book search index unavailable, falling back to LIKE: {e}")
+    
+    return 'like'
+
+def book_search_filter(query):
+    """
+    Build a filter matching books whose title, author, ISBN or unique ID contain the query
+    
+    Args:
+        query (str): Text typed by the user
+    
+    Returns:
+        SQL expression usable in Book.query.filter()
+    """
+    backend = current_app.config.get('BOOK_SEARCH_BACKEND', 'like')
+    
+    if backend == 'fts5' and len(query) >= MIN_INDEXED_QUERY_LENGTH:
+        # Quoted as a single phrase so user input is never parsed as FTS syntax
+        phrase = '"' + query.replace('"', '""') + '"'
+        matches = text(
+            "SELECT rowid FROM book_search WHERE book_search MATCH :phrase"
+        ).bindparams(phrase=phrase).columns(rowid=db.Integer)
+        return Book.id.in_(matches)
+    
+    if backend == 'trigram':
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return text(f"{_TRIGRAM_EXPRESSION} ILIKE :pattern").bindparams(pattern=f'%{escaped}%')
+    
+    return or_(
+        Book.title.contains(query, autoescape=True),
+        Book.author.contains(query, autoescape=True),
+        Book.isbn.contains(query, autoescape=True),
+        Book.unique_id.contains(query, autoescape=True)
+    )
@@ -0,0 +1,390 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import case, func, insert, or_, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from models import Book, BorrowRecord, Student, Staff, db
+from utils.activity_rollup import record_activity
+from utils.fine_engine import assess_loan_fine, assess_returned_loans
+
+MAX_STUDENT_LOANS = 3
+MAX_BULK_ITEMS = 200  # Largest class set handled in one transaction
+
+class BorrowError(Exception):
+    """A borrow was refused; the message can be shown to the librarian as is"""
+
+class ReturnError(Exception):
+    """A return was refused; the message can be shown to the librarian as is"""
+
+def adjust_copies_on_loan(book_id, delta):
+    """
+    Shift a book's materialized on-loan counter inside the caller's transaction
+    
+    The UPDATE is expressed relative to the stored value so concurrent
+    borrows/returns cannot overwrite each other, and it only applies while
+    the result stays in range, so a repeated call can never push the
+    counter below 0 or a checkout past total_copies. Returns are not held
+    to total_copies: a book whose copy count was lowered while copies were
+    out must still take them back. Nothing is committed here; the counter
+    change lands together with the BorrowRecord change.
+    
+    Args:
+        book_id (int): Book whose counter changes
+        delta (int): +1 for a checkout, -1 for a return
+    
+    Returns:
+        bool: True if the counter moved, False if that would leave it out of range
+    """
+    in_range = [Book.copies_on_loan + delta >= 0]
+    if delta > 0:
+        in_range.append(Book.copies_on_loan + delta <= Book.total_copies)
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, *in_range)
+        .values(copies_on_loan=Book.copies_on_loan + delta)
+        .execution_options(synchronize_session='evaluate')
+    )
+    return result.rowcount == 1
+
+def rebuild_loan_counters():
+    """
+    Recompute Book.copies_on_loan from open BorrowRecord rows
+    
+    Returns:
+        int: Number of books whose counter was corrected
+    """
+    open_loans = select(func.count(BorrowRecord.id)).where(
+        BorrowRecord.book_id == Book.id,
+        BorrowRecord.returned_at.is_(None)
+    ).scalar_subquery()
+    
+    result = db.session.execute(
+        update(Book)
+        .where(Book.copies_on_loan != open_loans)
+        .values(copies_on_loan=open_loans)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def _begin_write_transaction():
+    """
+    Start the session's transaction holding the database write lock
+
+    On SQLite this is BEGIN IMMEDIATE, so a second desk waits (up to the busy
+    timeout) before it reads availability instead of both reading the same
+    free copy. A connection that already wrote in this transaction holds the
+    lock anyway. PostgreSQL needs nothing here; the rows are locked with
+    SELECT ... FOR UPDATE as they are read.
+    """
+    connection = db.session.connection()
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+def borrow_book(book_id, student_id=None, staff_id=None, notes=''):
+    """
+    Lend one copy of a book, checking availability and the student limit in the same transaction
+
+    The book row (and the student row, with its open-loan count) is read
+    under a lock, and the copy is taken with a conditional UPDATE that only
+    succeeds while copies_on_loan < total_copies, so concurrent desks can
+    never lend more copies than exist or push a student past
+    MAX_STUDENT_LOANS. The loan is flushed but not committed: the caller
+    adds anything that belongs with it (the confirmation email) and commits,
+    which releases the locks.
+
+    Args:
+        book_id (int): Book to lend
+        student_id (int): Borrowing student, or None
+        staff_id (int): Borrowing staff member, or None
+        notes (str): Librarian's notes on the loan
+
+    Returns:
+        tuple: (BorrowRecord, Book, borrower Student/Staff or None)
+
+    Raises:
+        BorrowError: If the book or borrower does not exist, no copy is free
+                     or the student is at the limit; the transaction has
+                     been rolled back
+    """
+    try:
+        _begin_write_transaction()
+        book = db.session.execute(
+            select(Book).where(Book.id == book_id).with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalar_one_or_none()
+        if book is None:
+            raise BorrowError('Book not found')
+        if book.available_copies <= 0:
+            raise BorrowError('This book is not available for borrowing')
+
+        borrower = None
+        if student_id:
+            row = db.session.execute(
+                select(Student, Student.current_borrowed_count).where(Student.id == student_id)
+                .with_for_update(of=Student).execution_options(populate_existing=True)
+            ).first()
+            if row is None:
+                raise BorrowError('Student not found')
+            borrower, open_loans = row
+            if open_loans >= MAX_STUDENT_LOANS:
+                raise BorrowError(f'Student has reached the maximum borrowing limit of {MAX_STUDENT_LOANS} books')
+        elif staff_id:
+            borrower = db.session.get(Staff, staff_id)
+            if borrower is None:
+                raise BorrowError('Staff member not found')
+
+        # Guarded even under the lock, so the counter can never pass the number of copies
+        taken = db.session.execute(
+            update(Book)
+            .where(Book.id == book_id, Book.copies_on_loan < Book.total_copies)
+            .values(copies_on_loan=Book.copies_on_loan + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if taken.rowcount != 1:
+            raise BorrowError('This book is not available for borrowing')
+
+        borrow_record = BorrowRecord(book_id=book_id, student_id=student_id, staff_id=staff_id, notes=notes)
+        db.session.add(borrow_record)
+        db.session.flush()
+    except Exception:
+        db.session.rollback()
+        raise
+    return borrow_record, book, borrower
+
+def return_loan(borrow_id, notes=None):
+    """
+    Close one loan, moving the on-loan counter only if this call closed it
+
+    The loan is closed with a conditional UPDATE (returned_at IS NULL) under
+    the write lock, so when the same loan is returned twice at once exactly
+    one request closes it and the other is refused; the counter moves once.
+    A late return is fined. Nothing is committed here.
+
+    Args:
+        borrow_id (int): Loan being returned
+        notes (str): Replacement notes for the loan, or None to keep them
+
+    Returns:
+        tuple: (BorrowRecord, Fine or None)
+
+    Raises:
+        ReturnError: If the loan is already returned or the book's counter is
+                     out of step; the transaction has been rolled back
+    """
+    try:
+        _begin_write_transaction()
+        now = datetime.utcnow()
+        values = {'returned_at': now}
+        if notes is not None:
+            values['notes'] = notes
+        closed = db.session.execute(
+            update(BorrowRecord)
+            .where(BorrowRecord.id == borrow_id, BorrowRecord.returned_at.is_(None))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        if closed.rowcount != 1:
+            raise ReturnError('This book has already been returned')
+        borrow_record = db.session.execute(
+            select(BorrowRecord).where(BorrowRecord.id == borrow_id)
+            .execution_options(populate_existing=True)
+        ).scalar_one()
+        if not adjust_copies_on_loan(borrow_record.book_id, -1):
+            raise ReturnError('The book\'s loan counter is out of step; run "flask rebuild-loan-counters"')
+        # Bulk statements bypass the flush listener that maintains the report chart buckets
+        record_activity([(now, 'returns', 1, 0.0)])
+        fine = assess_loan_fine(borrow_record, now)
+    except Exception:
+        db.session.rollback()
+        raise
+    return borrow_record, fine
+
+def _borrower_filter(student_id, staff_id):
+    if student_id:
+        return BorrowRecord.student_id == student_id
+    return BorrowRecord.staff_id == staff_id
+
+def _lock_books(identifiers, error):
+    """
+    Lock the requested books and map every identifier to a book id (one query)
+
+    Identifiers are book ids (int) or unique_id strings; repeats stand for
+    further copies of the same book.
+
+    Returns:
+        tuple: (book id per identifier, {book id: Book})
+    """
+    ints = [identifier for identifier in identifiers if isinstance(identifier, int)]
+    strings = [str(identifier) for identifier in identifiers if not isinstance(identifier, int)]
+    books = db.session.execute(
+        select(Book).where(or_(Book.id.in_(ints), Book.unique_id.in_(strings)))
+        .order_by(Book.id).with_for_update()
+        .execution_options(populate_existing=True)
+    ).scalars().all()
+    by_id = {book.id: book for book in books}
+    by_unique_id = {book.unique_id: book.id for book in books}
+
+    book_ids, unknown = [], []
+    for identifier in identifiers:
+        book_id = identifier if isinstance(identifier, int) and identifier in by_id else by_unique_id.get(str(identifier))
+        if book_id is None:
+            unknown.append(str(identifier))
+        else:
+            book_ids.append(book_id)
+    if unknown:
+        raise error(f"Unknown books: {', '.join(unknown)}")
+    return book_ids, by_id
+
+def _shift_counters(per_book, sign):
+    """Move several on-loan counters in one UPDATE, never below zero and checkouts never past the number of copies"""
+    delta = case(per_book, value=Book.id, else_=0) * sign
+    in_range = [Book.copies_on_loan + delta >= 0]
+    if sign > 0:
+        in_range.append(Book.copies_on_loan + delta <= Book.total_copies)
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id.in_(list(per_book)), *in_range)
+        .values(copies_on_loan=Book.copies_on_loan + delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == len(per_book)
+
+def bulk_borrow(book_identifiers, student_id=None, staff_id=None, notes=''):
+    """
+    Lend a class set to one borrower in a single locked transaction
+
+    Every requested copy is checked and taken together: one query locks the
+    books, one UPDATE moves all their counters, and the loans go in with one
+    multi-row INSERT. Either every copy is lent or none is. Students are
+    still held to MAX_STUDENT_LOANS. The loans are flushed but not
+    committed; the caller commits (see borrow_book).
+
+    Args:
+        book_identifiers (list): Book ids or unique_ids, one entry per copy
+        student_id (int): Borrowing student, or None
+        staff_id (int): Borrowing staff member (typically a teacher), or None
+        notes (str): Notes stored on every loan
+
+    Returns:
+        tuple: (list of BorrowRecord, {book id: Book}, borrower)
+
+    Raises:
+        BorrowError: If a book or the borrower is unknown, a book has too few
+                     free copies or a student would pass the limit; the
+                     transaction has been rolled back
+    """
+    if not book_identifiers:
+        raise BorrowError('No books given')
+    if len(book_identifiers) > MAX_BULK_ITEMS:
+        raise BorrowError(f'At most {MAX_BULK_ITEMS} copies can be lent at once')
+    if bool(student_id) == bool(staff_id):
+        raise BorrowError('Give either a student or a staff member as the borrower')
+    try:
+        _begin_write_transaction()
+        book_ids, books = _lock_books(book_identifiers, BorrowError)
+        per_book = Counter(book_ids)
+
+        if student_id:
+            row = db.session.execute(
+                select(Student, Student.current_borrowed_count).where(Student.id == student_id)
+                .with_for_update(of=Student).execution_options(populate_existing=True)
+            ).first()
+            if row is None:
+                raise BorrowError('Student not found')
+            borrower, open_loans = row
+            if open_loans + len(book_ids) > MAX_STUDENT_LOANS:
+                raise BorrowError(f'Student has {open_loans} books out; {len(book_ids)} more would pass '
+                                  f'the limit of {MAX_STUDENT_LOANS} books')
+        else:
+            borrower = db.session.get(Staff, staff_id)
+            if borrower is None:
+                raise BorrowError('Staff member not found')
+
+        short = [f'{books[book_id].title} ({books[book_id].available_copies} free, {wanted} requested)'
+                 for book_id, wanted in per_book.items() if books[book_id].available_copies < wanted]
+        if short or not _shift_counters(per_book, 1):
+            raise BorrowError(f"Not enough copies: {', '.join(short) or 'copies were taken meanwhile'}")
+
+        # One multi-row INSERT for the whole set
+        now = datetime.utcnow()
+        due_date = BorrowRecord.default_due_date(bool(student_id), now)
+        borrow_records = db.session.scalars(insert(BorrowRecord).returning(BorrowRecord), [
+            {'book_id': book_id, 'student_id': student_id, 'staff_id': staff_id,
+             'borrowed_at': now, 'due_date': due_date, 'notes': notes}
+            for book_id in book_ids
+        ]).all()
+        # Bulk statements bypass the flush listener that maintains the report chart buckets
+        record_activity([(now, 'borrows', len(borrow_records), 0.0)])
+    except Exception:
+        db.session.rollback()
+        raise
+    return borrow_records, books, borrower
+
+def bulk_return(book_identifiers, student_id=None, staff_id=None):
+    """
+    Take back a class set from one borrower in a single locked transaction
+
+    Each identifier closes one of the borrower's open loans of that book,
+    oldest first. All loans are closed with one UPDATE, the counters moved
+    with another, and late loans fined in one batch. Either every copy is
+    returned or none is. Nothing is committed here.
+
+    Args:
+        book_identifiers (list): Book ids or unique_ids, one entry per copy
+        student_id (int): Returning student, or None
+        staff_id (int): Returning staff member, or None
+
+    Returns:
+        tuple: (list of returned BorrowRecord, {book id: Book}, list of Fine)
+
+    Raises:
+        ReturnError: If a book is unknown or the borrower does not have that
+                     many copies of it out; the transaction has been rolled back
+    """
+    if not book_identifiers:
+        raise ReturnError('No books given')
+    if len(book_identifiers) > MAX_BULK_ITEMS:
+        raise ReturnError(f'At most {MAX_BULK_ITEMS} copies can be returned at once')
+    if bool(student_id) == bool(staff_id):
+        raise ReturnError('Give either a student or a staff member as the borrower')
+    try:
+        _begin_write_transaction()
+        book_ids, books = _lock_books(book_identifiers, ReturnError)
+        per_book = Counter(book_ids)
+
+        open_loans = db.session.execute(
+            select(BorrowRecord)
+            .where(_borrower_filter(student_id, staff_id), BorrowRecord.book_id.in_(list(per_book)),
+                   BorrowRecord.returned_at.is_(None))
+            .order_by(BorrowRecord.borrowed_at, BorrowRecord.id).with_for_update()
+            .execution_options(populate_existing=True)
+        ).scalars().all()
+        loans_by_book = {}
+        for loan in open_loans:
+            loans_by_book.setdefault(loan.book_id, []).append(loan)
+
+        missing = [f'{books[book_id].title} ({len(loans_by_book.get(book_id, []))} out, {wanted} returned)'
+                   for book_id, wanted in per_book.items() if len(loans_by_book.get(book_id, [])) < wanted]
+        if missing:
+            raise ReturnError(f"Not on loan to this borrower: {', '.join(missing)}")
+        returning = [loan for book_id, wanted in per_book.items() for loan in loans_by_book[book_id][:wanted]]
+
+        now = datetime.utcnow()
+        closed = db.session.execute(
+            update(BorrowRecord)
+            .where(BorrowRecord.id.in_([loan.id for loan in returning]), BorrowRecord.returned_at.is_(None))
+            .values(returned_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if closed.rowcount != len(returning) or not _shift_counters(per_book, -1):
+            raise ReturnError('Some of these loans were returned meanwhile')
+        for loan in returning:
+            # Already written above; set without marking the loans dirty again
+            set_committed_value(loan, 'returned_at', now)
+        # Bulk statements bypass the flush listener that maintains the report chart buckets
+        record_activity([(now, 'returns', len(returning), 0.0)])
+        fines = assess_returned_loans(returning, now)
+    except Exception:
+        db.session.rollback()
+        raise
+    return returning, books, fines
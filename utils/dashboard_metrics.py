@@ -0,0 +1,128 @@
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session, joinedload
+from models import db, Student, Staff, Book, BorrowRecord, Fine
+
+DASHBOARD_METRICS_TTL = 60  # Seconds a snapshot is served before it is recomputed
+DASHBOARD_OVERDUE_PREVIEW = 5  # Overdue loans listed on the dashboard
+
+# Writes to these tables change what the dashboard shows
+_WATCHED_MODELS = (Student, Staff, Book, BorrowRecord, Fine)
+
+_cache = {'snapshot': None, 'expires': 0.0, 'generation': 0}
+_cache_lock = threading.Lock()
+
+def compute_dashboard_metrics():
+    """
+    Run the dashboard aggregates against the database
+
+    Returns:
+        dict: Counts, unpaid fine total, overdue count and preview, and computed_at (UTC)
+    """
+    overdue = BorrowRecord.query.filter(
+        BorrowRecord.returned_at.is_(None),
+        BorrowRecord.due_date < func.now()
+    )
+    overdue_preview = overdue.options(
+        joinedload(BorrowRecord.book_ref),
+        joinedload(BorrowRecord.student_ref),
+        joinedload(BorrowRecord.staff_ref)
+    ).order_by(BorrowRecord.due_date).limit(DASHBOARD_OVERDUE_PREVIEW).all()
+
+    return {
+        'total_students': Student.query.count(),
+        'total_staff': Staff.query.count(),
+        'total_books': Book.query.count(),
+        'active_borrows': BorrowRecord.query.filter_by(returned_at=None).count(),
+        'total_fines': db.session.query(func.sum(Fine.amount)).filter_by(paid=False).scalar() or 0,
+        'overdue_count': overdue.count(),
+        # Plain values, so the snapshot outlives the session that loaded it
+        'overdue_books': [{
+            'title': borrow.book_ref.title,
+            'borrower_type': borrow.borrower_type,
+            'borrower_name': borrow.borrower_name,
+            'due_date': borrow.due_date,
+            'days_overdue': borrow.days_overdue
+        } for borrow in overdue_preview],
+        'computed_at': datetime.utcnow()
+    }
+
+def get_dashboard_metrics(refresh=False):
+    """
+    Dashboard figures from the snapshot cache, recomputed when stale
+
+    Each worker process keeps its own snapshot. It is dropped as soon as this
+    process commits a change to students, staff, books, loans or fines, and
+    otherwise expires after DASHBOARD_METRICS_TTL seconds, which bounds how
+    long writes made by other workers take to show up.
+
+    Args:
+        refresh (bool): Recompute even if the snapshot is current
+
+    Returns:
+        dict: See compute_dashboard_metrics
+    """
+    if not refresh and _cache['snapshot'] and time.monotonic() < _cache['expires']:
+        return _cache['snapshot']
+
+    with _cache_lock:
+        # Another request may have recomputed it while this one waited
+        if not refresh and _cache['snapshot'] and time.monotonic() < _cache['expires']:
+            return _cache['snapshot']
+
+        generation = _cache['generation']
+        snapshot = compute_dashboard_metrics()
+        ttl = current_app.config.get('DASHBOARD_METRICS_TTL', DASHBOARD_METRICS_TTL)
+        # A write committed during the computation may be missing from it; serve it once, then recompute
+        expires = time.monotonic() + ttl if generation == _cache['generation'] else 0.0
+        _cache.update(snapshot=snapshot, expires=expires)
+        return snapshot
+
+def invalidate_dashboard_metrics():
+    """Drop the snapshot so the next dashboard view recomputes it"""
+    _cache['generation'] += 1
+    _cache['expires'] = 0.0
+
+def _touches_watched_models(objects):
+    return any(isinstance(obj, _WATCHED_MODELS) for obj in objects)
+
+def _note_changes(session, flush_context):
+    if _touches_watched_models(session.new) or _touches_watched_models(session.dirty) \
+            or _touches_watched_models(session.deleted):
+        session.info['dashboard_metrics_stale'] = True
+
+def _note_bulk_changes(orm_execute_state):
+    # Bulk INSERT/UPDATE/DELETE statements (e.g. the on-loan counters, batch fines) bypass the flush
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) \
+            and orm_execute_state.bind_mapper \
+            and orm_execute_state.bind_mapper.class_ in _WATCHED_MODELS:
+        orm_execute_state.session.info['dashboard_metrics_stale'] = True
+
+def _invalidate_on_commit(session):
+    if session.info.pop('dashboard_metrics_stale', False):
+        invalidate_dashboard_metrics()
+
+def _forget_changes(session):
+    session.info.pop('dashboard_metrics_stale', None)
+
+_LISTENERS = (
+    ('after_flush', _note_changes),
+    ('do_orm_execute', _note_bulk_changes),
+    ('after_commit', _invalidate_on_commit),
+    ('after_rollback', _forget_changes),
+)
+
+def install_metrics_invalidation():
+    """
+    Invalidate the dashboard snapshot whenever a relevant change commits
+
+    Borrows, returns, fine payments and catalogue edits all go through the
+    session, so one set of listeners covers every route that makes them.
+    Safe to call more than once.
+    """
+    for identifier, listener in _LISTENERS:
+        if not event.contains(Session, identifier, listener):
+            event.listen(Session, identifier, listener)
@@ -0,0 +1,291 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, exc
+from models import db, BackupLog
+from utils.audit_logger import flush_audit_log
+from utils.backup_engine import get_backup_dir, get_sqlite_database_path, materialize_backup
+
+# Optional: with fcntl (any POSIX system) every worker process takes part in a
+# restore through a lock file beside the database. Without it (Windows) only
+# connections in the restoring process are coordinated, so restores are only
+# safe when the app runs as a single process.
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+RESTORE_QUIESCE_TIMEOUT = 5.0  # Seconds to wait for in-flight connections before giving up
+RESTORE_GATE_TIMEOUT = 30.0  # Longest a new connection is held back while a restore runs
+RESTORE_POLL_INTERVAL = 0.005
+
+_gate = threading.Event()
+_gate.set()
+_gate_lock = threading.Lock()
+_gate_waiters = [0]
+_restore_lock = threading.Lock()
+
+# This process's shared hold on the database lock file, taken while any of
+# its connections is checked out
+_shared_hold = {'pid': None, 'file': None, 'holders': 0}
+_shared_hold_lock = threading.Lock()
+
+def _database_inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+def _restore_flag_path(path):
+    return path + '.restoring'
+
+def _lock_file_path(path):
+    return path + '.lock'
+
+def _flock(lock_file, mode, timeout):
+    """Take an flock within timeout seconds; returns whether it was taken"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fcntl.flock(lock_file, mode | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(RESTORE_POLL_INTERVAL)
+
+def _acquire_shared_hold(path):
+    """
+    Count a checkout against this process's shared lock on the database
+
+    A restore in any process raises the restore flag and then waits for an
+    exclusive lock, so checkouts wait for the flag to drop before joining.
+    """
+    if fcntl is None:
+        return
+    deadline = time.monotonic() + RESTORE_GATE_TIMEOUT
+    while os.path.exists(_restore_flag_path(path)) and time.monotonic() < deadline:
+        time.sleep(RESTORE_POLL_INTERVAL)
+    with _shared_hold_lock:
+        if _shared_hold['pid'] != os.getpid():
+            # First checkout in this process (or in a worker forked after the file was opened)
+            _shared_hold.update(pid=os.getpid(), file=open(_lock_file_path(path), 'a'), holders=0)
+        if _shared_hold['holders'] == 0:
+            if not _flock(_shared_hold['file'], fcntl.LOCK_SH, max(deadline - time.monotonic(), 0)):
+                raise exc.TimeoutError('Database is being restored; try again shortly')
+        _shared_hold['holders'] += 1
+
+def _release_shared_hold():
+    if fcntl is None:
+        return
+    with _shared_hold_lock:
+        if _shared_hold['pid'] != os.getpid() or not _shared_hold['holders']:
+            return
+        _shared_hold['holders'] -= 1
+        if not _shared_hold['holders']:
+            fcntl.flock(_shared_hold['file'], fcntl.LOCK_UN)
+
+def install_restore_guard():
+    """
+    Make pooled SQLite connections safe across a restore
+
+    New checkouts wait while a restore swaps the database file, and any
+    connection opened on the file that was replaced is discarded and
+    reconnected instead of reading stale pages. Every checked-out connection
+    holds a shared lock on a lock file beside the database, so a restore in
+    one worker process waits until no other worker is using the database
+    before it swaps the file (see the fcntl note above). Call once per
+    engine inside an app context.
+    """
+    path = get_sqlite_database_path()
+    if not path:
+        return
+
+    engine = db.engine
+
+    @event.listens_for(engine, 'connect')
+    def remember_inode(dbapi_connection, connection_record):
+        connection_record.info['db_inode'] = _database_inode(path)
+
+    @event.listens_for(engine, 'checkout')
+    def check_inode(dbapi_connection, connection_record, connection_proxy):
+        if not _gate.is_set():
+            with _gate_lock:
+                _gate_waiters[0] += 1
+            try:
+                _gate.wait(RESTORE_GATE_TIMEOUT)
+            finally:
+                with _gate_lock:
+                    _gate_waiters[0] -= 1
+        _acquire_shared_hold(path)
+        if connection_record.info.get('db_inode') != _database_inode(path):
+            _release_shared_hold()
+            # The pool retries the checkout with a fresh connection to the new file
+            raise exc.DisconnectionError('Database file was replaced by a restore')
+
+    @event.listens_for(engine, 'checkin')
+    def release_hold(dbapi_connection, connection_record):
+        _release_shared_hold()
+
+def validate_sqlite_backup(path):
+    """
+    Check that a rebuilt backup is sound and matches the application's schema
+
+    Args:
+        path (str): Rebuilt database file
+
+    Returns:
+        set: Names of the tables in the backup
+
+    Raises:
+        ValueError: If the file fails PRAGMA integrity_check, was taken at a
+                    different migration revision, or lacks tables or columns
+                    the models need
+    """
+    conn = sqlite3.connect(path)
+    try:
+        try:
+            result = [row[0] for row in conn.execute('PRAGMA integrity_check').fetchall()]
+        except sqlite3.DatabaseError as e:
+            raise ValueError(f'Backup is not a readable SQLite database: {e}')
+        if result != ['ok']:
+            raise ValueError(f'Backup failed integrity check: {"; ".join(result[:5])}')
+
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+        if 'alembic_version' in tables:
+            backup_revision = conn.execute('SELECT version_num FROM alembic_version').fetchone()
+            try:
+                live_revision = db.session.execute(db.text('SELECT version_num FROM alembic_version')).fetchone()
+            except Exception:
+                db.session.rollback()
+                live_revision = None
+            if backup_revision and live_revision and backup_revision[0] != live_revision[0]:
+                raise ValueError(f'Backup schema revision {backup_revision[0]} does not match '
+                                 f'the database revision {live_revision[0]}')
+
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                raise ValueError(f'Backup is missing table {table.name}')
+            columns = {row[1] for row in conn.execute(f'PRAGMA table_info("{table.name}")')}
+            missing = [column.name for column in table.columns if column.name not in columns]
+            if missing:
+                raise ValueError(f'Backup table {table.name} is missing columns {", ".join(missing)}')
+        return tables
+    finally:
+        conn.close()
+
+def _wait_for_idle_pool(timeout):
+    pool = db.engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return True
+    deadline = time.monotonic() + timeout
+    while True:
+        with _gate_lock:
+            # Connections held by checkouts parked at the gate are not in use
+            busy = pool.checkedout() - _gate_waiters[0]
+        if busy <= 0:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.005)
+
+def restore_sqlite_backup(backup_log):
+    """
+    Replace the live SQLite database with a backup, with a short, bounded pause
+
+    The backup is rebuilt and validated beside the database first. Only then
+    are new connections held back, in-flight ones drained (in every worker
+    process, through the lock file), the file swapped with an atomic rename
+    and the pool disposed; the database is unavailable for that window alone.
+    Other processes' idle connections reconnect to the new file on their
+    next checkout.
+
+    Args:
+        backup_log (BackupLog): Completed backup to restore
+
+    Returns:
+        dict: pre_restore_backup filename and validate_ms, quiesce_ms,
+              swap_ms and downtime_ms timings
+
+    Raises:
+        ValueError: If the backup is invalid or the database cannot be quiesced
+    """
+    source_db = get_sqlite_database_path()
+    if not source_db:
+        raise ValueError('Restoring is only supported for SQLite databases')
+
+    with _restore_lock:
+        stats = {}
+        restored_path = source_db + '.restore'
+        started = time.monotonic()
+        try:
+            materialize_backup(backup_log, restored_path)
+            tables = validate_sqlite_backup(restored_path)
+            stats['validate_ms'] = round((time.monotonic() - started) * 1000, 1)
+
+            # Safety copy of the current database, taken while it is still live
+            current_timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+            stats['pre_restore_backup'] = f'pre_restore_backup_{current_timestamp}.db'
+            source_conn = sqlite3.connect(source_db)
+            pre_restore_conn = sqlite3.connect(os.path.join(get_backup_dir(), stats['pre_restore_backup']))
+            source_conn.backup(pre_restore_conn)
+            pre_restore_conn.close()
+            source_conn.close()
+
+            # The snapshot caught this backup's own row mid-copy; it is put right after the swap
+            completed_row = {'status': 'completed', 'file_size': backup_log.file_size,
+                             'manifest': backup_log.manifest, 'checksum': backup_log.checksum}
+            backup_log_id = backup_log.id
+
+            flush_audit_log()
+            db.session.remove()
+
+            paused = time.monotonic()
+            quiesce_timeout = current_app.config.get('RESTORE_QUIESCE_TIMEOUT', RESTORE_QUIESCE_TIMEOUT)
+            # Other worker processes stop taking connections once the flag is up
+            if fcntl is not None:
+                open(_restore_flag_path(source_db), 'w').close()
+            _gate.clear()
+            lock_file = None
+            try:
+                if not _wait_for_idle_pool(quiesce_timeout):
+                    raise ValueError('Database is busy; restore abandoned before anything was changed')
+                if fcntl is not None:
+                    # Granted once no other process has a connection checked out
+                    lock_file = open(_lock_file_path(source_db), 'a')
+                    if not _flock(lock_file, fcntl.LOCK_EX, max(paused + quiesce_timeout - time.monotonic(), 0)):
+                        raise ValueError('Another worker is still using the database; '
+                                         'restore abandoned before anything was changed')
+                stats['quiesce_ms'] = round((time.monotonic() - paused) * 1000, 1)
+
+                swap_started = time.monotonic()
+                db.engine.dispose()
+                os.replace(restored_path, source_db)
+                # The old file's journal must not be replayed onto the restored one
+                for suffix in ('-wal', '-shm'):
+                    if os.path.exists(source_db + suffix):
+                        os.remove(source_db + suffix)
+                stats['swap_ms'] = round((time.monotonic() - swap_started) * 1000, 1)
+            finally:
+                if lock_file is not None:
+                    lock_file.close()
+                if os.path.exists(_restore_flag_path(source_db)):
+                    os.remove(_restore_flag_path(source_db))
+                _gate.set()
+                stats['downtime_ms'] = round((time.monotonic() - paused) * 1000, 1)
+        finally:
+            if os.path.exists(restored_path):
+                os.remove(restored_path)
+
+        BackupLog.query.filter_by(id=backup_log_id).update(completed_row)
+        db.session.commit()
+
+        if 'book_search' not in tables and current_app.config.get('BOOK_SEARCH_BACKEND') == 'fts5':
+            from utils.book_search import ensure_search_index
+            ensure_search_index()
+
+        return stats
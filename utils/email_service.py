@@ -1,11 +1,19 @@
 import os
 import smtplib
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
-from flask import current_app
-from models import EmailLog, NotificationPreference, BorrowRecord, Student, db
+from itertools import islice
+from flask import current_app, has_request_context
+from flask_login import current_user
+from sqlalchemy import Date, Integer, and_, cast, func, or_, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import EmailLog, EmailOutbox, NotificationLedger, NotificationPreference, BorrowRecord, Student, Book, db
 from utils.audit_logger import log_action
+from utils.smtp_pool import SMTPSessionPool
+from utils.fine_engine import compute_fines
 
 # Email service configuration
 def _get_config_value(key, default=None):
@@ -25,121 +33,204 @@ GMAIL_USER = _get_config_value('GMAIL_USER')
 GMAIL_APP_PASSWORD = _get_config_value('GMAIL_APP_PASSWORD')
 FROM_EMAIL = _get_config_value('FROM_EMAIL', GMAIL_USER or 'library@confucius.uonbi.ac.ke')
 
-def send_email(to_email, subject, body, email_type, student_id=None, borrow_record_id=None):
+# Outbox retry policy: exponential backoff, then dead-letter
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_SECONDS = 60
+EMAIL_CLAIM_TIMEOUT = timedelta(minutes=10)  # A claim older than this is assumed to be from a crashed worker
+
+def _smtp_settings():
+    """Read SMTP settings; SMTP_HOST/SMTP_PORT/SMTP_USE_TLS allow a local SMTP stand-in"""
+    smtp = {
+        'host': _get_config_value('SMTP_HOST', 'smtp.gmail.com'),
+        'port': int(_get_config_value('SMTP_PORT', 587)),
+        'use_tls': str(_get_config_value('SMTP_USE_TLS', 'true')).lower() not in ('0', 'false', 'no'),
+        'user': _get_config_value('GMAIL_USER'),
+        'password': _get_config_value('GMAIL_APP_PASSWORD'),
+    }
+    smtp['enabled'] = bool(smtp['user'] and smtp['password']) or bool(_get_config_value('SMTP_HOST'))
+    return smtp
+
+def create_smtp_pool(size=None):
     """
-    Send an email using Gmail SMTP or SendGrid and log it
+    Build an SMTPSessionPool from the email configuration
     
     Args:
-        to_email (str): Recipient email address
-        subject (str): Email subject
-        body (str): Email body
-        email_type (str): Type of email ('due_reminder', 'overdue_notice')
-        student_id (int): Student ID if applicable
-        borrow_record_id (int): Borrow record ID if applicable
+        size (int): Concurrent sessions (defaults to SMTP_POOL_SIZE, then 4)
     
     Returns:
-        bool: True if sent successfully, False otherwise
+        SMTPSessionPool or None if SMTP is not configured
+    """
+    smtp = _smtp_settings()
+    if not smtp['enabled']:
+        return None
+    return SMTPSessionPool(
+        smtp['host'], smtp['port'],
+        user=smtp['user'], password=smtp['password'], use_tls=smtp['use_tls'],
+        size=size or int(_get_config_value('SMTP_POOL_SIZE', 4))
+    )
+
+def _build_message(from_email, to_email, subject, body):
+    msg = MIMEMultipart()
+    msg['From'] = from_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg
+
+def _send_via_sendgrid(to_email, subject, body, sg_key, from_email):
+    """Send one message through SendGrid; returns (status, error_message)"""
+    try:
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
+        sg = SendGridAPIClient(api_key=sg_key)
+
+        message = Mail(
+            from_email=from_email,
+            to_emails=to_email,
+            subject=subject,
+            plain_text_content=body
+        )
+
+        response = sg.send(message)
+
+        # Check if send was successful
+        if response.status_code >= 200 and response.status_code < 300:
+            return 'sent', None
+        return 'failed', f'SendGrid error: {response.status_code}'
+    except ImportError:
+        current_app.logger.error('SendGrid library not installed. Install sendgrid with pip to use SendGrid.')
+        return 'failed', 'SendGrid library not installed'
+    except Exception as sg_error:
+        current_app.logger.error(f'SendGrid error: {str(sg_error)}')
+        return 'failed', f'SendGrid error: {str(sg_error)}'
+
+def _deliver_many(items, smtp_pool=None):
     """
-    # Refresh credentials from app config (in case they were set after import)
+    Deliver several messages, reusing SMTP sessions and sending concurrently
+    
+    Messages go out over the pool's sessions (one handshake per session, not
+    per message); any SMTP failure falls back to SendGrid when configured.
+    
+    Args:
+        items (list): (to_email, subject, body) tuples
+        smtp_pool (SMTPSessionPool): Pool to use; a temporary one is created if None
+    
+    Returns:
+        list: (status, error_message) per item, in order
+    """
+    smtp = _smtp_settings()
     sg_key = _get_config_value('SENDGRID_API_KEY')
-    gmail_user = _get_config_value('GMAIL_USER')
-    gmail_app_pass = _get_config_value('GMAIL_APP_PASSWORD')
-    from_email = _get_config_value('FROM_EMAIL', gmail_user or 'library@confucius.uonbi.ac.ke')
+    from_email = _get_config_value('FROM_EMAIL', smtp['user'] or 'library@confucius.uonbi.ac.ke')
 
-    status = 'failed'
-    error_message = None
+    smtp_errors = [None] * len(items)
+    if smtp['enabled'] and items:
+        pool = smtp_pool or create_smtp_pool()
+        sender = smtp['user'] or from_email
 
-    try:
-        # Try Gmail SMTP first if credentials are available
-        if gmail_user and gmail_app_pass:
+        def send_one(item):
             try:
-                msg = MIMEMultipart()
-                msg['From'] = gmail_user
-                msg['To'] = to_email
-                msg['Subject'] = subject
-                msg.attach(MIMEText(body, 'plain'))
-
-                # Connect to Gmail SMTP server
-                with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                    server.starttls()
-                    server.login(gmail_user, gmail_app_pass)
-                    server.send_message(msg)
-
-                current_app.logger.info(f"Email sent successfully via Gmail to {to_email}")
-                status = 'sent'
-                error_message = None
-            except Exception as gmail_error:
-                # Log and continue to try SendGrid if available
-                current_app.logger.error(f"Gmail SMTP error: {str(gmail_error)}")
-                status = 'failed'
-                error_message = f'Gmail SMTP error: {str(gmail_error)}'
+                pool.send_message(_build_message(sender, *item))
+                return None
+            except Exception as e:
+                return e
+
+        try:
+            with ThreadPoolExecutor(max_workers=pool.size) as executor:
+                smtp_errors = list(executor.map(send_one, items))
+        finally:
+            if smtp_pool is None:
+                pool.close()
+
+    results = []
+    for (to_email, subject, body), smtp_error in zip(items, smtp_errors):
+        if smtp['enabled'] and smtp_error is None:
+            current_app.logger.info(f"Email sent successfully via SMTP to {to_email}")
+            results.append(('sent', None))
+            continue
+
+        status, error_message = 'failed', None
+        if smtp['enabled']:
+            # Log and continue to try SendGrid if available
+            current_app.logger.error(f"Gmail SMTP error: {str(smtp_error)}")
+            error_message = f'Gmail SMTP error: {str(smtp_error)}'
 
         # If Gmail didn't send, try SendGrid if configured
-        if status != 'sent' and sg_key:
-            try:
-                from sendgrid import SendGridAPIClient
-                from sendgrid.helpers.mail import Mail
-
-                sg = SendGridAPIClient(api_key=sg_key)
-
-                message = Mail(
-                    from_email=from_email,
-                    to_emails=to_email,
-                    subject=subject,
-                    plain_text_content=body
-                )
-
-                response = sg.send(message)
-
-                # Check if send was successful
-                if response.status_code >= 200 and response.status_code < 300:
-                    status = 'sent'
-                    error_message = None
-                else:
-                    status = 'failed'
-                    error_message = f'SendGrid error: {response.status_code}'
-            except ImportError:
-                current_app.logger.error('SendGrid library not installed. Install sendgrid with pip to use SendGrid.')
-                error_message = 'SendGrid library not installed'
-            except Exception as sg_error:
-                current_app.logger.error(f'SendGrid error: {str(sg_error)}')
-                error_message = f'SendGrid error: {str(sg_error)}'
+        if sg_key:
+            status, error_message = _send_via_sendgrid(to_email, subject, body, sg_key, from_email)
 
         # No credentials at all
-        if status != 'sent' and not (gmail_user and gmail_app_pass) and not sg_key:
+        if status != 'sent' and not smtp['enabled'] and not sg_key:
             current_app.logger.warning(f"Email NOT SENT (no credentials) - To: {to_email}, Subject: {subject}")
             error_message = 'No email credentials configured (GMAIL_USER or SENDGRID_API_KEY required)'
 
-        # Log the email
-        email_log = EmailLog(
-            recipient_email=to_email,
-            subject=subject,
-            body=body,
-            email_type=email_type,
-            student_id=student_id,
-            borrow_record_id=borrow_record_id,
-            status=status,
-            error_message=error_message
-        )
+        results.append((status, error_message))
 
-        db.session.add(email_log)
-        db.session.commit()
+    return results
 
-        # Log action in audit trail
-        log_action(
-            action='SEND_EMAIL',
-            entity_type='Email',
-            entity_id=email_log.id,
-            details={
-                'recipient': to_email,
-                'subject': subject,
-                'email_type': email_type,
-                'student_id': student_id,
-                'borrow_record_id': borrow_record_id,
-                'status': status
-            }
-        )
+def _deliver(to_email, subject, body, smtp_pool=None):
+    """
+    Hand a message to Gmail SMTP (or the configured SMTP host), falling back to SendGrid
+    
+    Returns:
+        tuple: (status, error_message) where status is 'sent' or 'failed'
+    """
+    return _deliver_many([(to_email, subject, body)], smtp_pool)[0]
+
+def _record_email(to_email, subject, body, email_type, student_id, borrow_record_id, status, error_message, user_id=None):
+    """Write the EmailLog row and the matching audit entry for a delivery attempt"""
+    email_log = EmailLog(
+        recipient_email=to_email,
+        subject=subject,
+        body=body,
+        email_type=email_type,
+        student_id=student_id,
+        borrow_record_id=borrow_record_id,
+        status=status,
+        error_message=error_message
+    )
+
+    db.session.add(email_log)
+    db.session.commit()
+
+    # Log action in audit trail
+    log_action(
+        action='SEND_EMAIL',
+        entity_type='Email',
+        entity_id=email_log.id,
+        details={
+            'recipient': to_email,
+            'subject': subject,
+            'email_type': email_type,
+            'student_id': student_id,
+            'borrow_record_id': borrow_record_id,
+            'status': status
+        },
+        user_id=user_id
+    )
+
+    return email_log
 
+def send_email(to_email, subject, body, email_type, student_id=None, borrow_record_id=None):
+    """
+    Send an email immediately using Gmail SMTP or SendGrid and log it
+    
+    Use queue_email() from request handlers; this blocks on the mail server.
+    
+    Args:
+        to_email (str): Recipient email address
+        subject (str): Email subject
+        body (str): Email body
+        email_type (str): Type of email ('due_reminder', 'overdue_notice')
+        student_id (int): Student ID if applicable
+        borrow_record_id (int): Borrow record ID if applicable
+    
+    Returns:
+        bool: True if sent successfully, False otherwise
+    """
+    try:
+        status, error_message = _deliver(to_email, subject, body)
+        _record_email(to_email, subject, body, email_type, student_id, borrow_record_id, status, error_message)
         return status == 'sent'
 
     except Exception as e:
@@ -163,46 +254,290 @@ def send_email(to_email, subject, body, email_type, student_id=None, borrow_reco
         current_app.logger.error(f"Failed to send email: {e}")
         return False
 
-def send_due_date_reminders():
+def queue_email(to_email, subject, body, email_type, student_id=None, borrow_record_id=None, commit=True):
     """
-    Send due date reminder emails to students
+    Put an email in the outbox for the email worker to deliver
+    
+    Takes the same arguments as send_email() but only writes one row, so the
+    calling request never waits on the mail server. With commit=False the
+    row joins the caller's transaction and is only sent if that commits.
+    
+    Returns:
+        EmailOutbox: The queued message, or None if there is no recipient address
+    """
+    if not to_email:
+        current_app.logger.warning(f"Email NOT QUEUED (no recipient address) - Subject: {subject}")
+        return None
+
+    queued_by = None
+    if has_request_context() and current_user.is_authenticated:
+        queued_by = current_user.id
+
+    message = EmailOutbox(
+        recipient_email=to_email,
+        subject=subject,
+        body=body,
+        email_type=email_type,
+        student_id=student_id,
+        borrow_record_id=borrow_record_id,
+        queued_by=queued_by,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(message)
+    if commit:
+        db.session.commit()
+    return message
+
+def send_bulk_emails(messages, smtp_pool=None, return_results=False):
     """
-    # Get borrowing records that are due in 1-2 days (configurable per student)
-    tomorrow = datetime.utcnow() + timedelta(days=1)
-    day_after_tomorrow = datetime.utcnow() + timedelta(days=2)
+    Send many emails over pooled SMTP sessions and log each one
     
-    # Get active borrows due soon
-    upcoming_due_borrows = BorrowRecord.query.filter(
-        BorrowRecord.returned_at.is_(None),
-        BorrowRecord.due_date >= tomorrow,
-        BorrowRecord.due_date <= day_after_tomorrow,
-        BorrowRecord.student_id.isnot(None)  # Only students, not staff
-    ).all()
+    Args:
+        messages (list): dicts with the send_email() arguments (to_email, subject,
+            body, email_type, student_id, borrow_record_id)
+        smtp_pool (SMTPSessionPool): Pool to reuse; a temporary one is created if None
+        return_results (bool): Return the per-message (status, error_message) list instead
+    
+    Returns:
+        int: Number of emails sent successfully
+    """
+    results = _deliver_many([(m['to_email'], m['subject'], m['body']) for m in messages], smtp_pool)
     
     sent_count = 0
+    for message, (status, error_message) in zip(messages, results):
+        _record_email(message['to_email'], message['subject'], message['body'], message['email_type'],
+                      message.get('student_id'), message.get('borrow_record_id'), status, error_message)
+        if status == 'sent':
+            sent_count += 1
+    return results if return_results else sent_count
+
+def _claim_due_messages(batch_size):
+    """
+    Atomically claim up to batch_size due outbox rows for this worker
     
-    for borrow in upcoming_due_borrows:
-        student = borrow.student_ref
-        
-        # Check if student has notification preferences
-        prefs = NotificationPreference.query.filter_by(student_id=student.id).first()
-        
-        # Default to sending reminders if no preferences set
-        if not prefs or prefs.email_due_reminder:
-            days_until_due = (borrow.due_date.date() - datetime.utcnow().date()).days
-            
-            # Check if we should send reminder based on preference
-            days_before = prefs.days_before_due if prefs else 1
-            
-            if days_until_due <= days_before:
-                subject = f"Library Book Due Reminder - {borrow.book_ref.title}"
-                body = f"""
+    The claim is a single conditional UPDATE stamped with a random token, so
+    concurrent workers never deliver the same message twice.
+    """
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < now - EMAIL_CLAIM_TIMEOUT)
+    )
+    candidate_ids = [row.id for row in db.session.query(EmailOutbox.id).filter(claimable)
+                     .order_by(EmailOutbox.next_attempt_at).limit(batch_size)]
+    if not candidate_ids:
+        return []
+
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(candidate_ids), claimable)
+        .values(status='sending', claimed_at=now, claim_token=token)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return EmailOutbox.query.filter_by(claim_token=token).order_by(EmailOutbox.id).all()
+
+def _complete_delivery(message, status, error_message):
+    """Mark a claimed message sent, scheduled for retry or dead-lettered"""
+    now = datetime.utcnow()
+    message.attempts = (message.attempts or 0) + 1
+    message.claim_token = None
+    message.last_error = error_message
+
+    if status == 'sent':
+        message.status = 'sent'
+        message.sent_at = now
+    elif message.attempts >= EMAIL_MAX_ATTEMPTS:
+        message.status = 'dead'
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = now + timedelta(seconds=EMAIL_RETRY_BASE_SECONDS * 2 ** (message.attempts - 1))
+    db.session.commit()
+
+    # Only final outcomes go to the email log; retries stay in the outbox
+    if message.status in ('sent', 'dead'):
+        _record_email(message.recipient_email, message.subject, message.body, message.email_type,
+                      message.student_id, message.borrow_record_id,
+                      'sent' if message.status == 'sent' else 'failed', error_message,
+                      user_id=message.queued_by)
+
+def drain_outbox(batch_size=50, smtp_pool=None):
+    """
+    Deliver the outbox messages that are due
+    
+    Args:
+        batch_size (int): Maximum number of messages to claim in this pass
+        smtp_pool (SMTPSessionPool): Pool to reuse across passes
+    
+    Returns:
+        int: Number of messages processed (sent, retried or dead-lettered)
+    """
+    messages = _claim_due_messages(batch_size)
+    if not messages:
+        return 0
+    
+    try:
+        results = _deliver_many([(m.recipient_email, m.subject, m.body) for m in messages], smtp_pool)
+    except Exception as e:
+        results = [('failed', str(e))] * len(messages)
+    
+    for message, (status, error_message) in zip(messages, results):
+        _complete_delivery(message, status, error_message)
+    return len(messages)
+
+def requeue_dead_emails():
+    """
+    Give dead-lettered messages a fresh set of attempts
+    
+    Returns:
+        int: Number of messages requeued
+    """
+    result = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.status == 'dead')
+        .values(status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+# Rows fetched per round trip when streaming notification candidates
+NOTIFICATION_FETCH_SIZE = 500
+NOTIFICATION_CLAIM_BATCH_SIZE = 200  # Ledger rows per INSERT; 4 parameters each stays under SQLite's 999 limit
+
+def _days_from(start_date, datetime_column):
+    """SQL expression for whole calendar days from a Python date to the date of a datetime column"""
+    if db.engine.dialect.name == 'postgresql':
+        return cast(datetime_column, Date) - start_date
+    return cast(func.julianday(func.date(datetime_column)) - func.julianday(start_date.isoformat()), Integer)
+
+def _notification_period(now):
+    """Ledger period for a run: each notice type goes out at most once per borrow per day"""
+    return now.strftime('%Y-%m-%d')
+
+def _notification_candidates(email_type, period, *criteria):
+    """
+    Build the (borrow, student, book, preference) query for student notifications
+    
+    Everything a notification needs comes back in one joined query. The
+    student's first NotificationPreference row is outer-joined so students
+    without preferences still appear (with preference None). Borrows already
+    in the notification ledger for this type and period are anti-joined out.
+    """
+    already_notified = db.session.query(NotificationLedger.id).filter(
+        NotificationLedger.borrow_record_id == BorrowRecord.id,
+        NotificationLedger.email_type == email_type,
+        NotificationLedger.period == period
+    ).exists()
+    
+    first_preference = db.session.query(
+        NotificationPreference.student_id,
+        func.min(NotificationPreference.id).label('preference_id')
+    ).group_by(NotificationPreference.student_id).subquery()
+    
+    return db.session.query(BorrowRecord, Student, Book, NotificationPreference).join(
+        Student, BorrowRecord.student_id == Student.id
+    ).join(
+        Book, BorrowRecord.book_id == Book.id
+    ).outerjoin(
+        first_preference, first_preference.c.student_id == Student.id
+    ).outerjoin(
+        NotificationPreference, NotificationPreference.id == first_preference.c.preference_id
+    ).filter(
+        BorrowRecord.returned_at.is_(None),
+        ~already_notified,
+        *criteria
+    ).order_by(BorrowRecord.id).yield_per(NOTIFICATION_FETCH_SIZE)
+
+def _claim_notifications(borrow_record_ids, email_type, period):
+    """
+    Write ledger rows for the given borrows and return the ids this run now owns
+    
+    Uses INSERT ... ON CONFLICT DO NOTHING RETURNING, so when two runs overlap
+    each borrow is claimed (and emailed) by exactly one of them. Rows go in
+    NOTIFICATION_CLAIM_BATCH_SIZE at a time to stay under the database's
+    bound-parameter limit.
+    """
+    if not borrow_record_ids:
+        return set()
+    
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    now = datetime.utcnow()
+    claimed = set()
+    for start in range(0, len(borrow_record_ids), NOTIFICATION_CLAIM_BATCH_SIZE):
+        stmt = dialect_insert(NotificationLedger).values([
+            {'borrow_record_id': borrow_id, 'email_type': email_type, 'period': period, 'created_at': now}
+            for borrow_id in borrow_record_ids[start:start + NOTIFICATION_CLAIM_BATCH_SIZE]
+        ]).on_conflict_do_nothing(
+            index_elements=['borrow_record_id', 'email_type', 'period']
+        ).returning(NotificationLedger.borrow_record_id)
+        claimed.update(row[0] for row in db.session.execute(stmt))
+    db.session.commit()
+    return claimed
+
+def _send_notifications(messages, email_type, period, smtp_pool=None):
+    """
+    Claim, send and log a run's notifications
+    
+    Claims that could not be delivered are released so the next run retries them.
+    
+    Returns:
+        int: Number of emails sent successfully
+    """
+    claimed = _claim_notifications([m['borrow_record_id'] for m in messages], email_type, period)
+    messages = [m for m in messages if m['borrow_record_id'] in claimed]
+    
+    results = send_bulk_emails(messages, smtp_pool, return_results=True)
+    
+    failed_ids = [m['borrow_record_id'] for m, (status, _) in zip(messages, results) if status != 'sent']
+    for start in range(0, len(failed_ids), NOTIFICATION_CLAIM_BATCH_SIZE):
+        NotificationLedger.query.filter(
+            NotificationLedger.borrow_record_id.in_(failed_ids[start:start + NOTIFICATION_CLAIM_BATCH_SIZE]),
+            NotificationLedger.email_type == email_type,
+            NotificationLedger.period == period
+        ).delete(synchronize_session=False)
+    if failed_ids:
+        db.session.commit()
+    
+    return len(messages) - len(failed_ids)
+
+def send_due_date_reminders(smtp_pool=None):
+    """
+    Send due date reminder emails to students
+    
+    Each student's days_before_due window (default 1 day) is applied in SQL.
+    
+    Args:
+        smtp_pool (SMTPSessionPool): Pool to send through; a temporary one is used if None
+    """
+    now = datetime.utcnow()
+    today = now.date()
+    period = _notification_period(now)
+    days_until_due = _days_from(today, BorrowRecord.due_date)
+    
+    # Active borrows due from tomorrow onwards, inside the student's reminder window
+    upcoming_due_borrows = _notification_candidates(
+        'due_reminder', period,
+        BorrowRecord.due_date >= now + timedelta(days=1),
+        func.coalesce(NotificationPreference.email_due_reminder, True) == True,
+        days_until_due <= func.coalesce(NotificationPreference.days_before_due, 1)
+    )
+    
+    messages = []
+    
+    for borrow, student, book, prefs in upcoming_due_borrows:
+        days_until_due = (borrow.due_date.date() - today).days
+        subject = f"Library Book Due Reminder - {book.title}"
+        body = f"""
 Dear {student.name},
 
 This is a friendly reminder that you have a book due soon:
 
-Book: {borrow.book_ref.title}
-Author: {borrow.book_ref.author or 'N/A'}
+Book: {book.title}
+Author: {book.author or 'N/A'}
 Due Date: {borrow.due_date.strftime('%B %d, %Y')}
 Days Until Due: {days_until_due}
 
@@ -212,47 +547,27 @@ Thank you,
 Confucius Institute Library
 University of Nairobi
 """
-                
-                if send_email(student.email, subject, body, 'due_reminder', student.id, borrow.id):
-                    sent_count += 1
+        
+        messages.append({
+            'to_email': student.email, 'subject': subject, 'body': body,
+            'email_type': 'due_reminder', 'student_id': student.id, 'borrow_record_id': borrow.id
+        })
     
-    return sent_count
+    return _send_notifications(messages, 'due_reminder', period, smtp_pool)
 
-def send_overdue_notices():
-    """
-    Send overdue notices to students
-    """
-    # Get overdue borrows
-    overdue_borrows = BorrowRecord.query.filter(
-        BorrowRecord.returned_at.is_(None),
-        BorrowRecord.due_date < datetime.utcnow(),
-        BorrowRecord.student_id.isnot(None)  # Only students, not staff
-    ).all()
-    
-    sent_count = 0
-    
-    for borrow in overdue_borrows:
-        student = borrow.student_ref
-        
-        # Check if student has notification preferences
-        prefs = NotificationPreference.query.filter_by(student_id=student.id).first()
-        
-        # Default to sending overdue notices if no preferences set
-        if not prefs or prefs.email_overdue_notice:
-            days_overdue = borrow.days_overdue
-            fine_amount = days_overdue * 40  # 40 KES per day
-            
-            subject = f"OVERDUE NOTICE - {borrow.book_ref.title}"
-            body = f"""
+def _overdue_notice(borrow, student, book, days_overdue, fine_amount):
+    """Build the overdue notice for one loan"""
+    subject = f"OVERDUE NOTICE - {book.title}"
+    body = f"""
 Dear {student.name},
 
 This is an overdue notice for the following book:
 
-Book: {borrow.book_ref.title}
-Author: {borrow.book_ref.author or 'N/A'}
+Book: {book.title}
+Author: {book.author or 'N/A'}
 Due Date: {borrow.due_date.strftime('%B %d, %Y')}
 Days Overdue: {days_overdue}
-Fine Amount: KES {fine_amount}
+Fine Amount: KES {fine_amount:.2f}
 
 Please return the book immediately to avoid additional charges.
 
@@ -263,11 +578,43 @@ University of Nairobi
 Phone: [Library Phone Number]
 Email: library@confucius.uonbi.ac.ke
 """
-            
-            if send_email(student.email, subject, body, 'overdue_notice', student.id, borrow.id):
-                sent_count += 1
+    return {
+        'to_email': student.email, 'subject': subject, 'body': body,
+        'email_type': 'overdue_notice', 'student_id': student.id, 'borrow_record_id': borrow.id
+    }
+
+def send_overdue_notices(smtp_pool=None):
+    """
+    Send overdue notices to students
+    
+    Args:
+        smtp_pool (SMTPSessionPool): Pool to send through; a temporary one is used if None
+    """
+    now = datetime.utcnow()
+    period = _notification_period(now)
+    
+    # Overdue borrows of students who have not opted out
+    overdue_borrows = _notification_candidates(
+        'overdue_notice', period,
+        BorrowRecord.due_date < now,
+        func.coalesce(NotificationPreference.email_overdue_notice, True) == True
+    )
+    
+    messages = []
+    
+    # Amounts at the configured rate schedule, one fetch-sized chunk of the stream at a time
+    overdue_borrows = iter(overdue_borrows)
+    while True:
+        chunk = list(islice(overdue_borrows, NOTIFICATION_FETCH_SIZE))
+        if not chunk:
+            break
+        overdue_days, fine_amounts = compute_fines([borrow.due_date for borrow, _, _, _ in chunk],
+                                                   ['student'] * len(chunk), now)
+        messages.extend(_overdue_notice(borrow, student, book, days_overdue, fine_amount)
+                        for (borrow, student, book, _), days_overdue, fine_amount
+                        in zip(chunk, overdue_days, fine_amounts))
     
-    return sent_count
+    return _send_notifications(messages, 'overdue_notice', period, smtp_pool)
 
 def get_email_statistics():
     """
@@ -0,0 +1,143 @@
+import mimetypes
+import os
+from datetime import datetime, timezone
+from urllib.parse import quote
+from flask import current_app, request, abort
+from werkzeug.datastructures import ContentRange
+from werkzeug.http import unquote_etag
+from werkzeug.wsgi import wrap_file
+
+MEDIA_MAX_AGE = 3600  # Seconds a browser may reuse a file before revalidating
+MEDIA_READ_SIZE = 64 * 1024
+
+def _content_disposition(disposition, filename):
+    filename = filename.replace('"', '').replace('\\', '')
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+def _read_range(f, length):
+    """Yield exactly `length` bytes from the file's current position, then close it"""
+    try:
+        while length > 0:
+            data = f.read(min(MEDIA_READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+def _accel_redirect_path(path):
+    """Internal nginx location for a file under MEDIA_ROOT, when X-Accel-Redirect offload is on"""
+    prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+    if not prefix:
+        return None
+    media_root = os.path.join(current_app.root_path, current_app.config.get('MEDIA_ROOT') or 'static/uploads')
+    if os.path.commonpath([media_root, path]) != media_root:
+        return None
+    return prefix.rstrip('/') + '/' + os.path.relpath(path, media_root).replace(os.sep, '/')
+
+def send_media(path, download_name=None, as_attachment=False, mimetype=None, etag=None):
+    """
+    Serve a stored file with conditional GET, byte ranges and zero-copy sending
+
+    Answers If-None-Match/If-Modified-Since with 304, a single Range (honouring
+    If-Range) with 206 and an unsatisfiable one with 416. The body is handed to
+    the server as a file, so gunicorn sends it with sendfile() and no worker
+    time is spent copying bytes; with MEDIA_ACCEL_REDIRECT_PREFIX set, nginx is
+    told to send the file itself via X-Accel-Redirect.
+
+    Args:
+        path (str): File to send
+        download_name (str): Filename offered to the browser (defaults to the file's name)
+        as_attachment (bool): Download rather than display inline
+        mimetype (str): Content type (guessed from the name if omitted)
+        etag (str): Strong validator to use, e.g. a content hash; defaults to
+                    one built from the file's modification time and size
+
+    Returns:
+        Response: 200, 206, 304 or 416 response
+    """
+    # Stored paths are relative to the application, as with send_from_directory
+    path = os.path.join(current_app.root_path, path)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        abort(404)
+
+    size = stat.st_size
+    download_name = download_name or os.path.basename(path)
+    last_modified = datetime.fromtimestamp(int(stat.st_mtime), tz=timezone.utc)
+    etag = etag or f'{stat.st_mtime_ns:x}-{size:x}'
+
+    response = current_app.response_class(
+        mimetype=mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream',
+        direct_passthrough=True
+    )
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config.get('MEDIA_MAX_AGE', MEDIA_MAX_AGE)
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.headers['Content-Disposition'] = _content_disposition(
+        'attachment' if as_attachment else 'inline', download_name)
+
+    # The browser's copy is still current
+    if request.if_none_match:
+        if request.if_none_match.contains_weak(etag):
+            response.status_code = 304
+            return response
+    elif request.if_modified_since and last_modified <= request.if_modified_since:
+        response.status_code = 304
+        return response
+
+    # nginx serves the bytes (and handles ranges) from its internal location
+    accel_path = _accel_redirect_path(path)
+    if accel_path:
+        response.headers['X-Accel-Redirect'] = accel_path
+        return response
+
+    start, length = 0, size
+    # Multi-range requests get the whole file, which HTTP allows
+    if request.range and len(request.range.ranges) == 1 and _if_range_matches(etag, last_modified):
+        byte_range = request.range.range_for_length(size)
+        if byte_range is None:
+            response.status_code = 416
+            response.content_range = ContentRange('bytes', None, None, size)
+            return response
+        start, stop = byte_range
+        length = stop - start
+        response.status_code = 206
+        response.content_range = ContentRange('bytes', start, stop, size)
+
+    f = open(path, 'rb')
+    f.seek(start)
+    response.content_length = length
+
+    # gunicorn's file wrapper sends exactly Content-Length bytes from the current
+    # offset with sendfile(); other servers read to EOF, so partial bodies are
+    # bounded by hand there
+    if length == size or request.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        response.response = wrap_file(request.environ, f, MEDIA_READ_SIZE)
+    else:
+        response.response = _read_range(f, length)
+    return response
+
+def _if_range_matches(etag, last_modified):
+    """
+    A Range request only applies if its If-Range validator (when sent) still matches
+
+    If-Range uses strong comparison (RFC 9110 13.1.5): a weak entity tag never
+    matches, and a date only matches the exact Last-Modified time.
+    """
+    if_range = request.if_range
+    if if_range.etag:
+        # werkzeug drops the W/ prefix when parsing, so look at the raw header
+        sent, weak = unquote_etag(request.headers.get('If-Range'))
+        return not weak and sent == etag
+    if if_range.date:
+        return last_modified == if_range.date
+    return True
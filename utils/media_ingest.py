@@ -0,0 +1,251 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+from models import db, MediaFile, MediaJob, Audio, ExamPaper, MarkingScheme
+
+INGEST_CHUNK_SIZE = 1024 * 1024
+MEDIA_JOB_MAX_ATTEMPTS = 3
+MEDIA_JOB_RETRY_BASE_SECONDS = 60  # Exponential backoff between attempts, as for the email outbox
+MEDIA_JOB_CLAIM_TIMEOUT = timedelta(minutes=30)  # A running job older than this is assumed abandoned
+MEDIA_JOB_TIMEOUT = 600  # Seconds any one external tool may run
+MEDIA_AUDIO_BITRATE = '64k'  # Plenty for listening exams, a fraction of a typical upload
+MEDIA_THUMBNAIL_WIDTH = 320
+
+# Processing queued for each kind of upload
+JOB_TYPES = {
+    'audios': ('audio_transcode',),
+    'transcripts': ('pdf_linearize', 'thumbnail'),
+    'exam_papers': ('pdf_linearize', 'thumbnail'),
+    'marking_schemes': ('pdf_linearize', 'thumbnail'),
+}
+
+def _media_root():
+    return current_app.config.get('MEDIA_ROOT') or 'static/uploads'
+
+def _absolute(path):
+    # Stored paths are relative to the application, as media_delivery serves them
+    return os.path.join(current_app.root_path, path)
+
+def ingest_upload(file_storage, kind, user_id=None):
+    """
+    Store an uploaded file once, keyed by its content, and queue its processing
+
+    The upload is streamed to disk in chunks while its SHA-256 is computed,
+    so large audio files never sit in memory. If identical bytes were
+    uploaded before, the stored copy (processed or not) is reused and no new
+    jobs are queued.
+
+    Args:
+        file_storage (FileStorage): The uploaded file
+        kind (str): Upload folder and job set, a key of JOB_TYPES
+        user_id (int): Uploading user
+
+    Returns:
+        tuple: (MediaFile, True if the file was already stored)
+    """
+    incoming_dir = _absolute(os.path.join(_media_root(), '.incoming'))
+    os.makedirs(incoming_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=incoming_dir)
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for block in iter(lambda: file_storage.stream.read(INGEST_CHUNK_SIZE), b''):
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+        sha256 = digest.hexdigest()
+
+        existing = MediaFile.query.filter_by(sha256=sha256).first()
+        if existing:
+            return existing, True
+
+        original_name = secure_filename(file_storage.filename or '')
+        extension = os.path.splitext(original_name)[1].lower()
+        file_path = os.path.join(_media_root(), kind, f'{sha256}{extension}')
+        os.makedirs(os.path.dirname(_absolute(file_path)), exist_ok=True)
+        os.replace(tmp_path, _absolute(file_path))
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    media = MediaFile(
+        sha256=sha256,
+        file_path=file_path,
+        original_path=file_path,
+        original_name=original_name,
+        size=size,
+        created_by=user_id
+    )
+    db.session.add(media)
+    try:
+        db.session.flush()
+        for job_type in JOB_TYPES[kind]:
+            db.session.add(MediaJob(media_file_id=media.id, job_type=job_type))
+        db.session.commit()
+    except IntegrityError:
+        # The same file was ingested concurrently; both wrote identical bytes to the same path
+        db.session.rollback()
+        return MediaFile.query.filter_by(sha256=sha256).first(), True
+    return media, False
+
+def media_status(media, deduplicated=False):
+    """
+    Describe a stored upload and the state of its processing jobs
+
+    Returns:
+        dict: JSON-ready status for the admin pages and API
+    """
+    return {
+        'media_id': media.id,
+        'sha256': media.sha256,
+        'deduplicated': deduplicated,
+        'file_path': media.file_path,
+        'thumbnail_path': media.thumbnail_path,
+        'jobs': [{
+            'id': job.id,
+            'type': job.job_type,
+            'status': job.status,
+            'error': job.last_error,
+            'next_attempt_at': job.next_attempt_at.isoformat() if job.status == 'pending' and job.next_attempt_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        } for job in sorted(media.jobs, key=lambda j: j.id)]
+    }
+
+def _run_tool(args):
+    result = subprocess.run(args, capture_output=True, timeout=current_app.config.get('MEDIA_JOB_TIMEOUT', MEDIA_JOB_TIMEOUT))
+    return result.returncode, result.stderr.decode(errors='replace').strip()
+
+def _repoint_records(old_path, new_path):
+    """Serve the processed file to every record that pointed at the previous one"""
+    for column in (Audio.file_path, Audio.transcript_path, ExamPaper.file_path, MarkingScheme.file_path):
+        db.session.execute(
+            update(column.class_).where(column == old_path).values({column.key: new_path})
+            .execution_options(synchronize_session=False)
+        )
+
+def _transcode_audio(media):
+    if not shutil.which('ffmpeg'):
+        return 'skipped', 'ffmpeg is not installed'
+
+    bitrate = current_app.config.get('MEDIA_AUDIO_BITRATE', MEDIA_AUDIO_BITRATE)
+    output_path = os.path.splitext(media.original_path)[0] + f'.{bitrate}.mp3'
+    returncode, stderr = _run_tool([
+        'ffmpeg', '-y', '-loglevel', 'error', '-i', _absolute(media.original_path),
+        '-vn', '-ac', '1', '-b:a', bitrate, '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',
+        _absolute(output_path)
+    ])
+    if returncode != 0:
+        raise RuntimeError(f'ffmpeg failed: {stderr[-500:]}')
+
+    if os.path.getsize(_absolute(output_path)) >= media.size:
+        os.remove(_absolute(output_path))
+        return 'done', 'Upload is already smaller than the re-encoded file; kept as uploaded'
+    _repoint_records(media.file_path, output_path)
+    media.file_path = output_path
+    return 'done', None
+
+def _linearize_pdf(media):
+    if not shutil.which('qpdf'):
+        return 'skipped', 'qpdf is not installed'
+
+    output_path = os.path.splitext(media.original_path)[0] + '.linear.pdf'
+    returncode, stderr = _run_tool(['qpdf', '--linearize', _absolute(media.original_path), _absolute(output_path)])
+    # qpdf exits with 3 when it succeeded with warnings
+    if returncode not in (0, 3):
+        raise RuntimeError(f'qpdf failed: {stderr[-500:]}')
+
+    _repoint_records(media.file_path, output_path)
+    media.file_path = output_path
+    return 'done', None
+
+def _make_thumbnail(media):
+    if not shutil.which('pdftoppm'):
+        return 'skipped', 'pdftoppm (poppler-utils) is not installed'
+
+    output_prefix = os.path.splitext(media.original_path)[0] + '.thumb'
+    width = current_app.config.get('MEDIA_THUMBNAIL_WIDTH', MEDIA_THUMBNAIL_WIDTH)
+    returncode, stderr = _run_tool([
+        'pdftoppm', '-png', '-singlefile', '-f', '1', '-l', '1', '-scale-to-x', str(width), '-scale-to-y', '-1',
+        _absolute(media.original_path), _absolute(output_prefix)
+    ])
+    if returncode != 0:
+        raise RuntimeError(f'pdftoppm failed: {stderr[-500:]}')
+
+    media.thumbnail_path = output_prefix + '.png'
+    return 'done', None
+
+JOB_HANDLERS = {
+    'audio_transcode': _transcode_audio,
+    'pdf_linearize': _linearize_pdf,
+    'thumbnail': _make_thumbnail,
+}
+
+def _claim_media_jobs(batch_size):
+    """Atomically claim up to batch_size due jobs for this worker"""
+    now = datetime.utcnow()
+    claimable = or_(
+        and_(MediaJob.status == 'pending', MediaJob.next_attempt_at <= now),
+        and_(MediaJob.status == 'running', MediaJob.claimed_at < now - MEDIA_JOB_CLAIM_TIMEOUT)
+    )
+    candidate_ids = [row.id for row in db.session.query(MediaJob.id).filter(claimable)
+                     .order_by(MediaJob.next_attempt_at).limit(batch_size)]
+    if not candidate_ids:
+        return []
+
+    token = uuid.uuid4().hex
+    db.session.execute(
+        update(MediaJob)
+        .where(MediaJob.id.in_(candidate_ids), claimable)
+        .values(status='running', claimed_at=now, claim_token=token)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return MediaJob.query.filter_by(claim_token=token).order_by(MediaJob.id).all()
+
+def process_media_jobs(batch_size=10):
+    """
+    Run the processing jobs that are due
+
+    A job whose tool is not installed is marked skipped and the upload is
+    served as is. A failed job waits MEDIA_JOB_RETRY_BASE_SECONDS, doubling
+    after each attempt, and is marked failed after MEDIA_JOB_MAX_ATTEMPTS.
+
+    Args:
+        batch_size (int): Maximum number of jobs to claim in this pass
+
+    Returns:
+        int: Number of jobs processed
+    """
+    jobs = _claim_media_jobs(batch_size)
+    for job in jobs:
+        attempts = (job.attempts or 0) + 1
+        try:
+            status, note = JOB_HANDLERS[job.job_type](job.media_file)
+            job.status = status
+            job.last_error = note
+            job.finished_at = datetime.utcnow()
+        except Exception as e:
+            db.session.rollback()
+            job.last_error = str(e)[:1000]
+            if attempts >= MEDIA_JOB_MAX_ATTEMPTS:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            else:
+                job.status = 'pending'
+                job.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=MEDIA_JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+            current_app.logger.error(f'Media job {job.id} ({job.job_type}) failed: {e}')
+        job.attempts = attempts
+        job.claim_token = None
+        db.session.commit()
+    return len(jobs)
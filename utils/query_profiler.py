@@ -0,0 +1,145 @@
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# A statement shape run this many times in one request is reported as an N+1
+# (override with the QUERY_N_PLUS_ONE_THRESHOLD config key)
+N_PLUS_ONE_THRESHOLD = 5
+# Requests slower than this in the database are logged even without an N+1
+SLOW_REQUEST_DB_MS = 200
+PROFILE_HISTORY = 50  # Recent N+1 requests kept for the admin page
+
+_lock = threading.Lock()
+_endpoint_stats = {}
+_recent_n_plus_one = []
+
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)|\(\s*%\(\w+\)s(?:\s*,\s*%\(\w+\)s)+\s*\)')
+_PARAM = re.compile(r'%\(\w+\)s|\$\d+|\b\d+(?:\.\d+)?\b')
+_SPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement):
+    """Statement text with whitespace collapsed, literals and IN lists reduced to one placeholder"""
+    shape = _SPACE.sub(' ', statement).strip()
+    shape = _IN_LIST.sub('(?)', shape)
+    return _PARAM.sub('?', shape)
+
+def _profile():
+    if has_request_context():
+        return g.get('_query_profile')
+    return None
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profile() is not None:
+        conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _profile()
+    if profile is None or not conn.info.get('_query_start'):
+        return
+    profile['db_time'] += time.perf_counter() - conn.info['_query_start'].pop()
+    profile['count'] += 1
+    profile['shapes'][statement_shape(statement)] += 1
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    starts = exception_context.connection.info.get('_query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def _start_profile():
+    g._query_profile = {'count': 0, 'db_time': 0.0, 'shapes': Counter(), 'started': time.perf_counter()}
+
+def _finish_profile(response):
+    profile = g.pop('_query_profile', None)
+    if profile is None:
+        return response
+
+    threshold = current_app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+    repeated = [(shape, n) for shape, n in profile['shapes'].most_common()
+                if n >= threshold and shape.upper().startswith('SELECT')]
+    db_ms = profile['db_time'] * 1000
+    total_ms = (time.perf_counter() - profile['started']) * 1000
+    endpoint = request.endpoint or request.path
+
+    response.headers['X-Query-Count'] = str(profile['count'])
+    response.headers['X-Query-Time-Ms'] = f'{db_ms:.1f}'
+    if repeated:
+        response.headers['X-N-Plus-One'] = str(len(repeated))
+
+    summary = (f"{request.method} {request.path} [{endpoint}] {profile['count']} queries, "
+               f"{db_ms:.1f} ms DB of {total_ms:.1f} ms")
+    if repeated:
+        shape, n = repeated[0]
+        current_app.logger.warning(f"N+1 suspected: {summary}; {n}x {shape[:200]}")
+    elif db_ms >= current_app.config.get('SLOW_REQUEST_DB_MS', SLOW_REQUEST_DB_MS):
+        current_app.logger.warning(f"Slow queries: {summary}")
+    else:
+        current_app.logger.debug(summary)
+
+    with _lock:
+        stats = _endpoint_stats.setdefault(endpoint, {
+            'endpoint': endpoint, 'requests': 0, 'queries': 0, 'max_queries': 0,
+            'db_time_ms': 0.0, 'max_db_time_ms': 0.0, 'n_plus_one_requests': 0
+        })
+        stats['requests'] += 1
+        stats['queries'] += profile['count']
+        stats['max_queries'] = max(stats['max_queries'], profile['count'])
+        stats['db_time_ms'] += db_ms
+        stats['max_db_time_ms'] = max(stats['max_db_time_ms'], db_ms)
+        if repeated:
+            stats['n_plus_one_requests'] += 1
+            _recent_n_plus_one.insert(0, {
+                'at': datetime.utcnow(), 'method': request.method, 'path': request.path, 'endpoint': endpoint,
+                'queries': profile['count'], 'db_time_ms': db_ms,
+                'repeated': [{'shape': shape, 'count': n} for shape, n in repeated[:5]]
+            })
+            del _recent_n_plus_one[PROFILE_HISTORY:]
+    return response
+
+def get_query_profile():
+    """
+    Per-endpoint query statistics and recent N+1 requests seen by this process
+
+    Returns:
+        dict: endpoints (averages and maxima, most queries per request first)
+              and recent (latest N+1 requests with their repeated statements)
+    """
+    with _lock:
+        endpoints = [dict(stats) for stats in _endpoint_stats.values()]
+        recent = [dict(entry) for entry in _recent_n_plus_one]
+    for stats in endpoints:
+        stats['avg_queries'] = stats['queries'] / stats['requests']
+        stats['avg_db_time_ms'] = stats['db_time_ms'] / stats['requests']
+    endpoints.sort(key=lambda stats: stats['avg_queries'], reverse=True)
+    return {'endpoints': endpoints, 'recent': recent}
+
+def reset_query_profile():
+    """Forget the collected statistics"""
+    with _lock:
+        _endpoint_stats.clear()
+        _recent_n_plus_one.clear()
+
+def install_query_profiler(app, engine):
+    """
+    Count the queries, database time and repeated statement shapes of every request
+
+    Each response carries X-Query-Count and X-Query-Time-Ms headers (plus
+    X-N-Plus-One when a SELECT shape repeats QUERY_N_PLUS_ONE_THRESHOLD
+    times or more); suspected N+1s and slow requests are logged, and
+    per-endpoint totals are kept for the admin page. Disable with
+    QUERY_PROFILER=False.
+    """
+    if not app.config.get('QUERY_PROFILER', True):
+        return
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import or_, select
+from models import db, Book, BorrowRecord, Student
+from utils.circulation import borrow_book, bulk_return, BorrowError, ReturnError
+
+SCAN_CACHE_SIZE = 2048  # Identifiers remembered (override with the SCAN_CACHE_SIZE config key)
+
+class ScanError(Exception):
+    """A scan could not be acted on; the message can be shown at the station as is"""
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cache_get(key):
+    with _cache_lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+        return value
+
+def _cache_put(key, value):
+    limit = current_app.config.get('SCAN_CACHE_SIZE', SCAN_CACHE_SIZE)
+    with _cache_lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > limit:
+            _cache.popitem(last=False)
+
+def forget_code(kind, code):
+    """Drop one identifier from the cache"""
+    with _cache_lock:
+        _cache.pop((kind, code), None)
+
+def clear_scan_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def book_codes(book):
+    return {book.unique_id, book.isbn} - {None}
+
+def student_codes(student):
+    return {student.registration_number, student.id_number, student.passport_number} - {None}
+
+def _resolve(kind, code):
+    """
+    Row id for a scanned code, from the LRU cache or one indexed lookup
+
+    Only ids are cached; callers load the row itself (usually locked) and
+    check with book_codes()/student_codes() that it still carries the code,
+    evicting it with forget_code() when it does not.
+
+    Returns:
+        tuple: (id or None, whether it came from the cache)
+    """
+    cached = _cache_get((kind, code))
+    if cached is not None:
+        return cached, True
+    if kind == 'book':
+        statement = select(Book.id).where(or_(Book.unique_id == code, Book.isbn == code))
+    else:
+        statement = select(Student.id).where(or_(Student.registration_number == code,
+                                                 Student.id_number == code,
+                                                 Student.passport_number == code))
+    row_id = db.session.execute(statement.limit(1)).scalar()
+    if row_id is not None:
+        _cache_put((kind, code), row_id)
+    return row_id, False
+
+def _as_code(code, what):
+    """A scanned value as text; scanners and JSON clients often send barcodes as numbers"""
+    if code is None:
+        return ''
+    if isinstance(code, bool) or not isinstance(code, (str, int)):
+        raise ScanError(f'The {what} code must be text or a whole number')
+    return str(code).strip()
+
+def _clean(code, what):
+    code = _as_code(code, what)
+    if not code:
+        raise ScanError(f'Scan the {what}')
+    return code
+
+def lookup_code(code):
+    """
+    What a scanned code refers to, for the station display
+
+    Returns:
+        tuple: ('book', Book), ('student', Student) or (None, None)
+    """
+    code = _clean(code, 'code')
+    for kind, model, codes in (('book', Book, book_codes), ('student', Student, student_codes)):
+        for attempt in range(2):
+            row_id, cached = _resolve(kind, code)
+            if row_id is None:
+                break
+            row = db.session.get(model, row_id)
+            if row is not None and code in codes(row):
+                return kind, row
+            forget_code(kind, code)
+            if not cached:
+                break
+    return None, None
+
+def scan_borrow(book_code, student_code):
+    """
+    Lend the scanned book to the scanned student
+
+    Codes are resolved through the cache, then borrow_book locks and checks
+    the rows; if a cached code turns out to belong to another (or no) row
+    the attempt is rolled back and resolved again from the database. The
+    loan is flushed but not committed.
+
+    Returns:
+        tuple: (BorrowRecord, Book, Student)
+
+    Raises:
+        ScanError: If a code is unknown
+        BorrowError: If the borrow is refused
+    """
+    book_code = _clean(book_code, 'book')
+    student_code = _clean(student_code, 'student card')
+    for attempt in range(2):
+        book_id, book_cached = _resolve('book', book_code)
+        if book_id is None:
+            raise ScanError(f'No book with code {book_code}')
+        student_id, student_cached = _resolve('student', student_code)
+        if student_id is None:
+            raise ScanError(f'No student with identifier {student_code}')
+        try:
+            borrow_record, book, student = borrow_book(book_id, student_id=student_id)
+        except BorrowError:
+            if attempt or not (book_cached or student_cached):
+                raise
+            # A stale cache entry can point at a removed row; look both up afresh
+            forget_code('book', book_code)
+            forget_code('student', student_code)
+            continue
+        if book_code in book_codes(book) and student_code in student_codes(student):
+            return borrow_record, book, student
+        db.session.rollback()
+        forget_code('book', book_code)
+        forget_code('student', student_code)
+    raise ScanError('Codes changed while scanning; scan again')
+
+def scan_return(book_code, student_code=None):
+    """
+    Take back the scanned book
+
+    Without a student code the loan is found from the book alone, which
+    works as long as only one borrower has a copy out. Nothing is committed
+    here.
+
+    Returns:
+        tuple: (BorrowRecord, Book, Fine or None)
+
+    Raises:
+        ScanError: If a code is unknown or the borrower is ambiguous
+        ReturnError: If the book is not on loan (to that student)
+    """
+    book_code = _clean(book_code, 'book')
+    student_code = _as_code(student_code, 'student card')
+    for attempt in range(2):
+        book_id, _ = _resolve('book', book_code)
+        if book_id is None:
+            raise ScanError(f'No book with code {book_code}')
+
+        # A refusal is retried once with both codes looked up afresh, in case the cache was stale
+        staff_id = None
+        if student_code:
+            student_id, _ = _resolve('student', student_code)
+            if student_id is None:
+                raise ScanError(f'No student with identifier {student_code}')
+        else:
+            borrowers = db.session.execute(
+                select(BorrowRecord.student_id, BorrowRecord.staff_id)
+                .where(BorrowRecord.book_id == book_id, BorrowRecord.returned_at.is_(None))
+                .distinct().limit(2)
+            ).all()
+            if not borrowers:
+                raise ReturnError('This book is not on loan')
+            if len(borrowers) > 1:
+                raise ScanError('Several borrowers have this book out; scan the student card too')
+            student_id, staff_id = borrowers[0]
+
+        try:
+            returned, books, fines = bulk_return([book_id], student_id=student_id, staff_id=staff_id)
+        except ReturnError:
+            if attempt:
+                raise
+            forget_code('book', book_code)
+            forget_code('student', student_code)
+            continue
+        book = books[book_id]
+        student = returned[0].student_ref if student_code else None
+        if book_code in book_codes(book) and (student is None or student_code in student_codes(student)):
+            return returned[0], book, fines[0] if fines else None
+        db.session.rollback()
+        forget_code('book', book_code)
+        forget_code('student', student_code)
+    raise ScanError('Codes changed while scanning; scan again')
@@ -0,0 +1,124 @@
+import queue
+import smtplib
+import threading
+
+class _Session:
+    """An open, authenticated SMTP connection and the number of messages sent on it"""
+
+    def __init__(self, server):
+        self.server = server
+        self.sent = 0
+
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+class SMTPSessionPool:
+    """
+    Pool of authenticated SMTP sessions reused across messages
+
+    Each session pays the TCP + STARTTLS + AUTH handshake once and then sends
+    up to max_messages_per_session messages. A session the server dropped is
+    reconnected transparently, and at most `size` sessions are open at a time
+    so the provider's connection limit is respected.
+
+    Args:
+        host (str): SMTP server host
+        port (int): SMTP server port
+        user (str): Login user (no AUTH when empty)
+        password (str): Login password
+        use_tls (bool): Issue STARTTLS after connecting
+        size (int): Maximum number of concurrent sessions
+        timeout (int): Socket timeout in seconds
+        max_messages_per_session (int): Recycle a session after this many messages
+    """
+
+    def __init__(self, host, port, user=None, password=None, use_tls=True, size=4, timeout=30,
+                 max_messages_per_session=100):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_tls = use_tls
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.max_messages_per_session = max_messages_per_session
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        return _Session(server)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, session, healthy):
+        if healthy and session.sent < self.max_messages_per_session:
+            self._idle.put(session)
+        else:
+            session.close()
+        self._slots.release()
+
+    def send_message(self, msg):
+        """
+        Send one email.message.Message on a pooled session
+
+        Raises the underlying smtplib exception if the message cannot be sent
+        after one reconnect.
+        """
+        session = self._acquire()
+        try:
+            try:
+                session.server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server closed an idle session; reconnect once and retry
+                session.close()
+                session = self._connect()
+                session.server.send_message(msg)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            # The server rejected this message but the session is still usable
+            self._release(session, healthy=True)
+            raise
+        except Exception:
+            self._release(session, healthy=False)
+            raise
+
+        session.sent += 1
+        self._release(session, healthy=True)
+
+    def close(self):
+        """Close every idle session"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,72 @@
+from sqlalchemy import func, select
+from models import Book, Category, db
+
+# Rows per page on the stock reports
+STOCK_PAGE_SIZE = 100
+
+# Books with at most this many copies available are low on stock
+# (override with the LOW_STOCK_THRESHOLD config key or ?threshold= on the report)
+LOW_STOCK_THRESHOLD = 1
+
+def _stock_statement(max_available=None):
+    """
+    Build the stock statement: one row per book with its category name
+    
+    Loaned copies come from the materialized Book.copies_on_loan counter, so
+    no aggregation over borrow_record is needed; the category is a LEFT JOIN
+    so uncategorized books are kept.
+    
+    Args:
+        max_available (int): Only include books with at most this many copies available
+    """
+    stmt = select(
+        Book.id,
+        Book.title,
+        Book.author,
+        Book.unique_id,
+        func.coalesce(Category.name, 'Uncategorized').label('category'),
+        Book.total_copies,
+        Book.copies_on_loan.label('borrowed_copies'),
+        Book.available_copies.label('available_copies')
+    ).select_from(Book).outerjoin(Category, Book.category_id == Category.id)
+    
+    if max_available is not None:
+        stmt = stmt.where(Book.available_copies <= max_available)
+    
+    return stmt
+
+def get_stock_page(max_available=None, after_id=None, page_size=STOCK_PAGE_SIZE):
+    """
+    Fetch one page of the stock report
+    
+    Pages are keyed on Book.id so every page costs the same regardless of
+    how deep into the catalogue it is.
+    
+    Args:
+        max_available (int): Threshold filter applied in SQL (None for all books)
+        after_id (int): Last book id of the previous page
+        page_size (int): Number of rows per page
+    
+    Returns:
+        tuple: (list of row dicts, id to pass as after_id for the next page or None)
+    """
+    stmt = _stock_statement(max_available)
+    if after_id:
+        stmt = stmt.where(Book.id > after_id)
+    
+    # Fetch one extra row to know whether another page exists
+    rows = db.session.execute(stmt.order_by(Book.id).limit(page_size + 1)).mappings().all()
+    
+    next_after_id = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_after_id = rows[-1]['id']
+    
+    return [dict(row) for row in rows], next_after_id
+
+def count_stock_rows(max_available=None):
+    """Count the books matching the stock report threshold"""
+    stmt = select(func.count()).select_from(Book)
+    if max_available is not None:
+        stmt = stmt.where(Book.available_copies <= max_available)
+    return db.session.execute(stmt).scalar()